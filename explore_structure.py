@@ -17,7 +17,31 @@ logger.add(
     colorize=True
 )
 
-def explore_structure(client, folder_id, prefix="", level=0, max_level=3):
+def fetch_structure(client, folder_id, max_level=3):
+    """
+    Listar a árvore nível a nível (uma query OR por grupo de pastas)
+    
+    Returns:
+        Dicionário pasta_id → lista de itens filhos
+    """
+    children = {}
+    level = [folder_id]
+    
+    for _ in range(max_level + 1):
+        if not level:
+            break
+        level_children = client._list_children(level)
+        children.update(level_children)
+        level = [
+            item['id']
+            for items in level_children.values()
+            for item in items
+            if item.get('mimeType') == 'application/vnd.google-apps.folder'
+        ]
+    
+    return children
+
+def explore_structure(client, folder_id, prefix="", level=0, max_level=3, children=None):
     """Explorar recursivamente a estrutura de pastas"""
     if level > max_level:
         return
@@ -25,14 +49,10 @@ def explore_structure(client, folder_id, prefix="", level=0, max_level=3):
     indent = "  " * level
     
     try:
-        results = client.service.files().list(
-            q=f"'{folder_id}' in parents and trashed=false",
-            spaces='drive',
-            fields='files(id, name, mimeType, size)',
-            pageSize=100
-        ).execute()
+        if children is None:
+            children = fetch_structure(client, folder_id, max_level - level)
         
-        items = results.get('files', [])
+        items = children.get(folder_id, [])
         
         # Separar pastas e arquivos
         folders = [f for f in items if f.get('mimeType') == 'application/vnd.google-apps.folder']
@@ -41,7 +61,7 @@ def explore_structure(client, folder_id, prefix="", level=0, max_level=3):
         # Mostrar pastas
         for folder in folders:
             print(f"{indent}📁 {folder['name']}")
-            explore_structure(client, folder['id'], prefix + folder['name'] + "/", level + 1, max_level)
+            explore_structure(client, folder['id'], prefix + folder['name'] + "/", level + 1, max_level, children)
         
         # Mostrar arquivos
         for file in files:
@@ -14,7 +14,7 @@ from loguru import logger
 sys.path.insert(0, str(Path(__file__).parent))
 
 from src.core import Config, setup_logging
-from src.google_drive import GoogleDriveClient
+from src.google_drive import GoogleDriveClient, DriveMetadataIndex
 from src.dicom import DIOMConverter
 from src.pipeline import BatchPipeline, ProcessingTask
 
@@ -66,6 +66,12 @@ Exemplos de uso:
         help='Máximo de arquivos a processar (padrão: 10)'
     )
     
+    parser.add_argument(
+        '--use-index',
+        action='store_true',
+        help='Usar índice local de metadados (atualização incremental via changes.list)'
+    )
+    
     parser.add_argument(
         '--log-level',
         default='INFO',
@@ -81,17 +87,18 @@ def list_dicom_files(client: GoogleDriveClient, max_files: int = 10):
     try:
         logger.info(f"Listando até {max_files} arquivos DICOM...")
         
-        files = client.list_files(
+        files = []
+        for i, f in enumerate(client.iter_files(
             folder_name=Config.GOOGLE_DRIVE_FOLDER,
-            max_results=max_files
-        )
-        
-        logger.info(f"\nEncontrados {len(files)} arquivos:\n")
-        
-        for i, f in enumerate(files, 1):
+            max_results=max_files,
+            filter_dicom=True
+        ), 1):
             size_bytes = int(f.get('size', 0) or 0)  # Converter para int
             size_mb = size_bytes / (1024 * 1024)
             logger.info(f"  {i}. {f['name']} ({size_mb:.1f} MB)")
+            files.append(f)
+        
+        logger.info(f"\nEncontrados {len(files)} arquivos\n")
         
         return files
     
@@ -103,20 +110,17 @@ def list_dicom_files(client: GoogleDriveClient, max_files: int = 10):
 def process_dicom_files(client: GoogleDriveClient, max_files: int = 10):
     """Processar arquivos DICOM"""
     try:
-        # Listar arquivos
-        files = client.list_files(
+        # Listar arquivos sob demanda: downloads começam durante a descoberta
+        files = client.iter_files(
             folder_name=Config.GOOGLE_DRIVE_FOLDER,
-            max_results=max_files
+            max_results=max_files,
+            filter_dicom=True  # Rejeitar não-DICOM antes do download
         )
         
-        if not files:
-            logger.error("Nenhum arquivo encontrado")
-            return
-        
-        logger.info(f"Processando {len(files)} arquivos...")
+        logger.info(f"Processando até {max_files} arquivos...")
         
-        # Criar tarefas
-        tasks = [
+        # Criar tarefas (gerador)
+        tasks = (
             ProcessingTask(
                 file_id=f['id'],
                 file_name=f['name'],
@@ -124,7 +128,7 @@ def process_dicom_files(client: GoogleDriveClient, max_files: int = 10):
                 size_mb=int(f.get('size', 0) or 0) / (1024 * 1024)  # Converter para int
             )
             for i, f in enumerate(files, 1)
-        ]
+        )
         
         # Criar pipeline
         pipeline = BatchPipeline(
@@ -148,15 +152,22 @@ def list_dicom_studies(client: GoogleDriveClient, max_studies: int = 10):
     try:
         logger.info(f"Listando até {max_studies} estudos DICOM...")
         
-        studies = client.list_dicom_studies(
+        # Tamanhos só com o índice local (sem varrer a árvore de cada estudo)
+        studies = []
+        for i, study in enumerate(client.iter_studies(
             folder_name=Config.GOOGLE_DRIVE_FOLDER,
-            max_results=max_studies
-        )
-        
-        logger.info(f"\nEncontrados {len(studies)} estudos:\n")
+            max_results=max_studies,
+            with_manifest=client.metadata_index is not None
+        ), 1):
+            manifest = study.get('manifest')
+            details = (
+                f" - {manifest.file_count} arquivos, {manifest.series_count} séries, "
+                f"{manifest.size_mb:.1f} MB" if manifest else ""
+            )
+            logger.info(f"  {i}. {study['name']} (ID: {study['study_number']}){details}")
+            studies.append(study)
         
-        for i, study in enumerate(studies, 1):
-            logger.info(f"  {i}. {study['name']} (ID: {study['study_number']})")
+        logger.info(f"\nEncontrados {len(studies)} estudos\n")
         
         return studies
     
@@ -168,30 +179,28 @@ def list_dicom_studies(client: GoogleDriveClient, max_studies: int = 10):
 def process_dicom_studies(client: GoogleDriveClient, max_studies: int = 10):
     """Processar estudos DICOM"""
     try:
-        # Listar estudos
-        studies = client.list_dicom_studies(
+        # Listar estudos sob demanda: downloads começam durante a descoberta
+        # Manifesto (tamanho real) já na descoberta apenas com o índice local;
+        # sem ele, o pipeline monta cada manifesto quando o estudo entra no download
+        studies = client.iter_studies(
             folder_name=Config.GOOGLE_DRIVE_FOLDER,
-            max_results=max_studies
+            max_results=max_studies,
+            with_manifest=client.metadata_index is not None
         )
         
-        if not studies:
-            logger.error("Nenhum estudo encontrado")
-            return
+        logger.info(f"Processando até {max_studies} estudos DICOM...")
         
-        logger.info(f"Processando {len(studies)} estudos DICOM...")
-        
-        # Criar tarefas para cada estudo
-        tasks = []
-        for i, study in enumerate(studies, 1):
-            # Para estudos, passamos study_info
-            task = ProcessingTask(
+        # Criar tarefas para cada estudo (gerador)
+        tasks = (
+            ProcessingTask(
                 file_id=study['dicom_folder_id'],
                 file_name=study['name'],
                 patient_id=f"P{i:03d}",
-                size_mb=0,  # Não aplicável para estudos
+                size_mb=study['manifest'].size_mb if 'manifest' in study else 0,
                 study_info=study  # ← Passando informações do estudo
             )
-            tasks.append(task)
+            for i, study in enumerate(studies, 1)
+        )
         
         # Criar pipeline
         pipeline = BatchPipeline(
@@ -224,7 +233,12 @@ def main():
     
     # Inicializar cliente
     try:
-        client = GoogleDriveClient()
+        metadata_index = None
+        if args.use_index or Config.USE_METADATA_INDEX:
+            metadata_index = DriveMetadataIndex(Config.METADATA_INDEX_PATH)
+            logger.info(f"Índice de metadados: {Config.METADATA_INDEX_PATH}")
+        
+        client = GoogleDriveClient(metadata_index=metadata_index)
     except Exception as e:
         logger.error(f"Falha ao conectar Google Drive: {e}")
         sys.exit(1)
@@ -27,26 +27,94 @@ class Config:
     # Processamento
     MAX_WORKERS_DOWNLOAD = int(os.getenv('MAX_WORKERS_DL', 5))
     MAX_WORKERS_UPLOAD = int(os.getenv('MAX_WORKERS_UL', 3))
-    MAX_WORKERS_PROCESS = int(os.getenv('MAX_WORKERS_PROC', os.cpu_count() - 2 or 2))
+    MAX_WORKERS_PROCESS = int(os.getenv('MAX_WORKERS_PROC', max(1, (os.cpu_count() or 4) - 2)))
+    MAX_WORKERS_DISCOVERY = int(os.getenv('MAX_WORKERS_DISC', 8))
+    MAX_WORKERS_STUDY_FILES = int(os.getenv('MAX_WORKERS_FILES', 8))
+    MAX_INFLIGHT_DOWNLOADS = int(os.getenv('MAX_INFLIGHT_DL', 16))
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 16))
+    
+    # Cliente assíncrono (aiohttp, opcional)
+    ASYNC_DOWNLOADS = os.getenv('ASYNC_DOWNLOADS', 'false').lower() == 'true'
+    ASYNC_MAX_CONNECTIONS = int(os.getenv('ASYNC_MAX_CONNECTIONS', 100))
+    ASYNC_MAX_IN_FLIGHT = int(os.getenv('ASYNC_MAX_IN_FLIGHT', 256))
     
     # Timeouts
     TIMEOUT_DOWNLOAD_SECONDS = int(os.getenv('TIMEOUT_DL', 300))
     TIMEOUT_CONVERSION_SECONDS = int(os.getenv('TIMEOUT_CONV', 600))
     TIMEOUT_UPLOAD_SECONDS = int(os.getenv('TIMEOUT_UL', 300))
     
+    # Download: arquivos até este tamanho usam um único GET (fatias DICOM)
+    SMALL_FILE_MAX_MB = float(os.getenv('SMALL_FILE_MAX_MB', 4))
+    
+    # Upload: arquivos até este tamanho usam multipart (uma requisição)
+    UPLOAD_MULTIPART_MAX_MB = float(os.getenv('UPLOAD_MULTIPART_MAX_MB', 5))
+    # Não reenviar arquivos já presentes no destino com o mesmo nome e md5
+    UPLOAD_SKIP_EXISTING = os.getenv('UPLOAD_SKIP_EXISTING', 'true').lower() == 'true'
+    
+    # Chunks de download/upload: adaptados à vazão medida, dentro dos limites
+    CHUNK_MIN_MB = float(os.getenv('CHUNK_MIN_MB', 1))
+    CHUNK_MAX_MB = float(os.getenv('CHUNK_MAX_MB', 64))
+    CHUNK_TARGET_SECONDS = float(os.getenv('CHUNK_TARGET_SECONDS', 2))
+    
     # Rate limiting
     RATE_LIMIT_REQUESTS_PER_SECOND = int(os.getenv('RATE_LIMIT', 5))
+    # Requisições que podem sair de uma vez e arquivo de estado para dividir
+    # a cota entre processos no mesmo host (vazio = apenas este processo)
+    RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', 5))
+    RATE_LIMIT_SHARED_PATH = os.getenv('RATE_LIMIT_SHARED_PATH', '')
+    
+    # Limite de banda em MB/s (0 = sem limite), rajada e janela de horário
+    # "HH:MM-HH:MM" em que o limite vale (vazio = o dia todo)
+    DOWNLOAD_LIMIT_MB_S = float(os.getenv('DOWNLOAD_LIMIT_MB_S', 0))
+    UPLOAD_LIMIT_MB_S = float(os.getenv('UPLOAD_LIMIT_MB_S', 0))
+    BANDWIDTH_BURST_MB = float(os.getenv('BANDWIDTH_BURST_MB', 0))
+    BANDWIDTH_LIMIT_HOURS = os.getenv('BANDWIDTH_LIMIT_HOURS', '')
     
     # Retry
     MAX_RETRIES = int(os.getenv('MAX_RETRIES', 3))
     RETRY_BACKOFF_FACTOR = int(os.getenv('RETRY_BACKOFF', 2))
+    # Novas passadas de download para estudos incompletos (só o que falta)
+    STUDY_RETRIES = int(os.getenv('STUDY_RETRIES', 1))
     
     # Diretórios
     TEMP_DIR = Path(os.getenv('TEMP_DIR', './temp'))
     LOG_DIR = Path(os.getenv('LOG_DIR', './logs'))
     
+    # Staging em RAM (tmpfs) para download e conversão (0 = apenas disco)
+    STAGING_RAM_DIR = Path(os.getenv('STAGING_RAM_DIR', '/dev/shm/sdd-dicom'))
+    STAGING_RAM_MB = float(os.getenv('STAGING_RAM_MB', 0))
+    
     # Cache
     CACHE_TTL_HOURS = int(os.getenv('CACHE_TTL', 24))
+    CACHE_DIR = Path(os.getenv('CACHE_DIR', './cache'))
+    PERSIST_FOLDER_CACHE = os.getenv('PERSIST_FOLDER_CACHE', 'false').lower() == 'true'
+    FOLDER_CACHE_PATH = Path(
+        os.getenv('FOLDER_CACHE_PATH', str(CACHE_DIR / 'folder_ids.json'))
+    )
+    DICOM_PROBE_CACHE_PATH = Path(
+        os.getenv('DICOM_PROBE_CACHE_PATH', str(CACHE_DIR / 'dicom_probes.sqlite3'))
+    )
+    # Cache local de downloads (file id + md5); 0 = desativado
+    DOWNLOAD_CACHE_GB = float(os.getenv('DOWNLOAD_CACHE_GB', 0))
+    DOWNLOAD_CACHE_DIR = Path(
+        os.getenv('DOWNLOAD_CACHE_DIR', str(CACHE_DIR / 'downloads'))
+    )
+    
+    # Índice local de metadados do Drive (SQLite + changes.list)
+    USE_METADATA_INDEX = os.getenv('USE_METADATA_INDEX', 'false').lower() == 'true'
+    METADATA_INDEX_PATH = Path(
+        os.getenv('METADATA_INDEX_PATH', str(CACHE_DIR / 'drive_index.sqlite3'))
+    )
+    # Ledger por arquivo dos estudos em andamento (retries só do que falta);
+    # sem persistência vale apenas durante a execução
+    PERSIST_LEDGER = os.getenv('PERSIST_LEDGER', 'false').lower() == 'true'
+    LEDGER_PATH = Path(
+        os.getenv('LEDGER_PATH', str(CACHE_DIR / 'transfer_ledger.sqlite3'))
+    )
+    # Sessões de upload resumable (retomadas após retry ou reinício)
+    UPLOAD_SESSIONS_PATH = Path(
+        os.getenv('UPLOAD_SESSIONS_PATH', str(CACHE_DIR / 'upload_sessions.sqlite3'))
+    )
     
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -49,6 +49,21 @@ class DICOMFileDetector:
         except (OSError, IOError):
             return False
     
+    @staticmethod
+    def is_dicom_header(header: bytes) -> bool:
+        """
+        Verificar magic number em bytes iniciais já lidos (ex: Range remoto)
+        
+        Args:
+            header: Pelo menos os primeiros MIN_FILE_SIZE bytes do arquivo
+        
+        Returns:
+            True se contém "DICM" na posição esperada
+        """
+        offset = DICOMFileDetector.DICOM_MAGIC_OFFSET
+        magic = header[offset:offset + len(DICOMFileDetector.DICOM_MAGIC)]
+        return magic == DICOMFileDetector.DICOM_MAGIC
+    
     @staticmethod
     def find_dicom_files(directory: Path) -> List[Path]:
         """
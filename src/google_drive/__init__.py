@@ -3,11 +3,35 @@ Inicialização do módulo google_drive
 """
 from .auth import GoogleDriveAuth, ServiceAccountAuth
 from .client import GoogleDriveClient
-from .rate_limiter import RateLimiter
+from .rate_limiter import RateLimiter, AsyncRateLimiter, BandwidthLimiter
+from .metadata_index import DriveMetadataIndex
+from .folder_cache import FolderIdCache
+from .dicom_prefilter import RemoteDicomPrefilter
+from .study_manifest import StudyManifest
+from .download_engine import StudyDownloadEngine, StudyDownloadStats, DownloadScheduler
+from .download_cache import DownloadCache
+from .transport import PooledAuthorizedHttp
+from .chunk_sizer import AdaptiveChunkSizer
+from .upload_sessions import UploadSessionStore
+from .async_client import AsyncGoogleDriveClient
 
 __all__ = [
     'GoogleDriveAuth',
     'ServiceAccountAuth',
     'GoogleDriveClient',
     'RateLimiter',
+    'AsyncRateLimiter',
+    'BandwidthLimiter',
+    'DriveMetadataIndex',
+    'FolderIdCache',
+    'RemoteDicomPrefilter',
+    'StudyManifest',
+    'StudyDownloadEngine',
+    'StudyDownloadStats',
+    'DownloadScheduler',
+    'DownloadCache',
+    'PooledAuthorizedHttp',
+    'AdaptiveChunkSizer',
+    'UploadSessionStore',
+    'AsyncGoogleDriveClient',
 ]
@@ -0,0 +1,518 @@
+"""
+Cliente assíncrono (asyncio + aiohttp) para Google Drive
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from loguru import logger
+
+try:
+    import aiohttp
+except ImportError:  # Dependência opcional (pip install aiohttp)
+    aiohttp = None
+
+from ..core.config import Config
+from ..core.exceptions import GoogleDriveError, DownloadError, UploadError
+from ..utils.file_utils import calculate_checksum
+from .auth import GoogleDriveAuth
+from .rate_limiter import AsyncRateLimiter, RateLimiter
+from .chunk_sizer import AdaptiveChunkSizer
+from .study_manifest import StudyManifest
+from .client import (
+    GoogleDriveClient,
+    FOLDER_MIME_TYPE,
+    FILE_LIST_FIELDS,
+    LIST_PAGE_SIZE,
+    UPLOAD_FIELDS,
+    is_retryable_response,
+)
+
+
+DRIVE_API_URL = 'https://www.googleapis.com/drive/v3'
+DRIVE_UPLOAD_URL = 'https://www.googleapis.com/upload/drive/v3'
+DOWNLOAD_READ_SIZE = 256 * 1024
+
+
+class AsyncGoogleDriveClient:
+    """
+    Cliente assíncrono com as operações principais do GoogleDriveClient
+    
+    - Listagem (queries OR multi-pasta, paginação completa, níveis em paralelo)
+    - Resolução de pastas por caminho
+    - Download com .part/Range e verificação de tamanho/md5
+    - Upload multipart (pequenos) ou resumable em chunks
+    
+    Todas as requisições compartilham uma ClientSession com pool de conexões
+    keep-alive (`max_connections`) e um AsyncRateLimiter, então um único
+    processo mantém centenas de operações em andamento sem threads. Leitura
+    e escrita de arquivos e checksums rodam em asyncio.to_thread.
+    
+    Uso:
+        async with AsyncGoogleDriveClient.from_config() as client:
+            folder_id = await client.find_folder("Medicina/.../DICOM")
+            async for item in client.iter_files(folder_id):
+                ...
+    """
+    
+    def __init__(
+        self,
+        credentials=None,
+        api_url: str = DRIVE_API_URL,
+        upload_url: str = DRIVE_UPLOAD_URL,
+        max_connections: Optional[int] = None,
+        rate_limit_rps: Optional[float] = None,
+        rate_limiter: Optional[RateLimiter] = None
+    ):
+        """
+        Inicializar cliente
+        
+        Args:
+            credentials: Credenciais google-auth (None = sem autenticação,
+                ex: servidor fake de testes)
+            api_url: URL base da API Drive v3
+            upload_url: URL base de upload
+            max_connections: Conexões simultâneas (padrão: Config.ASYNC_MAX_CONNECTIONS)
+            rate_limit_rps: Requisições por segundo (padrão: Config.RATE_LIMIT_REQUESTS_PER_SECOND)
+            rate_limiter: Balde de um GoogleDriveClient no mesmo processo,
+                para os dois clientes dividirem a cota
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncGoogleDriveClient requer aiohttp: pip install aiohttp")
+        
+        self.credentials = credentials
+        self.api_url = api_url.rstrip('/')
+        self.upload_url = upload_url.rstrip('/')
+        self.max_connections = max_connections or Config.ASYNC_MAX_CONNECTIONS
+        self.rate_limiter = AsyncRateLimiter(
+            rate_limit_rps or Config.RATE_LIMIT_REQUESTS_PER_SECOND,
+            burst=Config.RATE_LIMIT_BURST,
+            shared_state_path=Config.RATE_LIMIT_SHARED_PATH or None,
+            rate_limiter=rate_limiter
+        )
+        self.max_retries = Config.MAX_RETRIES
+        self.upload_chunk_sizer = AdaptiveChunkSizer.for_upload(Config)
+        
+        self._session: Optional['aiohttp.ClientSession'] = None
+        self._refresh_lock = asyncio.Lock()
+        self._folder_ids: Dict[str, str] = {}
+    
+    @classmethod
+    def from_config(cls, **kwargs) -> 'AsyncGoogleDriveClient':
+        """Criar cliente autenticado com as credenciais de Config"""
+        creds = GoogleDriveAuth(Config.CREDENTIALS_PATH, Config.TOKEN_PATH).authenticate()
+        return cls(credentials=creds, **kwargs)
+    
+    async def __aenter__(self) -> 'AsyncGoogleDriveClient':
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_connections),
+            timeout=aiohttp.ClientTimeout(total=None, sock_read=Config.TIMEOUT_DOWNLOAD_SECONDS)
+        )
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+    
+    async def close(self) -> None:
+        """Fechar sessão HTTP"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+    
+    # ==================== HTTP ====================
+    
+    async def _auth_headers(self) -> Dict[str, str]:
+        """Header Authorization (renovando o token fora do loop se expirado)"""
+        if self.credentials is None:
+            return {}
+        
+        if not self.credentials.valid:
+            async with self._refresh_lock:
+                if not self.credentials.valid:
+                    from google.auth.transport.requests import Request
+                    await asyncio.to_thread(self.credentials.refresh, Request())
+        
+        return {'Authorization': f"Bearer {self.credentials.token}"}
+    
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        allowed_statuses: Tuple[int, ...] = (),
+        headers: Optional[Dict] = None,
+        max_retries: Optional[int] = None,
+        **kwargs
+    ) -> 'aiohttp.ClientResponse':
+        """
+        Enviar requisição com rate limit e retry (backoff exponencial)
+        
+        O chamador deve liberar a resposta (`async with response:`).
+        max_retries=0 desativa o retry (chunks resumable, que precisam
+        consultar o offset antes de reenviar).
+        
+        Raises:
+            GoogleDriveError: Se a requisição falhar após os retries
+        """
+        if self._session is None:
+            raise GoogleDriveError("Sessão não iniciada: use 'async with AsyncGoogleDriveClient()'")
+        
+        if max_retries is None:
+            max_retries = self.max_retries
+        
+        attempt = 0
+        while True:
+            await self.rate_limiter.wait()
+            request_headers = {**await self._auth_headers(), **(headers or {})}
+            
+            try:
+                response = await self._session.request(method, url, headers=request_headers, **kwargs)
+            except aiohttp.ClientError as e:
+                error, retryable = f"{type(e).__name__}: {e}", True
+            else:
+                if response.status < 400 or response.status in allowed_statuses:
+                    return response
+                body = await response.text()
+                response.release()
+                error = f"HTTP {response.status}: {body[:200]}"
+                retryable = is_retryable_response(response.status, body)
+            
+            if not retryable or attempt >= max_retries:
+                raise GoogleDriveError(f"{method} {url} falhou: {error}")
+            
+            wait_time = Config.RETRY_BACKOFF_FACTOR ** attempt
+            logger.debug(f"Retry {attempt + 1}/{max_retries} em {wait_time}s ({error})")
+            await asyncio.sleep(wait_time)
+            attempt += 1
+    
+    async def _get_json(self, url: str, params: Dict) -> Dict:
+        async with await self._send('GET', url, params=params) as response:
+            return await response.json()
+    
+    # ==================== LISTAGEM ====================
+    
+    async def list_children_page(
+        self,
+        parent_ids: List[str],
+        page_token: Optional[str] = None,
+        fields: str = FILE_LIST_FIELDS
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Listar uma página de filhos de várias pastas (query OR)"""
+        parents_clause = ' or '.join(f"'{pid}' in parents" for pid in parent_ids)
+        params = {
+            'q': f"({parents_clause}) and trashed=false",
+            'spaces': 'drive',
+            'pageSize': str(LIST_PAGE_SIZE),
+            'fields': fields,
+        }
+        if page_token:
+            params['pageToken'] = page_token
+        
+        results = await self._get_json(f"{self.api_url}/files", params)
+        return results.get('files', []), results.get('nextPageToken')
+    
+    async def _list_group(self, group: List[str]) -> List[Dict]:
+        """Listar todas as páginas de um grupo de pastas"""
+        items = []
+        page_token = None
+        while True:
+            page, page_token = await self.list_children_page(group, page_token)
+            items.extend(page)
+            if not page_token:
+                return items
+    
+    async def iter_files(
+        self,
+        folder_id: str,
+        recursive: bool = True,
+        include_folders: bool = False
+    ) -> AsyncIterator[Dict]:
+        """
+        Iterar sobre os arquivos abaixo de uma pasta
+        
+        Cada nível da árvore é listado com um grupo de queries OR em paralelo
+        (ver GoogleDriveClient._group_parent_ids).
+        
+        Args:
+            folder_id: ID da pasta
+            recursive: Incluir subpastas
+            include_folders: Também produzir as subpastas
+        
+        Yields:
+            Metadados no formato da API do Drive
+        """
+        level = [folder_id]
+        seen = {folder_id}
+        
+        while level:
+            groups = GoogleDriveClient._group_parent_ids(level)
+            pages = await asyncio.gather(*(self._list_group(group) for group in groups))
+            
+            level = []
+            for items in pages:
+                for item in items:
+                    is_folder = item.get('mimeType') == FOLDER_MIME_TYPE
+                    if is_folder and recursive and item['id'] not in seen:
+                        seen.add(item['id'])
+                        level.append(item['id'])
+                    if not is_folder or include_folders:
+                        yield item
+    
+    async def list_files(self, folder_id: str, recursive: bool = True) -> List[Dict]:
+        """Listar arquivos abaixo de uma pasta (ver iter_files)"""
+        return [item async for item in self.iter_files(folder_id, recursive)]
+    
+    async def find_folder(self, folder_name: str) -> Optional[str]:
+        """
+        Resolver nome ou caminho ("A/B/C") de pasta para ID
+        
+        Returns:
+            ID da pasta ou None se não encontrada
+        """
+        parts = [p.strip() for p in folder_name.split('/') if p.strip()]
+        parent_id = None
+        
+        for i, part in enumerate(parts):
+            key = '/'.join(parts[:i + 1])
+            folder_id = self._folder_ids.get(key)
+            
+            if folder_id is None:
+                query = f"name='{part}' and mimeType='{FOLDER_MIME_TYPE}' and trashed=false"
+                if parent_id:
+                    query += f" and '{parent_id}' in parents"
+                results = await self._get_json(f"{self.api_url}/files", {
+                    'q': query, 'spaces': 'drive', 'pageSize': '10', 'fields': 'files(id, name)'
+                })
+                files = results.get('files', [])
+                if not files:
+                    logger.warning(f"Pasta não encontrada: {key}")
+                    return None
+                folder_id = next((f for f in files if f['name'] == part), files[0])['id']
+                self._folder_ids[key] = folder_id
+            
+            parent_id = folder_id
+        
+        return parent_id
+    
+    async def build_study_manifest(self, study_info: Dict) -> StudyManifest:
+        """Montar manifesto do estudo (ver GoogleDriveClient.build_study_manifest)"""
+        root_id = study_info['dicom_folder_id']
+        items = [item async for item in self.iter_files(root_id, include_folders=True)]
+        return StudyManifest.from_items(root_id, items)
+    
+    # ==================== DOWNLOAD / UPLOAD ====================
+    
+    async def download_file(
+        self,
+        file_id: str,
+        output_path: Path,
+        expected_size: Optional[int] = None,
+        expected_md5: Optional[str] = None
+    ) -> int:
+        """
+        Baixar arquivo com resume (.part + Range) e rename atômico
+        
+        Args:
+            file_id: ID do arquivo no Google Drive
+            output_path: Caminho local de saída
+            expected_size: Tamanho esperado em bytes
+            expected_md5: md5Checksum esperado
+        
+        Returns:
+            Bytes transferidos pela rede
+        
+        Raises:
+            DownloadError: Se o download ou a verificação falhar
+        """
+        output_path = Path(output_path)
+        part_path = output_path.with_name(output_path.name + '.part')
+        offset = await asyncio.to_thread(self._prepare_part, part_path)
+        if expected_size is not None and offset > expected_size:
+            offset = 0
+        
+        transferred = 0
+        try:
+            if expected_size is None or offset < expected_size:
+                headers = {'Range': f"bytes={offset}-"} if offset else {}
+                response = await self._send(
+                    'GET',
+                    f"{self.api_url}/files/{file_id}",
+                    params={'alt': 'media'},
+                    headers=headers,
+                    allowed_statuses=(416,)
+                )
+                async with response:
+                    if response.status != 416:
+                        if response.status == 200:
+                            offset = 0  # Servidor ignorou o Range
+                        fh = await asyncio.to_thread(self._open_part, part_path, offset)
+                        try:
+                            async for chunk in response.content.iter_chunked(DOWNLOAD_READ_SIZE):
+                                await asyncio.to_thread(fh.write, chunk)
+                                transferred += len(chunk)
+                        finally:
+                            await asyncio.to_thread(fh.close)
+            
+            await asyncio.to_thread(GoogleDriveClient._verify_part, part_path, expected_size, expected_md5)
+            await asyncio.to_thread(os.replace, part_path, output_path)
+            return transferred
+        
+        except (GoogleDriveError, OSError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # ClientPayloadError/timeout de leitura surgem durante o streaming do corpo
+            raise DownloadError(f"Erro ao fazer download de {file_id}: {e}")
+    
+    @staticmethod
+    def _prepare_part(part_path: Path) -> int:
+        """Criar diretório de saída; retorna o tamanho do .part existente"""
+        part_path.parent.mkdir(parents=True, exist_ok=True)
+        return part_path.stat().st_size if part_path.exists() else 0
+    
+    @staticmethod
+    def _open_part(part_path: Path, offset: int):
+        """Abrir .part para escrita a partir de offset (descarta o restante)"""
+        fh = open(part_path, 'r+b' if offset else 'wb')
+        fh.seek(offset)
+        fh.truncate()
+        return fh
+    
+    async def upload_file(
+        self,
+        file_path: Path,
+        folder_id: str,
+        file_name: Optional[str] = None
+    ) -> str:
+        """
+        Upload de arquivo para o Google Drive
+        
+        Arquivos até Config.UPLOAD_MULTIPART_MAX_MB vão em uma requisição
+        multipart; acima disso, por uma sessão resumable em chunks lidos do
+        disco (o arquivo nunca é carregado inteiro na memória).
+        
+        Returns:
+            ID do arquivo criado no Google Drive
+        
+        Raises:
+            UploadError: Se o upload falhar
+        """
+        file_path = Path(file_path)
+        metadata = {'name': file_name or file_path.name, 'parents': [folder_id]}
+        
+        try:
+            size = (await asyncio.to_thread(file_path.stat)).st_size
+            if size <= Config.UPLOAD_MULTIPART_MAX_MB * 1024 * 1024:
+                result, local_md5 = await self._upload_multipart(file_path, metadata)
+            else:
+                result = await self._upload_resumable(file_path, metadata, size)
+                local_md5 = await asyncio.to_thread(calculate_checksum, file_path, 'md5')
+            
+            if result.get('md5Checksum') and result['md5Checksum'] != local_md5:
+                raise UploadError(f"md5 divergente após upload: {file_path.name}")
+            return result['id']
+        
+        except (GoogleDriveError, OSError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise UploadError(f"Erro ao fazer upload de {file_path}: {e}")
+    
+    async def _upload_multipart(self, file_path: Path, metadata: Dict) -> Tuple[Dict, str]:
+        """Upload em uma requisição (metadados + conteúdo); retorna (resposta, md5 local)"""
+        boundary = uuid.uuid4().hex
+        content = await asyncio.to_thread(file_path.read_bytes)
+        body = b''.join([
+            f"--{boundary}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n".encode(),
+            json.dumps(metadata).encode(),
+            f"\r\n--{boundary}\r\nContent-Type: application/octet-stream\r\n\r\n".encode(),
+            content,
+            f"\r\n--{boundary}--".encode(),
+        ])
+        
+        response = await self._send(
+            'POST',
+            f"{self.upload_url}/files",
+            params={'uploadType': 'multipart', 'fields': UPLOAD_FIELDS, 'supportsAllDrives': 'true'},
+            headers={'Content-Type': f"multipart/related; boundary={boundary}"},
+            data=body
+        )
+        async with response:
+            result = await response.json()
+        return result, hashlib.md5(content).hexdigest()
+    
+    async def _upload_resumable(self, file_path: Path, metadata: Dict, size: int) -> Dict:
+        """
+        Upload por sessão resumable, com chunk adaptativo
+        
+        Cada chunk é enviado com Content-Range sem retry automático; se
+        falhar, o offset confirmado é consultado (`bytes */N`) e o envio
+        continua dali, até Config.MAX_RETRIES falhas seguidas.
+        """
+        response = await self._send(
+            'POST',
+            f"{self.upload_url}/files",
+            params={'uploadType': 'resumable', 'fields': UPLOAD_FIELDS, 'supportsAllDrives': 'true'},
+            headers={
+                'Content-Type': 'application/json; charset=UTF-8',
+                'X-Upload-Content-Length': str(size),
+            },
+            data=json.dumps(metadata)
+        )
+        async with response:
+            session_uri = response.headers['Location']
+        
+        sizer = self.upload_chunk_sizer
+        offset = 0
+        failures = 0
+        fh = await asyncio.to_thread(open, file_path, 'rb')
+        try:
+            while True:
+                chunk = await asyncio.to_thread(self._read_at, fh, offset, sizer.chunk_size())
+                headers = {'Content-Range': f"bytes {offset}-{offset + len(chunk) - 1}/{size}"}
+                started = time.monotonic()
+                try:
+                    response = await self._send(
+                        'PUT', session_uri, allowed_statuses=(308,),
+                        headers=headers, max_retries=0, data=chunk
+                    )
+                except GoogleDriveError as e:
+                    failures += 1
+                    if failures > self.max_retries:
+                        raise
+                    logger.debug(f"Chunk falhou, consultando offset da sessão ({e})")
+                    await asyncio.sleep(Config.RETRY_BACKOFF_FACTOR ** (failures - 1))
+                    offset, result = await self._upload_status(session_uri, size)
+                    if result is not None:
+                        return result
+                    continue
+                
+                async with response:
+                    if response.status != 308:
+                        return await response.json()
+                    offset = self._committed_offset(response.headers.get('Range'))
+                
+                sizer.record(len(chunk), time.monotonic() - started)
+                failures = 0
+        finally:
+            await asyncio.to_thread(fh.close)
+    
+    async def _upload_status(self, session_uri: str, size: int) -> Tuple[int, Optional[Dict]]:
+        """Consultar offset confirmado da sessão; retorna (offset, resposta final ou None)"""
+        response = await self._send(
+            'PUT', session_uri, allowed_statuses=(308,),
+            headers={'Content-Range': f"bytes */{size}"}
+        )
+        async with response:
+            if response.status != 308:
+                return size, await response.json()
+            return self._committed_offset(response.headers.get('Range')), None
+    
+    @staticmethod
+    def _committed_offset(range_header: Optional[str]) -> int:
+        """Próximo byte a enviar a partir do header Range ("bytes=0-N") de um 308"""
+        match = re.match(r'bytes=0-(\d+)', range_header or '')
+        return int(match.group(1)) + 1 if match else 0
+    
+    @staticmethod
+    def _read_at(fh, offset: int, size: int) -> bytes:
+        fh.seek(offset)
+        return fh.read(size)
@@ -0,0 +1,140 @@
+"""
+Tamanho de chunk adaptativo para download e upload de mídia
+"""
+import math
+import threading
+from typing import Dict, Optional
+
+
+MB = 1024 * 1024
+INITIAL_CHUNK_BYTES = 10 * MB  # Tamanho fixo usado antes da adaptação
+UPLOAD_CHUNK_MULTIPLE = 256 * 1024  # Uploads resumable exigem múltiplos de 256 KB
+
+
+class AdaptiveChunkSizer:
+    """
+    Escolhe o tamanho de chunk a partir da vazão e da latência observadas
+    
+    Cada requisição de chunk concluída é registrada com `record()`. A vazão
+    por requisição e a duração das requisições são suavizadas (média móvel
+    exponencial) e o próximo chunk é dimensionado para durar cerca de
+    `target_seconds`: em links rápidos os chunks crescem (menos idas e
+    voltas), em links lentos encolhem (menos memória e menos trabalho
+    perdido em um retry). Uma requisição muito acima do alvo reduz o
+    chunk pela metade imediatamente.
+    
+    Um sizer é compartilhado pelos workers do cliente (thread-safe).
+    """
+    
+    def __init__(
+        self,
+        min_bytes: int,
+        max_bytes: int,
+        initial_bytes: Optional[int] = None,
+        target_seconds: float = 2.0,
+        multiple: int = 1,
+        smoothing: float = 0.3
+    ):
+        """
+        Inicializar sizer
+        
+        Args:
+            min_bytes: Menor chunk permitido
+            max_bytes: Maior chunk permitido
+            initial_bytes: Chunk antes da primeira medição (padrão: min_bytes)
+            target_seconds: Duração alvo de cada requisição
+            multiple: Arredondar o chunk para múltiplos deste valor
+            smoothing: Peso de cada nova medição na média móvel (0-1)
+        """
+        self.multiple = max(1, multiple)
+        self.min_bytes = self._round(min_bytes, up=True)
+        self.max_bytes = max(self.min_bytes, self._round(max_bytes))
+        self.target_seconds = target_seconds
+        self.smoothing = smoothing
+        
+        self._lock = threading.Lock()
+        self._chunk_bytes = self._clamp(initial_bytes or min_bytes)
+        
+        self.throughput_bps: Optional[float] = None
+        self.latency_seconds: Optional[float] = None
+        self.requests = 0
+        self.smallest_chunk = self._chunk_bytes
+        self.largest_chunk = self._chunk_bytes
+    
+    @classmethod
+    def for_download(cls, config) -> 'AdaptiveChunkSizer':
+        """Sizer de download com limites de Config"""
+        return cls(
+            min_bytes=int(config.CHUNK_MIN_MB * MB),
+            max_bytes=int(config.CHUNK_MAX_MB * MB),
+            initial_bytes=INITIAL_CHUNK_BYTES,
+            target_seconds=config.CHUNK_TARGET_SECONDS
+        )
+    
+    @classmethod
+    def for_upload(cls, config) -> 'AdaptiveChunkSizer':
+        """Sizer de upload resumable (múltiplos de 256 KB)"""
+        return cls(
+            min_bytes=int(config.CHUNK_MIN_MB * MB),
+            max_bytes=int(config.CHUNK_MAX_MB * MB),
+            initial_bytes=INITIAL_CHUNK_BYTES,
+            target_seconds=config.CHUNK_TARGET_SECONDS,
+            multiple=UPLOAD_CHUNK_MULTIPLE
+        )
+    
+    def _round(self, size: float, up: bool = False) -> int:
+        units = size / self.multiple
+        units = math.ceil(units) if up else int(units)
+        return max(1, units) * self.multiple
+    
+    def _clamp(self, size: float) -> int:
+        return min(self.max_bytes, max(self.min_bytes, self._round(size)))
+    
+    def chunk_size(self) -> int:
+        """Tamanho (bytes) para a próxima requisição"""
+        with self._lock:
+            return self._chunk_bytes
+    
+    def record(self, nbytes: int, seconds: float) -> None:
+        """
+        Registrar uma requisição de chunk concluída
+        
+        Args:
+            nbytes: Bytes transferidos na requisição
+            seconds: Duração da requisição
+        """
+        if nbytes <= 0 or seconds <= 0:
+            return
+        
+        with self._lock:
+            alpha = self.smoothing
+            throughput = nbytes / seconds
+            if self.throughput_bps is None:
+                self.throughput_bps = throughput
+                self.latency_seconds = seconds
+            else:
+                self.throughput_bps += alpha * (throughput - self.throughput_bps)
+                self.latency_seconds += alpha * (seconds - self.latency_seconds)
+            self.requests += 1
+            
+            if seconds > 2 * self.target_seconds:
+                # Link travou ou degradou: reagir sem esperar a média
+                target = self._chunk_bytes / 2
+            else:
+                target = self.throughput_bps * self.target_seconds
+            
+            self._chunk_bytes = self._clamp(target)
+            self.smallest_chunk = min(self.smallest_chunk, self._chunk_bytes)
+            self.largest_chunk = max(self.largest_chunk, self._chunk_bytes)
+    
+    def to_dict(self) -> Dict:
+        """Resumo para estatísticas de execução"""
+        with self._lock:
+            return {
+                'chunk_mb': self._chunk_bytes / MB,
+                'min_chunk_mb': self.smallest_chunk / MB,
+                'max_chunk_mb': self.largest_chunk / MB,
+                'throughput_mb_s': (self.throughput_bps or 0) / MB,
+                'latency_ms': (self.latency_seconds or 0) * 1000,
+                'requests': self.requests,
+            }
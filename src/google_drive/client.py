@@ -2,18 +2,87 @@
 Cliente para Google Drive
 """
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Iterator, Tuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+import json
+import mimetypes
+import os
+import re
+import threading
+import time
 from loguru import logger
 
+import httplib2
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
+from googleapiclient.http import MediaIoBaseUpload
 import io
 
 from ..core.config import Config
 from ..core.exceptions import GoogleDriveError, DownloadError, UploadError
+from ..utils.file_utils import calculate_checksum, HashingReader
 from .auth import GoogleDriveAuth
-from .rate_limiter import RateLimiter
+from .rate_limiter import RateLimiter, BandwidthLimiter
+from .metadata_index import DriveMetadataIndex
+from .folder_cache import FolderIdCache
+from .dicom_prefilter import RemoteDicomPrefilter
+from .study_manifest import StudyManifest
+from .download_engine import StudyDownloadEngine
+from .download_cache import DownloadCache
+from .transport import PooledAuthorizedHttp
+from .chunk_sizer import AdaptiveChunkSizer, UPLOAD_CHUNK_MULTIPLE
+from .upload_sessions import UploadSessionStore
+
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+FILE_LIST_FIELDS = 'nextPageToken, files(id, name, size, md5Checksum, mimeType, modifiedTime, parents)'
+LIST_PAGE_SIZE = 1000  # Máximo aceito pelo files.list
+MAX_QUERY_LENGTH = 4000  # Caracteres de cláusulas "in parents" por query OR
+UPLOAD_FIELDS = 'id, md5Checksum'
+BATCH_MAX_REQUESTS = 100  # Limite do endpoint de batch do Drive
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {'userRateLimitExceeded', 'rateLimitExceeded'}
+TRANSIENT_NETWORK_ERRORS = (OSError, httplib2.HttpLib2Error)  # Timeout, conexão
+CHANGE_LIST_FIELDS = (
+    'nextPageToken, newStartPageToken, changes(fileId, removed, '
+    'file(id, name, size, md5Checksum, mimeType, modifiedTime, parents, trashed))'
+)
+
+
+def is_retryable_response(status: Optional[int], content=b'') -> bool:
+    """
+    Erro transitório do Drive (vale repetir a requisição)?
+    
+    429 e 5xx sempre; 403 apenas quando o motivo é limite de taxa
+    (userRateLimitExceeded/rateLimitExceeded). Demais 403 (sem permissão,
+    cota de armazenamento, download bloqueado) nunca se resolvem com retry.
+    """
+    if status in RETRYABLE_STATUS_CODES:
+        return True
+    if status != 403:
+        return False
+    try:
+        error = json.loads(content)['error']
+        details = error.get('errors', []) + error.get('details', [])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return False
+    return any(
+        isinstance(detail, dict) and detail.get('reason') in RATE_LIMIT_REASONS
+        for detail in details
+    )
+
+
+def is_retryable_error(exception: Exception) -> bool:
+    """HttpError transitório (ver is_retryable_response)"""
+    if not isinstance(exception, HttpError):
+        return False
+    return is_retryable_response(exception.resp.status, exception.content)
+
+
+def _natural_sort_key(name: str) -> list:
+    """Chave de ordenação natural ("AAA2" < "AAA10", "2" < "10")"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
 
 
 class GoogleDriveClient:
@@ -32,7 +101,12 @@ class GoogleDriveClient:
         self,
         credentials_path: Optional[Path] = None,
         token_path: Optional[Path] = None,
-        rate_limit_rps: int = 5
+        rate_limit_rps: int = 5,
+        discovery_workers: Optional[int] = None,
+        metadata_index: Optional[DriveMetadataIndex] = None,
+        folder_cache: Optional[FolderIdCache] = None,
+        dicom_prefilter: Optional[RemoteDicomPrefilter] = None,
+        download_cache: Optional[DownloadCache] = None
     ):
         """
         Inicializar cliente
@@ -41,31 +115,146 @@ class GoogleDriveClient:
             credentials_path: Caminho para credentials.json
             token_path: Caminho para token.json
             rate_limit_rps: Requisições por segundo
+            discovery_workers: Workers para listagem concorrente de pastas
+            metadata_index: Índice local de metadados (evita re-varrer a árvore)
+            folder_cache: Cache caminho → ID de pasta (padrão: TTL de Config)
+            dicom_prefilter: Pré-filtro remoto de cabeçalho DICOM (criado sob demanda)
+            download_cache: Cache local de downloads (padrão: ativo se
+                Config.DOWNLOAD_CACHE_GB > 0)
         """
         self.credentials_path = credentials_path or Config.CREDENTIALS_PATH
         self.token_path = token_path or Config.TOKEN_PATH
-        self.rate_limiter = RateLimiter(rate_limit_rps)
+        self.rate_limiter = RateLimiter(
+            rate_limit_rps,
+            burst=Config.RATE_LIMIT_BURST,
+            shared_state_path=Config.RATE_LIMIT_SHARED_PATH or None
+        )
+        self.discovery_workers = discovery_workers or Config.MAX_WORKERS_DISCOVERY
+        self.metadata_index = metadata_index
+        self.folder_cache = folder_cache or FolderIdCache(
+            ttl_hours=Config.CACHE_TTL_HOURS,
+            persist_path=Config.FOLDER_CACHE_PATH if Config.PERSIST_FOLDER_CACHE else None
+        )
+        self._dicom_prefilter = dicom_prefilter
+        self.download_cache = download_cache
+        if self.download_cache is None and Config.DOWNLOAD_CACHE_GB > 0:
+            self.download_cache = DownloadCache(Config.DOWNLOAD_CACHE_DIR, Config.DOWNLOAD_CACHE_GB)
         
         # Autenticar
         auth = GoogleDriveAuth(self.credentials_path, self.token_path)
-        creds = auth.authenticate()
+        creds = self.credentials = auth.authenticate()
+        
+        # Criar serviço sobre um pool de conexões (httplib2 não é thread-safe)
+        self.http_pool = PooledAuthorizedHttp(
+            creds,
+            pool_size=Config.HTTP_POOL_SIZE,
+            timeout=Config.TIMEOUT_DOWNLOAD_SECONDS
+        )
+        self.service = build('drive', 'v3', http=self.http_pool, cache_discovery=False)
+        
+        # Tamanho de chunk adaptado à vazão medida (compartilhado pelos workers)
+        self.download_chunk_sizer = AdaptiveChunkSizer.for_download(Config)
+        self.upload_chunk_sizer = AdaptiveChunkSizer.for_upload(Config)
         
-        # Criar serviço
-        self.service = build('drive', 'v3', credentials=creds)
+        # Limite de banda em bytes/s, comum a todas as threads do cliente
+        self.download_bandwidth = BandwidthLimiter.from_config(Config, 'download')
+        self.upload_bandwidth = BandwidthLimiter.from_config(Config, 'upload')
+        
+        # Listagens das pastas de destino (deduplicação de uploads)
+        self._folder_listings: Dict[str, Dict[str, Dict[str, str]]] = {}
+        self._listing_locks: Dict[str, threading.Lock] = {}
+        self._listing_lock = threading.Lock()
+        self.uploads_skipped = 0
+        self._upload_sessions: Optional[UploadSessionStore] = None
         logger.info("✓ Google Drive client initialized")
     
+    @property
+    def dicom_prefilter(self) -> RemoteDicomPrefilter:
+        """Pré-filtro remoto de DICOM (cache em Config.DICOM_PROBE_CACHE_PATH)"""
+        if self._dicom_prefilter is None:
+            self._dicom_prefilter = RemoteDicomPrefilter(
+                self,
+                cache_path=Config.DICOM_PROBE_CACHE_PATH,
+                max_workers=self.discovery_workers
+            )
+        return self._dicom_prefilter
+    
+    @property
+    def upload_sessions(self) -> UploadSessionStore:
+        """Sessões de upload resumable (Config.UPLOAD_SESSIONS_PATH)"""
+        if self._upload_sessions is None:
+            self._upload_sessions = UploadSessionStore(Config.UPLOAD_SESSIONS_PATH)
+        return self._upload_sessions
+    
     def _execute_with_rate_limit(self, request):
         """Executar requisição com rate limiting"""
         with self.rate_limiter:
             return request.execute()
     
+    def _execute_batch(
+        self,
+        requests: List[Tuple[str, object]],
+        max_retries: Optional[int] = None
+    ) -> Dict[str, Dict]:
+        """
+        Executar requisições agrupadas em batch HTTP (até 100 por lote)
+        
+        Cada item do lote conta como uma requisição no rate limiter. Itens
+        que falham com erro transitório (429/5xx, 403 por limite de taxa;
+        ver is_retryable_error) são reenviados no
+        lote seguinte, com backoff; os demais erros são registrados e o
+        item é omitido do resultado.
+        
+        Args:
+            requests: Lista de (request_id, requisição) - ids únicos
+            max_retries: Tentativas por item (padrão: Config.MAX_RETRIES)
+        
+        Returns:
+            Dicionário request_id → resposta dos itens bem-sucedidos
+        """
+        max_retries = Config.MAX_RETRIES if max_retries is None else max_retries
+        responses = {}
+        attempts = {}
+        pending = list(requests)
+        
+        while pending:
+            chunk, pending = pending[:BATCH_MAX_REQUESTS], pending[BATCH_MAX_REQUESTS:]
+            by_id = dict(chunk)
+            failed = []
+            
+            def callback(request_id, response, exception):
+                if exception is None:
+                    responses[request_id] = response
+                    return
+                
+                attempts[request_id] = attempts.get(request_id, 0) + 1
+                if is_retryable_error(exception) and attempts[request_id] < max_retries:
+                    failed.append((request_id, by_id[request_id]))
+                else:
+                    logger.warning(f"Erro no item de batch {request_id}: {exception}")
+            
+            batch = self.service.new_batch_http_request(callback=callback)
+            for request_id, request in chunk:
+                batch.add(request, request_id=request_id)
+            
+            self.rate_limiter.wait(cost=len(chunk))
+            batch.execute()
+            
+            if failed:
+                backoff = Config.RETRY_BACKOFF_FACTOR ** max(attempts[i] for i, _ in failed)
+                logger.debug(f"Batch: {len(failed)} itens reenviados em {backoff}s")
+                time.sleep(backoff)
+                pending = failed + pending
+        
+        return responses
+    
     def list_files(
         self,
         folder_id: Optional[str] = None,
         folder_name: Optional[str] = None,
         recursive: bool = True,
         max_results: int = 1000,
-        filter_dicom: bool = True
+        filter_dicom: bool = False
     ) -> List[Dict]:
         """
         Listar arquivos em pasta (recursivamente se configurado)
@@ -75,11 +264,48 @@ class GoogleDriveClient:
             folder_name: Nome da pasta (se ID não conhecido)
             recursive: Listar recursivamente em subpastas
             max_results: Máximo de resultados
-            filter_dicom: Filtrar apenas arquivos DICOM (magic number)
+            filter_dicom: Filtrar apenas arquivos DICOM (sonda o cabeçalho
+                remoto; ver iter_files)
         
         Returns:
             Lista de arquivos com metadados
         """
+        files = list(self.iter_files(
+            folder_id, folder_name, recursive, max_results, filter_dicom
+        ))
+        logger.info(f"✓ {len(files)} arquivos listados")
+        return files
+    
+    def iter_files(
+        self,
+        folder_id: Optional[str] = None,
+        folder_name: Optional[str] = None,
+        recursive: bool = True,
+        max_results: Optional[int] = None,
+        filter_dicom: bool = False
+    ) -> Iterator[Dict]:
+        """
+        Iterar sobre arquivos de uma pasta à medida que o Drive os retorna
+        
+        Os arquivos são produzidos página a página, então o chamador pode
+        começar a processar enquanto a descoberta continua. Interromper a
+        iteração (break/close) cancela as listagens pendentes.
+        
+        Args:
+            folder_id: ID da pasta (se conhecido)
+            folder_name: Nome da pasta (se ID não conhecido)
+            recursive: Listar recursivamente em subpastas
+            max_results: Máximo de resultados (None = sem limite)
+            filter_dicom: Sondar o cabeçalho remoto (132 bytes via Range) e
+                omitir arquivos sem o magic number DICOM
+        
+        Yields:
+            Metadados de arquivos (pastas são omitidas)
+        
+        Raises:
+            GoogleDriveError: Se a pasta não for encontrada ou a listagem falhar
+        """
+        source = files = None
         try:
             # Se não tem folder_id, procurar pelo nome
             if not folder_id and folder_name:
@@ -97,28 +323,38 @@ class GoogleDriveClient:
                     logger.error(error_msg)
                     raise GoogleDriveError(error_msg)
             
-            files = []
-            
-            if recursive:
+            if self.metadata_index is not None:
+                # Descoberta a partir do índice local (apenas o delta vai ao Drive)
+                self.metadata_index.sync(self, folder_id)
+                source = self.metadata_index.iter_files(folder_id, recursive)
+            elif recursive:
                 # Busca recursiva em subpastas
                 logger.info(f"Listando recursivamente arquivos da pasta: {folder_id}")
-                files = self._list_files_recursive(folder_id, max_results)
+                source = self._crawl_folder_tree(folder_id)
             else:
                 # Busca apenas na pasta especificada
                 logger.info(f"Listando arquivos da pasta: {folder_id}")
-                files = self._list_files_in_folder(folder_id, max_results)
+                source = self._iter_files_in_folder(folder_id)
             
             # Filtrar apenas arquivos (não pastas)
-            files = [f for f in files if f.get('mimeType', '') != 'application/vnd.google-apps.folder']
-            
-            # Truncar se necessário
-            files = files[:max_results]
-            logger.info(f"✓ {len(files)} arquivos listados")
+            files = (f for f in source if f.get('mimeType', '') != FOLDER_MIME_TYPE)
+            if filter_dicom:
+                files = self.dicom_prefilter.filter(files)
             
-            return files
+            count = 0
+            for item in files:
+                yield item
+                count += 1
+                if max_results is not None and count >= max_results:
+                    break
         
         except HttpError as e:
             raise GoogleDriveError(f"Erro ao listar arquivos: {e}")
+        
+        finally:
+            for generator in (files, source):
+                if generator is not None:
+                    generator.close()
     
     def _list_files_in_folder(
         self,
@@ -126,27 +362,21 @@ class GoogleDriveClient:
         max_results: int = 1000
     ) -> List[Dict]:
         """Listar arquivos apenas na pasta especificada (não recursivo)"""
-        files = []
-        query = f"'{folder_id}' in parents and trashed=false"
-        
+        files = self._iter_files_in_folder(folder_id)
+        try:
+            return list(islice(files, max_results))
+        finally:
+            files.close()
+    
+    def _iter_files_in_folder(self, folder_id: str) -> Iterator[Dict]:
+        """Iterar, página a página, sobre os itens de uma única pasta"""
         page_token = None
         while True:
-            request = self.service.files().list(
-                q=query,
-                spaces='drive',
-                pageSize=100,
-                pageToken=page_token,
-                fields='files(id, name, size, mimeType, modifiedTime, parents)',
-            )
-            
-            results = self._execute_with_rate_limit(request)
-            files.extend(results.get('files', []))
+            items, page_token = self._list_children_page([folder_id], page_token)
+            yield from items
             
-            page_token = results.get('nextPageToken')
-            if not page_token or len(files) >= max_results:
+            if not page_token:
                 break
-        
-        return files
     
     def _list_files_recursive(
         self,
@@ -154,54 +384,239 @@ class GoogleDriveClient:
         max_results: int = 1000
     ) -> List[Dict]:
         """Listar arquivos recursivamente em subpastas"""
-        all_files = []
-        folders_to_process = [folder_id]
-        processed_folders = set()
+        crawler = self._crawl_folder_tree(folder_id)
+        try:
+            return list(islice(crawler, max_results))
+        finally:
+            # Encerrar o crawler cancela as listagens ainda pendentes
+            crawler.close()
+    
+    def _list_children_page(
+        self,
+        parent_ids: List[str],
+        page_token: Optional[str] = None,
+        fields: str = FILE_LIST_FIELDS
+    ) -> tuple:
+        """
+        Listar uma página de filhos de uma ou mais pastas
         
-        while folders_to_process and len(all_files) < max_results:
-            current_folder = folders_to_process.pop(0)
-            
-            # Evitar processar pasta duplicada
-            if current_folder in processed_folders:
-                continue
-            processed_folders.add(current_folder)
-            
+        Várias pastas são consultadas em uma única query
+        (`'a' in parents or 'b' in parents ...`); use `_group_parent_ids`
+        para respeitar o limite de tamanho da query.
+        
+        Returns:
+            Tupla (itens, próximo page token ou None)
+        """
+        parents_clause = ' or '.join(f"'{pid}' in parents" for pid in parent_ids)
+        request = self.service.files().list(
+            q=f"({parents_clause}) and trashed=false",
+            spaces='drive',
+            pageSize=LIST_PAGE_SIZE,
+            pageToken=page_token,
+            fields=fields,
+        )
+        results = self._execute_with_rate_limit(request)
+        return results.get('files', []), results.get('nextPageToken')
+    
+    def _list_children_page_with_retry(
+        self,
+        parent_ids: List[str],
+        page_token: Optional[str] = None
+    ) -> tuple:
+        """
+        Página de listagem com retry de erros transitórios (backoff exponencial)
+        
+        Erros permanentes, ou transitórios após Config.MAX_RETRIES
+        tentativas, são propagados.
+        """
+        attempts = max(1, Config.MAX_RETRIES)
+        for attempt in range(attempts):
             try:
-                query = f"'{current_folder}' in parents and trashed=false"
+                return self._list_children_page(parent_ids, page_token)
+            except (HttpError, *TRANSIENT_NETWORK_ERRORS) as e:
+                transient = not isinstance(e, HttpError) or is_retryable_error(e)
+                if not transient or attempt == attempts - 1:
+                    raise
+                wait_time = Config.RETRY_BACKOFF_FACTOR ** attempt
+                logger.warning(
+                    f"Retry {attempt + 1}/{attempts} da listagem {parent_ids} "
+                    f"(aguardando {wait_time}s): {e}"
+                )
+                time.sleep(wait_time)
+    
+    @staticmethod
+    def _group_parent_ids(
+        parent_ids: List[str],
+        max_groups: Optional[int] = None
+    ) -> List[List[str]]:
+        """
+        Agrupar IDs de pastas em grupos que cabem em uma única query
+        
+        Args:
+            parent_ids: IDs das pastas
+            max_groups: Se informado, distribuir em pelo menos este número
+                de grupos (quando houver IDs suficientes) para paralelizar
+        
+        Returns:
+            Lista de grupos de IDs
+        """
+        per_group = len(parent_ids)
+        if max_groups:
+            per_group = -(-len(parent_ids) // max_groups)  # ceil
+        
+        groups = []
+        current = []
+        current_length = 0
+        
+        for pid in parent_ids:
+            clause_length = len(pid) + len("'' in parents or ")
+            if current and (
+                current_length + clause_length > MAX_QUERY_LENGTH
+                or len(current) >= per_group
+            ):
+                groups.append(current)
+                current, current_length = [], 0
+            current.append(pid)
+            current_length += clause_length
+        
+        if current:
+            groups.append(current)
+        return groups
+    
+    def _list_children(
+        self,
+        parent_ids: List[str],
+        fields: str = FILE_LIST_FIELDS
+    ) -> Dict[str, List[Dict]]:
+        """
+        Listar filhos de várias pastas com queries OR e paginação completa
+        
+        Os resultados são separados de volta por pasta usando o campo
+        `parents` de cada item.
+        
+        Args:
+            parent_ids: IDs das pastas
+            fields: Campos da resposta (deve incluir nextPageToken e parents)
+        
+        Returns:
+            Dicionário parent_id → lista de itens filhos
+        """
+        children = {pid: [] for pid in parent_ids}
+        
+        for group in self._group_parent_ids(list(children)):
+            page_token = None
+            while True:
+                items, page_token = self._list_children_page(group, page_token, fields)
+                for item in items:
+                    for parent in item.get('parents', []):
+                        if parent in children:
+                            children[parent].append(item)
+                if not page_token:
+                    break
+        
+        return children
+    
+    def _crawl_folder_tree(
+        self,
+        folder_id: str,
+        include_folders: bool = False
+    ) -> Iterator[Dict]:
+        """
+        Percorrer a árvore de pastas em largura com listagens concorrentes
+        
+        As pastas descobertas entram em uma fronteira; sempre que há worker
+        livre, a fronteira é dividida em grupos consultados com uma única
+        query OR por grupo (ver `_group_parent_ids`). Cada página de cada
+        grupo é uma unidade de trabalho, de modo que até `discovery_workers`
+        listagens ficam em andamento ao mesmo tempo (todas passando pelo
+        rate limiter compartilhado) e níveis largos e rasos custam poucas
+        queries paginadas em vez de uma por pasta.
+        
+        Fechar o gerador (ex: ao atingir max_results) cancela as listagens
+        ainda não iniciadas; as que estão em andamento terminam sozinhas.
+        
+        Cada página é repetida em erros transitórios; se ainda assim falhar,
+        a varredura é interrompida com GoogleDriveError (uma listagem
+        truncada faria um estudo incompleto parecer completo).
+        
+        Args:
+            folder_id: ID da pasta raiz
+            include_folders: Também produzir as subpastas encontradas
+        
+        Yields:
+            Metadados de arquivos (e pastas, se include_folders)
+        
+        Raises:
+            GoogleDriveError: Se alguma página não puder ser listada
+        """
+        executor = ThreadPoolExecutor(
+            max_workers=self.discovery_workers,
+            thread_name_prefix='drive-crawl'
+        )
+        pending = {}
+        frontier = [folder_id]
+        seen_folders = {folder_id}
+        
+        def submit(group: List[str], page_token: Optional[str] = None):
+            future = executor.submit(self._list_children_page_with_retry, group, page_token)
+            pending[future] = group
+        
+        def fill_workers():
+            free_slots = self.discovery_workers - len(pending)
+            if not frontier or free_slots <= 0:
+                return
+            groups = self._group_parent_ids(frontier, max_groups=free_slots)
+            for group in groups[:free_slots]:
+                submit(group)
+            del frontier[:sum(len(g) for g in groups[:free_slots])]
+        
+        try:
+            fill_workers()
+            
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
                 
-                page_token = None
-                while True:
-                    request = self.service.files().list(
-                        q=query,
-                        spaces='drive',
-                        pageSize=100,
-                        pageToken=page_token,
-                        fields='files(id, name, size, mimeType, modifiedTime, parents)',
-                    )
+                for future in done:
+                    group = pending.pop(future)
+                    
+                    try:
+                        items, next_page_token = future.result()
+                    except (HttpError, *TRANSIENT_NETWORK_ERRORS) as e:
+                        raise GoogleDriveError(f"Erro ao listar pastas {group}: {e}") from e
                     
-                    results = self._execute_with_rate_limit(request)
-                    items = results.get('files', [])
+                    if next_page_token:
+                        submit(group, next_page_token)
                     
+                    # Enfileirar subpastas antes de entregar os arquivos,
+                    # para manter os workers ocupados enquanto o chamador consome
                     for item in items:
-                        # Se é pasta, adicionar para processar depois
-                        if item.get('mimeType') == 'application/vnd.google-apps.folder':
-                            if item['id'] not in processed_folders:
-                                folders_to_process.append(item['id'])
-                        else:
-                            # É arquivo, adicionar à lista
-                            all_files.append(item)
-                            if len(all_files) >= max_results:
-                                break
+                        if item.get('mimeType') == FOLDER_MIME_TYPE and item['id'] not in seen_folders:
+                            seen_folders.add(item['id'])
+                            frontier.append(item['id'])
+                    fill_workers()
                     
-                    page_token = results.get('nextPageToken')
-                    if not page_token or len(all_files) >= max_results:
-                        break
-            
-            except HttpError as e:
-                logger.warning(f"Erro ao listar pasta {current_folder}: {e}")
-                continue
+                    for item in items:
+                        if item.get('mimeType') != FOLDER_MIME_TYPE or include_folders:
+                            yield item
+                
+                fill_workers()
+        
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+    
+    def resolve_folder_id(self, folder_name: str) -> Optional[str]:
+        """
+        Resolver nome/caminho de pasta para ID (com cache TTL compartilhado)
+        
+        Args:
+            folder_name: Nome da pasta ou caminho completo
         
-        return all_files[:max_results]
+        Returns:
+            ID da pasta ou None se não encontrada
+        """
+        return self._find_folder_by_name(folder_name)
     
     def _find_folder_by_name(self, folder_name: str) -> Optional[str]:
         """
@@ -223,20 +638,10 @@ class GoogleDriveClient:
                 return self._find_folder_by_path(folder_name)
             
             # Busca simples por nome
-            query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
-            request = self.service.files().list(
-                q=query,
-                spaces='drive',
-                pageSize=1,
-                fields='files(id)',
+            return self.folder_cache.get_or_resolve(
+                folder_name,
+                lambda: self._query_child_folder(folder_name)
             )
-            
-            results = self._execute_with_rate_limit(request)
-            files = results.get('files', [])
-            
-            if files:
-                return files[0]['id']
-            return None
         
         except HttpError as e:
             logger.warning(f"Erro ao buscar pasta '{folder_name}': {e}")
@@ -248,6 +653,10 @@ class GoogleDriveClient:
         
         Ex: "Medicina/Doutorado IDOR/Exames/DICOM"
         
+        Cada prefixo do caminho é resolvido através do cache de pastas,
+        então caminhos irmãos reaproveitam os ancestrais já resolvidos e
+        buscas concorrentes do mesmo prefixo geram uma única consulta.
+        
         Args:
             path: Caminho com pastas separadas por "/"
         
@@ -265,46 +674,18 @@ class GoogleDriveClient:
             
             # Navegar por cada parte do caminho
             for i, part in enumerate(parts):
-                logger.debug(f"Buscando pasta: {part}")
-                
-                if current_folder_id:
-                    # Buscar dentro da pasta atual
-                    query = f"name='{part}' and mimeType='application/vnd.google-apps.folder' and '{current_folder_id}' in parents and trashed=false"
-                else:
-                    # Buscar na raiz
-                    query = f"name='{part}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
-                
-                request = self.service.files().list(
-                    q=query,
-                    spaces='drive',
-                    pageSize=10,  # Aumentado para lidar com homônimos
-                    fields='files(id, name)',
+                parent_id = current_folder_id
+                current_folder_id = self.folder_cache.get_or_resolve(
+                    '/'.join(parts[:i + 1]),
+                    lambda: self._query_child_folder(part, parent_id)
                 )
                 
-                results = self._execute_with_rate_limit(request)
-                files = results.get('files', [])
-                
-                if not files:
+                if not current_folder_id:
                     logger.warning(f"Pasta não encontrada: {part}")
                     logger.warning(f"Caminho procurado até: {'/'.join(parts[:i])}")
                     return None
-                
-                # Se múltiplas opções, preferir match exato
-                found = None
-                for f in files:
-                    if f['name'] == part:  # Match exato
-                        found = f
-                        break
-                
-                # Se não encontrou match exato, usar primeiro resultado
-                if not found:
-                    found = files[0]
-                    logger.debug(f"Usando aproximação: {found['name']}")
-                
-                current_folder_id = found['id']
-                logger.debug(f"✓ Pasta encontrada: {found['name']} (ID: {current_folder_id})")
             
-            logger.info(f"✓ Caminho encontrado: {path} → {current_folder_id}")
+            logger.debug(f"✓ Caminho encontrado: {path} → {current_folder_id}")
             return current_folder_id
         
         except HttpError as e:
@@ -314,21 +695,136 @@ class GoogleDriveClient:
             logger.error(f"Erro inesperado ao buscar caminho '{path}': {e}")
             return None
     
+    def ensure_folder_path(self, parent_id: str, path: str) -> str:
+        """
+        Obter ID de um caminho de pastas abaixo de parent_id, criando o que faltar
+        
+        Ex: ensure_folder_path(output_id, "AAA1/12")
+        
+        Cada prefixo é resolvido (ou criado) uma única vez através do cache
+        de pastas: chamadas concorrentes para caminhos irmãos compartilham a
+        criação do ancestral em vez de gerar pastas duplicadas.
+        
+        Args:
+            parent_id: Pasta base (deve existir)
+            path: Caminho relativo com pastas separadas por "/"
+        
+        Returns:
+            ID da pasta final
+        """
+        parts = [p.strip() for p in path.split('/') if p.strip()]
+        current_folder_id = parent_id
+        
+        for i, part in enumerate(parts):
+            parent = current_folder_id
+            current_folder_id = self.folder_cache.get_or_resolve(
+                f"{parent_id}/{'/'.join(parts[:i + 1])}",
+                lambda: self._query_child_folder(part, parent) or self.create_folder(part, parent)
+            )
+        
+        return current_folder_id
+    
+    def create_folder(self, name: str, parent_id: str) -> str:
+        """
+        Criar pasta no Google Drive
+        
+        Args:
+            name: Nome da pasta
+            parent_id: ID da pasta pai
+        
+        Returns:
+            ID da pasta criada
+        """
+        request = self.service.files().create(
+            body={'name': name, 'mimeType': FOLDER_MIME_TYPE, 'parents': [parent_id]},
+            fields='id',
+            supportsAllDrives=True
+        )
+        folder_id = self._execute_with_rate_limit(request)['id']
+        logger.debug(f"✓ Pasta criada: {name} (ID: {folder_id})")
+        return folder_id
+    
+    def _query_child_folder(
+        self,
+        name: str,
+        parent_id: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Consultar o Drive por uma pasta com o nome dado
+        
+        Args:
+            name: Nome da pasta
+            parent_id: Pasta pai (None = qualquer lugar)
+        
+        Returns:
+            ID da pasta ou None se não encontrada
+        """
+        logger.debug(f"Buscando pasta: {name}")
+        
+        if parent_id:
+            # Buscar dentro da pasta atual
+            query = f"name='{name}' and mimeType='{FOLDER_MIME_TYPE}' and '{parent_id}' in parents and trashed=false"
+        else:
+            # Buscar na raiz
+            query = f"name='{name}' and mimeType='{FOLDER_MIME_TYPE}' and trashed=false"
+        
+        request = self.service.files().list(
+            q=query,
+            spaces='drive',
+            pageSize=10,  # Aumentado para lidar com homônimos
+            fields='files(id, name)',
+        )
+        
+        results = self._execute_with_rate_limit(request)
+        files = results.get('files', [])
+        
+        if not files:
+            return None
+        
+        # Se múltiplas opções, preferir match exato
+        found = None
+        for f in files:
+            if f['name'] == name:  # Match exato
+                found = f
+                break
+        
+        # Se não encontrou match exato, usar primeiro resultado
+        if not found:
+            found = files[0]
+            logger.debug(f"Usando aproximação: {found['name']}")
+        
+        logger.debug(f"✓ Pasta encontrada: {found['name']} (ID: {found['id']})")
+        return found['id']
+    
     def download_file(
         self,
         file_id: str,
         output_path: Path,
-        chunk_size_mb: int = 10,
-        timeout_seconds: int = 300
+        chunk_size_mb: Optional[int] = None,
+        timeout_seconds: int = 300,
+        expected_size: Optional[int] = None,
+        expected_md5: Optional[str] = None
     ) -> bool:
         """
         Download de arquivo com suporte a resume
         
+        Os bytes são gravados em `<output_path>.part`. Se o download for
+        interrompido (erro de rede, retry, reinício do processo), a próxima
+        chamada continua do tamanho atual do .part com requisições Range.
+        Ao terminar, o .part é verificado (tamanho/md5, se informados) e
+        renomeado atomicamente para output_path.
+        
+        Arquivos pequenos (expected_size <= Config.SMALL_FILE_MAX_MB, ex:
+        fatias DICOM) usam um único GET sem o laço de chunks.
+        
         Args:
             file_id: ID do arquivo no Google Drive
             output_path: Caminho local de saída
-            chunk_size_mb: Tamanho de chunk em MB
+            chunk_size_mb: Tamanho fixo de chunk em MB (None = adaptativo,
+                ver download_chunk_sizer)
             timeout_seconds: Timeout em segundos
+            expected_size: Tamanho esperado em bytes (campo `size` da listagem)
+            expected_md5: md5Checksum esperado (campo da listagem)
         
         Returns:
             True se sucesso, False se falha
@@ -336,95 +832,428 @@ class GoogleDriveClient:
         try:
             output_path = Path(output_path)
             output_path.parent.mkdir(parents=True, exist_ok=True)
+            part_path = output_path.with_name(output_path.name + '.part')
             
-            # Preparar requisição
-            request = self.service.files().get_media(fileId=file_id)
+            offset = part_path.stat().st_size if part_path.exists() else 0
+            if expected_size is not None and offset > expected_size:
+                logger.warning(f"Arquivo parcial maior que o esperado, recomeçando: {part_path}")
+                offset = 0
             
-            logger.info(f"Iniciando download: {file_id} → {output_path}")
+            is_small = (
+                expected_size is not None and offset == 0
+                and expected_size <= Config.SMALL_FILE_MAX_MB * 1024 * 1024
+            )
+            # Fatias pequenas são muitas: registrar apenas em DEBUG
+            log = logger.debug if is_small else logger.info
             
-            with open(output_path, 'wb') as fh:
-                # MediaIoBaseDownload não aceita 'resumable' no construtor
-                downloader = MediaIoBaseDownload(
-                    fh,
-                    request,
-                    chunksize=chunk_size_mb * 1024 * 1024
-                )
-                
-                done = False
-                start_time = None
-                while not done:
-                    try:
-                        status, done = downloader.next_chunk()
-                        
-                        if status:
-                            progress = int(status.progress() * 100)
-                            logger.debug(f"Download progress: {progress}%")
-                    
-                    except HttpError as e:
-                        logger.error(f"Download interrupted: {e}")
-                        raise DownloadError(f"Download failed: {e}")
+            if is_small:
+                log(f"Download rápido: {file_id} → {output_path}")
+                self._download_small_to_part(file_id, part_path)
+            elif expected_size is None or offset < expected_size:
+                if offset:
+                    log(f"Retomando download: {file_id} → {output_path} (a partir de {offset} bytes)")
+                else:
+                    log(f"Iniciando download: {file_id} → {output_path}")
+                self._download_to_part(file_id, part_path, offset, chunk_size_mb)
+            
+            self._verify_part(part_path, expected_size, expected_md5)
+            os.replace(part_path, output_path)
             
-            logger.info(f"✓ Download concluído: {output_path}")
+            log(f"✓ Download concluído: {output_path}")
             return True
         
         except Exception as e:
             logger.error(f"Erro no download: {e}")
             raise DownloadError(f"Erro ao fazer download: {e}")
     
+    def _download_to_part(
+        self,
+        file_id: str,
+        part_path: Path,
+        offset: int,
+        chunk_size_mb: Optional[int] = None
+    ) -> None:
+        """
+        Baixar (ou continuar) o conteúdo em part_path a partir de offset
+        
+        Cada chunk é um GET com Range no transporte do próprio serviço
+        (uri, headers e http públicos do HttpRequest), então o offset inicial
+        e o tamanho de cada chunk não dependem de atributos internos do
+        MediaIoBaseDownload.
+        """
+        request = self.service.files().get_media(fileId=file_id)
+        sizer = None if chunk_size_mb else self.download_chunk_sizer
+        total = None
+        
+        with open(part_path, 'r+b' if offset else 'wb') as fh:
+            fh.seek(offset)
+            fh.truncate()
+            
+            while total is None or offset < total:
+                chunk_bytes = sizer.chunk_size() if sizer else chunk_size_mb * 1024 * 1024
+                chunk_bytes = self.download_bandwidth.limit_chunk(chunk_bytes)
+                headers = {**request.headers, 'range': f"bytes={offset}-{offset + chunk_bytes - 1}"}
+                
+                self.rate_limiter.wait()
+                started = time.monotonic()
+                resp, content = request.http.request(request.uri, method='GET', headers=headers)
+                
+                content_total = re.search(r'/(\d+)$', resp.get('content-range', ''))
+                if resp.status == 416 and content_total and int(content_total.group(1)) == offset:
+                    # .part já estava completo (Range além do fim do arquivo)
+                    return
+                if resp.status not in (200, 206):
+                    error = HttpError(resp, content, uri=request.uri)
+                    logger.error(f"Download interrupted: {error}")
+                    raise DownloadError(f"Download failed: {error}")
+                
+                if resp.status == 200:
+                    # Servidor ignorou o Range: o corpo é o arquivo inteiro
+                    fh.seek(0)
+                    fh.truncate()
+                    offset, total = 0, len(content)
+                elif content_total:
+                    total = int(content_total.group(1))
+                elif len(content) < chunk_bytes:
+                    total = offset + len(content)
+                
+                fh.write(content)
+                fh.flush()
+                offset += len(content)
+                if sizer:
+                    sizer.record(len(content), time.monotonic() - started)
+                self.download_bandwidth.consume(len(content))
+                
+                if total:
+                    logger.debug(f"Download progress: {int(offset * 100 / total)}%")
+                if not content:
+                    break
+    
+    def _download_small_to_part(self, file_id: str, part_path: Path) -> None:
+        """
+        Baixar arquivo pequeno com um único GET (sem o laço de chunks)
+        
+        Usa o transporte HTTP do próprio serviço, que mantém a conexão
+        keep-alive entre requisições, e grava o corpo de uma só vez.
+        """
+        request = self.service.files().get_media(fileId=file_id)
+        
+        self.rate_limiter.wait()
+        resp, content = request.http.request(request.uri, method='GET', headers=dict(request.headers))
+        if resp.status not in (200, 206):
+            raise DownloadError(f"Download failed: {HttpError(resp, content, uri=request.uri)}")
+        
+        with open(part_path, 'wb') as fh:
+            fh.write(content)
+        self.download_bandwidth.consume(len(content))
+    
+    @staticmethod
+    def _verify_part(
+        part_path: Path,
+        expected_size: Optional[int],
+        expected_md5: Optional[str]
+    ) -> None:
+        """Verificar .part concluído; descartá-lo se o conteúdo estiver corrompido"""
+        actual_size = part_path.stat().st_size
+        if expected_size is not None and actual_size != expected_size:
+            # Incompleto: manter o .part para a próxima tentativa continuar
+            raise DownloadError(
+                f"Tamanho incorreto: {actual_size} bytes (esperado {expected_size})"
+            )
+        
+        if expected_md5 and calculate_checksum(part_path, 'md5') != expected_md5:
+            part_path.unlink()
+            raise DownloadError(f"md5 divergente: {part_path.name}")
+    
     def upload_file(
         self,
         file_path: Path,
         folder_id: str,
-        file_name: Optional[str] = None
+        file_name: Optional[str] = None,
+        skip_existing: bool = False
     ) -> str:
         """
         Upload de arquivo para Google Drive
         
+        Arquivos até Config.UPLOAD_MULTIPART_MAX_MB (ex: JSON sidecars) são
+        enviados em uma única requisição multipart; acima disso, por uma
+        sessão resumable em chunks.
+        
+        O md5 é calculado durante o envio e comparado ao md5Checksum
+        devolvido pelo Drive; se divergir, o arquivo remoto é removido e o
+        upload falha (UploadError).
+        
         Args:
             file_path: Caminho do arquivo local
             folder_id: ID da pasta de destino
             file_name: Nome do arquivo no Drive (padrão: nome local)
+            skip_existing: Não enviar se a pasta já tem um arquivo com o
+                mesmo nome e md5 (listagem da pasta consultada uma vez)
         
         Returns:
-            ID do arquivo criado no Google Drive
+            ID do arquivo criado no Google Drive (ou do já existente)
         """
         try:
             file_path = Path(file_path)
             file_name = file_name or file_path.name
             
-            logger.info(f"Iniciando upload: {file_path} → {file_name}")
+            size = file_path.stat().st_size
+            is_small = size <= Config.UPLOAD_MULTIPART_MAX_MB * 1024 * 1024
+            # Upload resumable: md5 antes do envio (chave da sessão e dedup)
+            content_md5 = None if is_small else calculate_checksum(file_path, 'md5')
+            
+            if skip_existing:
+                existing_id = self._find_existing_upload(folder_id, file_name, file_path, content_md5)
+                if existing_id:
+                    logger.debug(f"Upload ignorado, já existe no destino: {file_name}")
+                    with self._listing_lock:
+                        self.uploads_skipped += 1
+                    return existing_id
             
             file_metadata = {
                 'name': file_name,
                 'parents': [folder_id]
             }
             
-            media = MediaFileUpload(
-                str(file_path),
-                resumable=True,
-                chunksize=10 * 1024 * 1024
-            )
+            log = logger.debug if is_small else logger.info
+            mimetype = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
             
-            request = self.service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id',
-                supportsAllDrives=True
-            )
+            log(f"Iniciando upload: {file_path} → {file_name}")
+            with open(file_path, 'rb') as fh:
+                reader = HashingReader(fh)
+                media = MediaIoBaseUpload(reader, mimetype, resumable=not is_small)
+                if is_small:
+                    response = self._upload_multipart(media, file_metadata, size)
+                else:
+                    response = self._upload_resumable(
+                        media,
+                        file_metadata,
+                        UploadSessionStore.session_key(folder_id, file_name, size, content_md5)
+                    )
             
-            file_id = None
-            while not file_id:
-                status, done = request.next_chunk()
-                if done:
-                    file_id = request.execute().get('id')
+            file_id = response['id']
+            local_md5 = reader.hexdigest(size) or content_md5 or calculate_checksum(file_path, 'md5')
+            self._verify_upload(response, local_md5, file_name)
+            self._remember_upload(folder_id, file_name, local_md5, file_id)
             
-            logger.info(f"✓ Upload concluído: {file_id}")
+            log(f"✓ Upload concluído: {file_id}")
             return file_id
         
         except Exception as e:
             logger.error(f"Erro no upload: {e}")
             raise UploadError(f"Erro ao fazer upload: {e}")
     
+    def _upload_multipart(self, media: MediaIoBaseUpload, file_metadata: Dict, size: int) -> Dict:
+        """Upload em uma única requisição (metadados + conteúdo)"""
+        request = self.service.files().create(
+            body=file_metadata,
+            media_body=media,
+            fields=UPLOAD_FIELDS,
+            supportsAllDrives=True
+        )
+        
+        response = self._execute_with_rate_limit(request)
+        self.upload_bandwidth.consume(size)
+        return response
+    
+    def _upload_resumable(
+        self,
+        media: MediaIoBaseUpload,
+        file_metadata: Dict,
+        session_key: Optional[str] = None
+    ) -> Dict:
+        """
+        Upload por sessão resumable, com chunk adaptativo
+        
+        O protocolo é executado diretamente sobre o HttpRequest de
+        files().create (uri, body, headers e http públicos): POST abre a
+        sessão, cada chunk é um PUT com Content-Range lido por
+        media.getbytes, e `Content-Range: bytes */N` consulta o offset
+        confirmado.
+        
+        Com session_key, a URI da sessão é gravada em upload_sessions assim
+        que aberta e, depois, o offset confirmado após cada chunk. Se já houver uma sessão salva
+        (retry ou nova execução), o envio continua do último byte confirmado
+        no Drive; sessão expirada recomeça do zero.
+        """
+        sizer = self.upload_chunk_sizer
+        size = media.size()
+        
+        request = self.service.files().create(
+            body=file_metadata,
+            media_body=media,
+            fields=UPLOAD_FIELDS,
+            supportsAllDrives=True
+        )
+        
+        session_uri, offset, response = None, 0, None
+        saved = self.upload_sessions.get(session_key) if session_key else None
+        if saved:
+            logger.info(f"Retomando upload: {file_metadata['name']} ({saved[1]} bytes já confirmados)")
+            try:
+                offset, response = self._resumable_request(
+                    request, saved[0], {'Content-Range': f"bytes */{size}", 'Content-Length': '0'}
+                )
+                session_uri = saved[0]
+            except HttpError as e:
+                if e.resp.status not in (404, 410):
+                    raise
+                logger.warning(f"Sessão de upload expirada, recomeçando: {file_metadata['name']}")
+                self.upload_sessions.delete(session_key)
+        
+        if session_uri is None:
+            session_uri = self._start_resumable_session(request, media)
+            if session_key:
+                # Falha antes do 1º chunk ainda reaproveita a sessão aberta
+                self.upload_sessions.save(session_key, session_uri, 0)
+        
+        while response is None:
+            # Cada chunk usa o tamanho atual (múltiplo de 256 KB)
+            chunk_bytes = self.upload_bandwidth.limit_chunk(sizer.chunk_size(), UPLOAD_CHUNK_MULTIPLE)
+            data = media.getbytes(offset, chunk_bytes)
+            headers = {
+                'Content-Range': f"bytes {offset}-{offset + len(data) - 1}/{size}",
+                'Content-Length': str(len(data)),
+            }
+            
+            started = time.monotonic()
+            confirmed, response = self._resumable_request(request, session_uri, headers, data)
+            sent = (size if response is not None else confirmed) - offset
+            sizer.record(sent, time.monotonic() - started)
+            self.upload_bandwidth.consume(max(sent, 0))
+            offset = confirmed
+            
+            if session_key and response is None:
+                self.upload_sessions.save(session_key, session_uri, offset)
+        
+        if session_key:
+            self.upload_sessions.delete(session_key)
+        return response
+    
+    def _start_resumable_session(self, request, media: MediaIoBaseUpload) -> str:
+        """Abrir sessão resumable (POST com os metadados); retorna a URI da sessão"""
+        headers = {
+            **request.headers,
+            'X-Upload-Content-Type': media.mimetype(),
+            'X-Upload-Content-Length': str(media.size()),
+        }
+        
+        self.rate_limiter.wait()
+        resp, content = request.http.request(
+            request.uri, method=request.method, body=request.body, headers=headers
+        )
+        if resp.status != 200 or 'location' not in resp:
+            raise HttpError(resp, content, uri=request.uri)
+        return resp['location']
+    
+    def _resumable_request(
+        self,
+        request,
+        session_uri: str,
+        headers: Dict[str, str],
+        data: bytes = b''
+    ) -> Tuple[int, Optional[Dict]]:
+        """
+        PUT na sessão resumable (chunk ou consulta de status)
+        
+        Returns:
+            (offset confirmado, resposta final ou None se ainda incompleto)
+        """
+        self.rate_limiter.wait()
+        resp, content = request.http.request(session_uri, method='PUT', body=data, headers=headers)
+        
+        if resp.status in (200, 201):
+            return int(headers['Content-Range'].rsplit('/', 1)[1]), json.loads(content)
+        if resp.status == 308:
+            # "308 Resume Incomplete": Range traz o último byte confirmado
+            confirmed = re.match(r'bytes=0-(\d+)', resp.get('range', ''))
+            return (int(confirmed.group(1)) + 1 if confirmed else 0), None
+        raise HttpError(resp, content, uri=session_uri)
+    
+    def _verify_upload(self, response: Dict, local_md5: str, file_name: str) -> None:
+        """Comparar md5Checksum devolvido pelo Drive com o md5 enviado"""
+        remote_md5 = response.get('md5Checksum')
+        if not remote_md5 or remote_md5 == local_md5:
+            return
+        
+        # Cópia corrompida não deve ficar no destino (nem ser deduplicada)
+        self._execute_with_rate_limit(
+            self.service.files().delete(fileId=response['id'], supportsAllDrives=True)
+        )
+        raise UploadError(f"md5 divergente após upload: {file_name}")
+    
+    def _folder_listing(self, folder_id: str) -> Dict[str, Dict[str, str]]:
+        """
+        Arquivos já existentes na pasta de destino: nome → {md5: ID}
+        
+        A pasta é listada uma única vez por cliente (chamadas concorrentes
+        aguardam a mesma listagem); uploads posteriores são acrescentados.
+        """
+        with self._listing_lock:
+            folder_lock = self._listing_locks.setdefault(folder_id, threading.Lock())
+        
+        with folder_lock:
+            if folder_id not in self._folder_listings:
+                files = self._list_all_pages(
+                    f"'{folder_id}' in parents and mimeType!='{FOLDER_MIME_TYPE}' and trashed=false",
+                    'nextPageToken, files(id, name, md5Checksum)'
+                )
+                listing = {}
+                for f in files:
+                    if f.get('md5Checksum'):
+                        listing.setdefault(f['name'], {})[f['md5Checksum']] = f['id']
+                self._folder_listings[folder_id] = listing
+            return self._folder_listings[folder_id]
+    
+    def _find_existing_upload(
+        self,
+        folder_id: str,
+        file_name: str,
+        file_path: Path,
+        md5: Optional[str] = None
+    ) -> Optional[str]:
+        """ID de um arquivo idêntico (nome + md5) já presente no destino"""
+        candidates = self._folder_listing(folder_id).get(file_name)
+        if not candidates:
+            return None
+        return candidates.get(md5 or calculate_checksum(file_path, 'md5'))
+    
+    def _remember_upload(self, folder_id: str, file_name: str, md5: str, file_id: str) -> None:
+        """Acrescentar upload concluído à listagem em cache da pasta"""
+        with self._listing_lock:
+            listing = self._folder_listings.get(folder_id)
+            if listing is not None:
+                listing.setdefault(file_name, {})[md5] = file_id
+    
+    def get_start_page_token(self) -> str:
+        """Obter page token atual do changes.list"""
+        try:
+            request = self.service.changes().getStartPageToken()
+            return self._execute_with_rate_limit(request)['startPageToken']
+        
+        except HttpError as e:
+            raise GoogleDriveError(f"Erro ao obter start page token: {e}")
+    
+    def list_changes(self, page_token: str) -> Dict:
+        """
+        Listar uma página de mudanças do Drive a partir de um page token
+        
+        Returns:
+            Resposta do changes.list (changes, nextPageToken/newStartPageToken)
+        """
+        try:
+            request = self.service.changes().list(
+                pageToken=page_token,
+                spaces='drive',
+                pageSize=1000,
+                includeRemoved=True,
+                fields=CHANGE_LIST_FIELDS,
+            )
+            return self._execute_with_rate_limit(request)
+        
+        except HttpError as e:
+            raise GoogleDriveError(f"Erro ao listar mudanças: {e}")
+    
     def get_file_info(self, file_id: str) -> Dict:
         """Obter informações de arquivo"""
         try:
@@ -440,11 +1269,40 @@ class GoogleDriveClient:
     def list_dicom_studies(
         self,
         folder_name: str,
-        max_results: int = 100
+        max_results: int = 100,
+        with_manifest: bool = False
     ) -> List[Dict]:
         """
         Listar estudos DICOM (pastas numeradas) em vez de arquivos individuais
         
+        Ver iter_studies para a estrutura esperada.
+        
+        Args:
+            folder_name: Caminho até DICOM (ex: "Medicina/Doutorado IDOR/Exames/DICOM")
+            max_results: Máximo de estudos a retornar
+            with_manifest: Incluir manifesto (tamanho/contagem) de cada estudo
+        
+        Returns:
+            Lista de dicionários com info dos estudos
+        """
+        try:
+            all_studies = list(self.iter_studies(folder_name, max_results, with_manifest))
+            logger.info(f"✓ {len(all_studies)} estudos DICOM encontrados")
+            return all_studies
+        
+        except GoogleDriveError as e:
+            logger.error(f"Erro ao listar estudos: {e}")
+            return []
+    
+    def iter_studies(
+        self,
+        folder_name: str,
+        max_results: Optional[int] = None,
+        with_manifest: bool = False
+    ) -> Iterator[Dict]:
+        """
+        Iterar sobre estudos DICOM à medida que são descobertos
+        
         Estrutura esperada:
         - Medicina/Doutorado IDOR/Exames/DICOM/
           - AAA1/
@@ -458,92 +1316,195 @@ class GoogleDriveClient:
           - AAA3/
             - ...
         
+        Os estudos são produzidos a cada batch de verificação concluído,
+        então o chamador pode começar a baixar antes do fim da descoberta.
+        
         Args:
             folder_name: Caminho até DICOM (ex: "Medicina/Doutorado IDOR/Exames/DICOM")
-            max_results: Máximo de estudos a retornar
+            max_results: Máximo de estudos (None = sem limite)
+            with_manifest: Incluir `manifest` (StudyManifest) em cada estudo
         
-        Returns:
-            Lista de dicionários com info dos estudos
+        Yields:
+            Dicionários com info dos estudos
+        
+        Raises:
+            GoogleDriveError: Se a listagem falhar
         """
+        # Encontrar pasta DICOM
+        dicom_folder_id = self._find_folder_by_name(folder_name)
+        if not dicom_folder_id:
+            logger.warning(f"Pasta não encontrada: {folder_name}")
+            return
+        
+        logger.info(f"Listando estudos DICOM de: {folder_name}")
+        
+        if self.metadata_index is not None:
+            self.metadata_index.sync(self, dicom_folder_id)
+            studies = self._iter_studies_from_index(dicom_folder_id)
+        else:
+            studies = self._iter_studies_from_drive(dicom_folder_id)
+        
         try:
-            # Encontrar pasta DICOM
-            dicom_folder_id = self._find_folder_by_name(folder_name)
-            if not dicom_folder_id:
-                logger.warning(f"Pasta não encontrada: {folder_name}")
-                return []
-            
-            logger.info(f"Listando estudos DICOM de: {folder_name}")
-            
-            all_studies = []
-            
-            # Encontrar subpastas AAA (AAA1, AAA2, AAA3)
-            aaa_results = self.service.files().list(
-                q=f"'{dicom_folder_id}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false",
+            for study in islice(studies, max_results):
+                if with_manifest:
+                    study['manifest'] = self.build_study_manifest(study)
+                yield study
+        
+        except HttpError as e:
+            raise GoogleDriveError(f"Erro ao listar estudos: {e}")
+        
+        finally:
+            studies.close()
+    
+    def _iter_studies_from_drive(self, dicom_folder_id: str) -> Iterator[Dict]:
+        """
+        Descobrir estudos consultando o Drive
+        
+        Cada pasta AAA é processada por um worker do pool de descoberta
+        (listagem paginada dos estudos + verificação em batch da subpasta
+        DICOM). Os resultados são entregues na ordem natural das pastas AAA
+        e dos estudos, independente da ordem de conclusão.
+        """
+        # Encontrar subpastas AAA (AAA1, AAA2, AAA3)
+        aaa_folders = sorted(
+            self._list_all_pages(
+                f"'{dicom_folder_id}' in parents and mimeType='{FOLDER_MIME_TYPE}' and trashed=false",
+                'nextPageToken, files(id, name)'
+            ),
+            key=lambda f: _natural_sort_key(f['name'])
+        )
+        logger.debug(f"Encontradas {len(aaa_folders)} pastas AAA")
+        
+        executor = ThreadPoolExecutor(
+            max_workers=self.discovery_workers,
+            thread_name_prefix='drive-studies'
+        )
+        futures = [
+            executor.submit(self._discover_aaa_studies, aaa_folder)
+            for aaa_folder in aaa_folders
+        ]
+        
+        try:
+            for aaa_folder, future in zip(aaa_folders, futures):
+                studies = future.result()
+                logger.debug(f"{aaa_folder['name']}: {len(studies)} estudos")
+                yield from studies
+        
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+    
+    def _discover_aaa_studies(self, aaa_folder: Dict) -> List[Dict]:
+        """Listar (com paginação completa) e validar os estudos de uma pasta AAA"""
+        studies = sorted(
+            self._list_all_pages(
+                f"'{aaa_folder['id']}' in parents and mimeType='{FOLDER_MIME_TYPE}' and trashed=false",
+                'nextPageToken, files(id, name, modifiedTime)'
+            ),
+            key=lambda f: _natural_sort_key(f['name'])
+        )
+        
+        # Verificar subpasta DICOM dos estudos em batches de até 100
+        dicom_subfolders = self._execute_batch([
+            (study['id'], self.service.files().list(
+                q=f"'{study['id']}' in parents and name='DICOM' and mimeType='{FOLDER_MIME_TYPE}' and trashed=false",
                 spaces='drive',
-                fields='files(id, name)',
-                pageSize=100
-            ).execute()
-            
-            aaa_folders = aaa_results.get('files', [])
-            logger.debug(f"Encontradas {len(aaa_folders)} pastas AAA")
-            
-            # Para cada pasta AAA
-            for aaa_folder in aaa_folders:
-                aaa_id = aaa_folder['id']
-                
-                # Listar estudos (pastas numeradas) dentro de AAA
-                studies_results = self.service.files().list(
-                    q=f"'{aaa_id}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false",
-                    spaces='drive',
-                    fields='files(id, name, modifiedTime)',
-                    pageSize=100
-                ).execute()
-                
-                studies = studies_results.get('files', [])
-                
-                for study in studies:
-                    # Verificar se tem subpasta DICOM
-                    study_id = study['id']
-                    
-                    dicom_subfolder_results = self.service.files().list(
-                        q=f"'{study_id}' in parents and name='DICOM' and mimeType='application/vnd.google-apps.folder' and trashed=false",
-                        spaces='drive',
-                        fields='files(id)',
-                        pageSize=1
-                    ).execute()
-                    
-                    dicom_subfolders = dicom_subfolder_results.get('files', [])
-                    
-                    if dicom_subfolders:
-                        # É um estudo válido
-                        study_info = {
-                            'id': study_id,
-                            'name': f"{aaa_folder['name']}/{study['name']}",
-                            'aaa_name': aaa_folder['name'],
-                            'study_number': study['name'],
-                            'dicom_folder_id': dicom_subfolders[0]['id'],
-                            'modified_time': study.get('modifiedTime')
-                        }
-                        all_studies.append(study_info)
-                        
-                        if len(all_studies) >= max_results:
-                            break
-                
-                if len(all_studies) >= max_results:
-                    break
+                fields='files(id)',
+                pageSize=1
+            ))
+            for study in studies
+        ])
+        
+        valid_studies = []
+        for study in studies:
+            found = dicom_subfolders.get(study['id'], {}).get('files', [])
+            if found:
+                # É um estudo válido
+                valid_studies.append(self._make_study_info(aaa_folder, study, found[0]['id']))
+        return valid_studies
+    
+    def _list_all_pages(self, query: str, fields: str) -> List[Dict]:
+        """Executar uma query seguindo todas as páginas (nextPageToken)"""
+        items = []
+        page_token = None
+        
+        while True:
+            results = self._execute_with_rate_limit(self.service.files().list(
+                q=query,
+                spaces='drive',
+                pageSize=LIST_PAGE_SIZE,
+                pageToken=page_token,
+                fields=fields,
+            ))
+            items.extend(results.get('files', []))
             
-            logger.info(f"✓ {len(all_studies)} estudos DICOM encontrados")
-            return all_studies
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return items
+    
+    @staticmethod
+    def _make_study_info(aaa_folder: Dict, study: Dict, dicom_folder_id: str) -> Dict:
+        """Montar dicionário de estudo retornado por list_dicom_studies"""
+        return {
+            'id': study['id'],
+            'name': f"{aaa_folder['name']}/{study['name']}",
+            'aaa_name': aaa_folder['name'],
+            'study_number': study['name'],
+            'dicom_folder_id': dicom_folder_id,
+            'modified_time': study.get('modifiedTime')
+        }
+    
+    def _iter_studies_from_index(self, dicom_folder_id: str) -> Iterator[Dict]:
+        """Descobrir estudos consultando apenas o índice local"""
+        by_name = lambda f: _natural_sort_key(f['name'])
         
-        except HttpError as e:
-            logger.error(f"Erro ao listar estudos: {e}")
-            return []
+        for aaa_folder in sorted(self.metadata_index.children(dicom_folder_id, folders_only=True), key=by_name):
+            for study in sorted(self.metadata_index.children(aaa_folder['id'], folders_only=True), key=by_name):
+                dicom_subfolders = self.metadata_index.children(
+                    study['id'], folders_only=True, name='DICOM'
+                )
+                if dicom_subfolders:
+                    yield self._make_study_info(aaa_folder, study, dicom_subfolders[0]['id'])
+    
+    def build_study_manifest(self, study_info: Dict) -> StudyManifest:
+        """
+        Montar manifesto do estudo (bytes, arquivos, séries, modificação)
+        
+        Usa apenas metadados de listagem: o índice local, se configurado,
+        ou a varredura concorrente da pasta DICOM do estudo.
+        
+        Args:
+            study_info: Dicionário retornado por iter_studies
+        
+        Returns:
+            StudyManifest com a lista completa (paginada) de arquivos
+        """
+        root_id = study_info['dicom_folder_id']
+        
+        if self.metadata_index is not None and self.metadata_index.is_known(root_id):
+            items = []
+            level = [root_id]
+            while level:
+                children = [c for pid in level for c in self.metadata_index.children(pid)]
+                items.extend(children)
+                level = [c['id'] for c in children if c.get('mimeType') == FOLDER_MIME_TYPE]
+        else:
+            items = self._crawl_folder_tree(root_id, include_folders=True)
+        
+        manifest = StudyManifest.from_items(root_id, items)
+        logger.debug(
+            f"Manifesto {study_info['name']}: {manifest.file_count} arquivos, "
+            f"{manifest.series_count} séries, {manifest.size_mb:.1f} MB"
+        )
+        return manifest
     
     def download_study(
         self,
         study_info: Dict,
         output_dir: Path,
-        chunk_size_mb: int = 50
+        chunk_size_mb: Optional[int] = None,
+        ledger=None
     ) -> Optional[Path]:
         """
         Baixar um estudo DICOM completo (estrutura de pastas)
@@ -551,13 +1512,14 @@ class GoogleDriveClient:
         Args:
             study_info: Dicionário retornado por list_dicom_studies
             output_dir: Diretório para salvar o estudo
-            chunk_size_mb: Tamanho do chunk para download
+            chunk_size_mb: Tamanho fixo do chunk (None = adaptativo)
+            ledger: TransferLedger; uma nova chamada baixa só o que falta
         
         Returns:
-            Caminho para o diretório baixado ou None se falha
+            Caminho para o diretório baixado, ou None se algum arquivo
+            do estudo não pôde ser baixado
         """
         try:
-            dicom_folder_id = study_info['dicom_folder_id']
             study_name = study_info['study_number']
             
             # Criar diretório de output
@@ -566,97 +1528,26 @@ class GoogleDriveClient:
             
             logger.info(f"Baixando estudo DICOM: {study_info['name']} → {study_dir}")
             
-            # Baixar recursivamente todos os arquivos
-            files_count = self._download_folder_recursive(dicom_folder_id, study_dir, chunk_size_mb)
+            # Plano completo (paginado) + pool de downloads
+            stats = StudyDownloadEngine(self, ledger=ledger).download(study_info, study_dir, chunk_size_mb)
             
-            logger.info(f"✓ Estudo baixado: {study_dir} ({files_count} arquivos)")
+            # Série incompleta geraria NIfTI incorreto: só entregar o estudo completo
+            if not stats.complete:
+                reason = stats.error or f"{stats.files_failed} arquivos falharam"
+                logger.warning(f"Estudo {study_info['name']} incompleto: {reason}")
+                return None
             
-            # Validar se baixou algo
-            if files_count > 0:
-                return study_dir
-            else:
+            logger.info(
+                f"✓ Estudo baixado: {study_dir} ({stats.files_downloaded}/{stats.files_total} arquivos, "
+                f"{stats.bytes_downloaded / (1024 * 1024):.1f} MB, {stats.throughput_mb_s:.1f} MB/s)"
+            )
+            
+            if stats.files_total == 0:
                 logger.warning(f"Nenhum arquivo foi baixado para o estudo {study_info['name']}")
-                return study_dir  # Ainda retorna o diretório, mesmo que vazio
+            return study_dir
         
         except Exception as e:
             logger.error(f"Erro ao baixar estudo: {e}")
             import traceback
             traceback.print_exc()
             return None
-    
-    def _download_folder_recursive(
-        self,
-        folder_id: str,
-        output_dir: Path,
-        chunk_size_mb: int = 50
-    ) -> int:
-        """
-        Baixar recursivamente todos os arquivos e subpastas
-        
-        Filtra arquivos não-binários (Google Docs, Sheets, etc)
-        
-        Returns:
-            Número de arquivos baixados
-        """
-        files_downloaded = 0
-        
-        # MimeTypes que NÃO devem ser baixados (Google Workspace files)
-        SKIP_MIME_TYPES = {
-            'application/vnd.google-apps.document',
-            'application/vnd.google-apps.spreadsheet',
-            'application/vnd.google-apps.presentation',
-            'application/vnd.google-apps.drawing',
-            'application/vnd.google-apps.form',
-            'application/vnd.google-apps.script',
-            'application/vnd.google-apps.site',
-            'application/vnd.google-apps.folder',  # Tratado separadamente
-        }
-        
-        try:
-            # Listar conteúdo da pasta
-            results = self.service.files().list(
-                q=f"'{folder_id}' in parents and trashed=false",
-                spaces='drive',
-                fields='files(id, name, mimeType, size)',
-                pageSize=100
-            ).execute()
-            
-            items = results.get('files', [])
-            logger.debug(f"Listando pasta {folder_id}: {len(items)} itens encontrados")
-            
-            for item in items:
-                mime_type = item.get('mimeType', '')
-                
-                if mime_type == 'application/vnd.google-apps.folder':
-                    # É uma subpasta, criar e recursivo
-                    subfolder = output_dir / item['name']
-                    subfolder.mkdir(parents=True, exist_ok=True)
-                    logger.debug(f"Descendo em subpasta: {item['name']}")
-                    files_downloaded += self._download_folder_recursive(
-                        item['id'],
-                        subfolder,
-                        chunk_size_mb
-                    )
-                elif mime_type in SKIP_MIME_TYPES:
-                    # Pular arquivos Google Workspace
-                    logger.debug(f"Pulando arquivo Google Workspace: {item['name']} ({mime_type})")
-                else:
-                    # É um arquivo binário, tentar baixar
-                    logger.debug(f"Baixando arquivo: {item['name']} ({mime_type})")
-                    try:
-                        file_path = output_dir / item['name']
-                        self.download_file(
-                            item['id'],
-                            file_path,
-                            chunk_size_mb
-                        )
-                        files_downloaded += 1
-                        logger.debug(f"✓ Baixado: {item['name']}")
-                    except Exception as e:
-                        logger.warning(f"Erro ao baixar {item['name']}: {e}")
-                        # Continua tentando outros arquivos
-        
-        except Exception as e:
-            logger.warning(f"Erro ao descer pasta: {e}")
-        
-        return files_downloaded
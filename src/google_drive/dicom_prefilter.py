@@ -0,0 +1,162 @@
+"""
+Pré-filtro remoto de arquivos DICOM (apenas o cabeçalho via HTTP Range)
+"""
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+from loguru import logger
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from ..dicom.file_detector import DICOMFileDetector
+
+
+GOOGLE_APPS_MIME_PREFIX = 'application/vnd.google-apps.'
+# Falhas de sondagem que não devem interromper a listagem (HTTP, timeout, conexão)
+PROBE_ERRORS = (HttpError, OSError, httplib2.HttpLib2Error)
+
+
+class RemoteDicomPrefilter:
+    """
+    Rejeitar arquivos não-DICOM antes do download
+    
+    Para cada candidato, baixa apenas os primeiros
+    DICOMFileDetector.MIN_FILE_SIZE bytes (128 de preâmbulo + "DICM") com
+    um `get_media` ranged e verifica o magic number. O resultado fica em
+    cache por (file id, md5Checksum), então execuções seguintes só sondam
+    arquivos novos ou alterados.
+    """
+    
+    def __init__(
+        self,
+        client,
+        cache_path: Optional[Path] = None,
+        max_workers: int = 8
+    ):
+        """
+        Inicializar pré-filtro
+        
+        Args:
+            client: GoogleDriveClient usado para as requisições
+            cache_path: Arquivo SQLite do cache (None = apenas memória)
+            max_workers: Sondagens simultâneas
+        """
+        self.client = client
+        self.max_workers = max_workers
+        
+        if cache_path:
+            Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(cache_path) if cache_path else ':memory:',
+            check_same_thread=False
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS probes ("
+                "file_id TEXT NOT NULL, version TEXT NOT NULL, is_dicom INTEGER NOT NULL, "
+                "PRIMARY KEY (file_id, version))"
+            )
+        
+        self.probed = 0
+        self.cache_hits = 0
+        self.rejected = 0
+    
+    def is_dicom(self, item: Dict) -> bool:
+        """
+        Verificar se arquivo remoto é DICOM
+        
+        Args:
+            item: Metadados do arquivo (id, size, md5Checksum, mimeType)
+        
+        Returns:
+            True se o cabeçalho contém o magic number DICOM
+        """
+        # Rejeições sem requisição: Google Docs e arquivos pequenos demais
+        if item.get('mimeType', '').startswith(GOOGLE_APPS_MIME_PREFIX):
+            return False
+        if item.get('size') is not None and int(item['size']) < DICOMFileDetector.MIN_FILE_SIZE:
+            return False
+        
+        version = item.get('md5Checksum') or item.get('modifiedTime') or ''
+        cached = self._get_cached(item['id'], version)
+        if cached is not None:
+            return cached
+        
+        is_dicom = DICOMFileDetector.is_dicom_header(self._fetch_header(item['id']))
+        self._set_cached(item['id'], version, is_dicom)
+        return is_dicom
+    
+    def filter(self, items: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Filtrar um fluxo de arquivos mantendo a ordem original
+        
+        As sondagens rodam em paralelo numa janela limitada, então o
+        fluxo de entrada (ex: um gerador de listagem) é consumido sob demanda.
+        
+        Yields:
+            Apenas os itens cujo cabeçalho é DICOM
+        """
+        window = []
+        
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='dicom-probe'
+        ) as executor:
+            try:
+                for item in items:
+                    window.append((item, executor.submit(self._safe_is_dicom, item)))
+                    
+                    if len(window) >= self.max_workers * 2:
+                        yield from self._drain(window, keep=self.max_workers)
+                
+                yield from self._drain(window, keep=0)
+            
+            finally:
+                for _, future in window:
+                    future.cancel()
+    
+    def _drain(self, window: list, keep: int) -> Iterator[Dict]:
+        """Entregar os itens mais antigos da janela até restarem `keep`"""
+        while len(window) > keep:
+            item, future = window.pop(0)
+            if future.result():
+                yield item
+            else:
+                self.rejected += 1
+                logger.debug(f"Não-DICOM ignorado: {item.get('name')} ({item['id']})")
+    
+    def _safe_is_dicom(self, item: Dict) -> bool:
+        try:
+            return self.is_dicom(item)
+        except PROBE_ERRORS as e:
+            # Na dúvida, manter o arquivo: a validação local decide depois
+            logger.warning(f"Erro ao sondar cabeçalho de {item.get('name')}: {e}")
+            return True
+    
+    def _fetch_header(self, file_id: str) -> bytes:
+        """Baixar apenas os primeiros bytes do arquivo (Range)"""
+        request = self.client.service.files().get_media(fileId=file_id)
+        request.headers['range'] = f"bytes=0-{DICOMFileDetector.MIN_FILE_SIZE - 1}"
+        return self.client._execute_with_rate_limit(request) or b''
+    
+    def _get_cached(self, file_id: str, version: str) -> Optional[bool]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT is_dicom FROM probes WHERE file_id = ? AND version = ?",
+                (file_id, version)
+            ).fetchone()
+            if row:
+                self.cache_hits += 1
+        return bool(row[0]) if row else None
+    
+    def _set_cached(self, file_id: str, version: str, is_dicom: bool) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO probes (file_id, version, is_dicom) VALUES (?, ?, ?)",
+                (file_id, version, int(is_dicom))
+            )
+            self.probed += 1
@@ -0,0 +1,188 @@
+"""
+Cache local de downloads endereçado por conteúdo (file id + md5Checksum)
+"""
+import hashlib
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+from loguru import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+
+class DownloadCache:
+    """
+    Armazém local de arquivos baixados do Drive
+    
+    Cada objeto é identificado por file id + md5Checksum + size +
+    modifiedTime, então qualquer alteração no Drive gera uma nova chave.
+    Estudos são materializados com hardlinks (cópia se o destino estiver em
+    outro sistema de arquivos), sem custo de rede nem de espaço extra.
+    
+    - Gravações são atômicas (tmp + os.replace), seguras entre processos
+    - A limpeza remove os objetos usados há mais tempo (mtime, atualizado a
+      cada uso) até o total ficar abaixo de `budget_gb`, sob trava fcntl
+    """
+    
+    def __init__(self, root: Path, budget_gb: float):
+        """
+        Inicializar cache
+        
+        Args:
+            root: Diretório do armazém
+            budget_gb: Espaço máximo em GB
+        """
+        self.root = Path(root)
+        self.objects_dir = self.root / 'objects'
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.budget_bytes = int(budget_gb * 1024 ** 3)
+        
+        self._lock = threading.Lock()
+        self._size = self._scan_size()
+        
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def cache_key(item: Dict) -> Optional[str]:
+        """Chave do objeto (None se a listagem não trouxe md5Checksum)"""
+        if not item.get('md5Checksum'):
+            return None
+        raw = f"{item['id']}:{item['md5Checksum']}:{item.get('size', '')}:{item.get('modifiedTime', '')}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+    
+    def _object_path(self, key: str) -> Path:
+        return self.objects_dir / key[:2] / key
+    
+    def materialize(self, item: Dict, dest: Path) -> bool:
+        """
+        Criar dest a partir do cache, se houver
+        
+        Args:
+            item: Metadados do arquivo (id, md5Checksum, size, modifiedTime)
+            dest: Caminho de destino
+        
+        Returns:
+            True se o arquivo veio do cache
+        """
+        key = self.cache_key(item)
+        if key is None:
+            return False
+        
+        object_path = self._object_path(key)
+        dest = Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        
+        try:
+            os.utime(object_path)  # Marca de uso para o LRU
+            self._link_or_copy(object_path, dest)
+        except FileNotFoundError:
+            # Ausente (ou removido por outro processo durante a limpeza)
+            with self._lock:
+                self.misses += 1
+            return False
+        
+        with self._lock:
+            self.hits += 1
+        return True
+    
+    def store(self, item: Dict, src: Path) -> None:
+        """
+        Adicionar arquivo baixado ao cache
+        
+        Args:
+            item: Metadados do arquivo
+            src: Arquivo local já verificado
+        """
+        key = self.cache_key(item)
+        if key is None or self.budget_bytes <= 0:
+            return
+        
+        object_path = self._object_path(key)
+        if object_path.exists():
+            return
+        
+        object_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = object_path.with_name(f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self._link_or_copy(Path(src), tmp_path)
+            os.replace(tmp_path, object_path)
+        except OSError as e:
+            logger.warning(f"Erro ao gravar no cache de downloads: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+        
+        with self._lock:
+            self._size += object_path.stat().st_size
+            over_budget = self._size > self.budget_bytes
+        if over_budget:
+            self.evict()
+    
+    def evict(self) -> int:
+        """
+        Remover objetos menos usados até caber no orçamento
+        
+        Returns:
+            Bytes liberados
+        """
+        with self._process_lock():
+            entries = []
+            for path in self.objects_dir.glob('*/*'):
+                if path.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            
+            total = sum(size for _, size, _ in entries)
+            freed = 0
+            for _, size, path in sorted(entries):
+                if total - freed <= self.budget_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                freed += size
+            
+            with self._lock:
+                self._size = total - freed
+        
+        if freed:
+            logger.debug(f"Cache de downloads: {freed / (1024 * 1024):.1f} MB liberados")
+        return freed
+    
+    @contextmanager
+    def _process_lock(self):
+        """Trava exclusiva entre processos (fcntl) durante a limpeza"""
+        with open(self.root / '.lock', 'w') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _scan_size(self) -> int:
+        return sum(
+            p.stat().st_size for p in self.objects_dir.glob('*/*')
+            if not p.name.endswith('.tmp')
+        )
+    
+    @staticmethod
+    def _link_or_copy(src: Path, dest: Path) -> None:
+        """Hardlink (ou cópia entre sistemas de arquivos) substituindo dest"""
+        if dest.exists():
+            dest.unlink()
+        try:
+            os.link(src, dest)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            shutil.copy2(src, dest)
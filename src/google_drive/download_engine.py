@@ -0,0 +1,418 @@
+"""
+Motor de download paralelo dos arquivos de um estudo DICOM
+"""
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+from loguru import logger
+
+from ..core.config import Config
+from .study_manifest import StudyManifest
+
+
+@dataclass
+class StudyDownloadStats:
+    """Estatísticas de download de um estudo"""
+    study_name: str
+    files_total: int = 0
+    files_downloaded: int = 0
+    files_failed: int = 0
+    files_from_cache: int = 0
+    files_skipped: int = 0
+    bytes_total: int = 0
+    bytes_downloaded: int = 0
+    bytes_from_cache: int = 0
+    elapsed_seconds: float = 0.0
+    error: Optional[str] = None  # Plano (listagem) do estudo falhou
+    
+    @property
+    def complete(self) -> bool:
+        """Todos os arquivos do plano estão no diretório do estudo"""
+        return self.error is None and self.files_downloaded + self.files_skipped == self.files_total
+    
+    @property
+    def throughput_mb_s(self) -> float:
+        if self.elapsed_seconds <= 0:
+            return 0.0
+        return self.bytes_downloaded / (1024 * 1024) / self.elapsed_seconds
+    
+    def to_dict(self) -> Dict:
+        return {
+            'study_name': self.study_name,
+            'files_total': self.files_total,
+            'files_downloaded': self.files_downloaded,
+            'files_failed': self.files_failed,
+            'files_from_cache': self.files_from_cache,
+            'files_skipped': self.files_skipped,
+            'bytes_total': self.bytes_total,
+            'bytes_downloaded': self.bytes_downloaded,
+            'bytes_from_cache': self.bytes_from_cache,
+            'elapsed_seconds': round(self.elapsed_seconds, 3),
+            'throughput_mb_s': round(self.throughput_mb_s, 3),
+            'error': self.error,
+        }
+
+
+def ledger_key(item: Dict) -> str:
+    """Chave do arquivo no ledger (muda se o arquivo mudar no Drive)"""
+    return f"{item['id']}:{item.get('md5Checksum') or item.get('modifiedTime', '')}"
+
+
+def already_present(item: Dict, study_dir: Path, done: Dict[str, str]) -> bool:
+    """Registrado no ledger e ainda no disco com o tamanho esperado"""
+    if ledger_key(item) not in done:
+        return False
+    dest = study_dir / item['relative_path']
+    try:
+        return not item.get('size') or dest.stat().st_size == int(item['size'])
+    except FileNotFoundError:
+        return False
+
+
+@dataclass
+class _StudyState:
+    """Estado de um estudo ativo no escalonador"""
+    order: int
+    study_info: Dict
+    study_dir: Path
+    queue: Deque[Dict]
+    stats: StudyDownloadStats
+    started_at: float = field(default_factory=time.time)
+    in_flight: int = 0
+    bytes_in_flight: int = 0
+    attempts: Dict[str, int] = field(default_factory=dict)
+    delayed: List[Tuple[float, Dict]] = field(default_factory=list)  # (não antes de, item)
+    
+    @property
+    def finished(self) -> bool:
+        return not self.queue and not self.delayed and self.in_flight == 0
+    
+    @property
+    def next_retry_at(self) -> Optional[float]:
+        return min((not_before for not_before, _ in self.delayed), default=None)
+    
+    def release_due(self, now: float) -> None:
+        """Devolver à frente da fila os arquivos cujo backoff já terminou"""
+        due = [item for not_before, item in self.delayed if not_before <= now]
+        if due:
+            self.delayed = [(t, item) for t, item in self.delayed if t > now]
+            self.queue.extendleft(reversed(due))
+
+
+class DownloadScheduler:
+    """
+    Escalonador global de downloads: cada arquivo de cada estudo é um item
+    
+    - Até `max_active_studies` estudos são admitidos por vez, na ordem de
+      entrada (o iterável de estudos é consumido sob demanda)
+    - No máximo `max_in_flight` downloads ficam em andamento no total
+    - Cada vaga livre vai para o estudo ativo com menos bytes em andamento
+      (empate: o estudo mais antigo), então estudos grandes não monopolizam
+      as conexões e a banda é dividida entre os estudos ativos
+    - O estudo mais antigo com arquivos na fila tem sempre pelo menos a sua
+      parte das vagas (max_in_flight / estudos ativos): estudos de arquivos
+      grandes não ficam com uma única conexão enquanto estudos de arquivos
+      pequenos, com menos bytes em andamento, ocupam o resto; assim a
+      entrega segue aproximadamente a ordem de admissão
+    - Cada estudo é entregue assim que seu último arquivo termina, para a
+      conversão começar cedo
+    - Arquivos com erro voltam para a fila até Config.MAX_RETRIES tentativas,
+      após um backoff exponencial (Config.RETRY_BACKOFF_FACTOR, com jitter)
+    - Um estudo cujo plano (listagem) falha é entregue como falho, sem
+      interromper os demais
+    - Com `client.download_cache`, arquivos inalterados vêm do cache local
+      (hardlink) sem requisição; os baixados são adicionados a ele
+    - Com `ledger` (TransferLedger), cada arquivo concluído é registrado;
+      em uma nova tentativa do estudo, arquivos registrados que continuam
+      no disco não são baixados de novo
+    """
+    
+    def __init__(
+        self,
+        client,
+        max_in_flight: Optional[int] = None,
+        max_active_studies: Optional[int] = None,
+        chunk_size_mb: Optional[int] = None,
+        ledger=None
+    ):
+        """
+        Inicializar escalonador
+        
+        Args:
+            client: GoogleDriveClient usado para listagem e download
+            max_in_flight: Downloads simultâneos no total
+                (padrão: Config.MAX_INFLIGHT_DOWNLOADS)
+            max_active_studies: Estudos baixando ao mesmo tempo
+                (padrão: Config.MAX_WORKERS_DOWNLOAD)
+            chunk_size_mb: Tamanho fixo do chunk (None = adaptativo do cliente)
+            ledger: TransferLedger com os arquivos já baixados de cada estudo
+        """
+        self.client = client
+        self.max_in_flight = max_in_flight or Config.MAX_INFLIGHT_DOWNLOADS
+        self.max_active_studies = max_active_studies or Config.MAX_WORKERS_DOWNLOAD
+        self.chunk_size_mb = chunk_size_mb
+        self.ledger = ledger
+        self.max_retries = Config.MAX_RETRIES
+        self.retry_backoff = Config.RETRY_BACKOFF_FACTOR
+    
+    def plan(self, study_info: Dict) -> StudyManifest:
+        """Obter plano de download (manifesto) do estudo"""
+        manifest = study_info.get('manifest')
+        if manifest is None:
+            manifest = self.client.build_study_manifest(study_info)
+        return manifest
+    
+    def run(
+        self,
+        studies: Iterable[Tuple[Dict, Path]]
+    ) -> Iterator[Tuple[Dict, Path, StudyDownloadStats]]:
+        """
+        Baixar estudos compartilhando o mesmo pool de conexões
+        
+        Args:
+            studies: Iterável de (study_info, diretório local do estudo)
+        
+        Yields:
+            (study_info, study_dir, stats) à medida que cada estudo termina
+        """
+        studies = iter(studies)
+        exhausted = False
+        admitted = 0
+        active: List[_StudyState] = []
+        pending = {}
+        
+        executor = ThreadPoolExecutor(
+            max_workers=self.max_in_flight,
+            thread_name_prefix='download-sched'
+        )
+        
+        try:
+            while True:
+                # Admitir novos estudos na ordem de entrada
+                while not exhausted and len(active) < self.max_active_studies:
+                    entry = next(studies, None)
+                    if entry is None:
+                        exhausted = True
+                        break
+                    active.append(self._admit(admitted, *entry))
+                    admitted += 1
+                
+                # Arquivos com backoff vencido voltam para a fila
+                now = time.time()
+                for state in active:
+                    state.release_due(now)
+                
+                # Preencher vagas (ver _next_study)
+                while len(pending) < self.max_in_flight:
+                    candidates = [state for state in active if state.queue]
+                    if not candidates:
+                        break
+                    state = self._next_study(candidates, len(active))
+                    item = state.queue.popleft()
+                    size = int(item.get('size', 0) or 0)
+                    state.in_flight += 1
+                    state.bytes_in_flight += size
+                    future = executor.submit(
+                        self._fetch, item, state.study_dir / item['relative_path']
+                    )
+                    pending[future] = (state, item, size)
+                
+                # Entregar estudos concluídos (inclusive vazios)
+                for state in [st for st in active if st.finished]:
+                    active.remove(state)
+                    state.stats.elapsed_seconds = time.time() - state.started_at
+                    yield state.study_info, state.study_dir, state.stats
+                
+                retry_at = min(
+                    (st.next_retry_at for st in active if st.delayed), default=None
+                )
+                timeout = None if retry_at is None else max(0.0, retry_at - time.time())
+                
+                if not pending:
+                    if exhausted and not active:
+                        return
+                    if timeout:
+                        time.sleep(timeout)
+                    continue
+                
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    state, item, size = pending.pop(future)
+                    state.in_flight -= 1
+                    state.bytes_in_flight -= size
+                    self._record_result(state, item, size, future)
+        
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+    
+    def _next_study(self, candidates: List[_StudyState], active_count: int) -> _StudyState:
+        """
+        Estudo que recebe a próxima vaga
+        
+        O mais antigo fica com sua parte das vagas; fora isso, o estudo com
+        menos bytes em andamento (empate: o mais antigo).
+        """
+        oldest = candidates[0]
+        if oldest.in_flight < max(1, self.max_in_flight // active_count):
+            return oldest
+        return min(candidates, key=lambda st: (st.bytes_in_flight, st.order))
+    
+    def _fetch(self, item: Dict, dest: Path) -> bool:
+        """
+        Obter um arquivo do plano (cache local ou Drive)
+        
+        Returns:
+            True se veio do cache local
+        """
+        cache = getattr(self.client, 'download_cache', None)
+        if cache is not None and cache.materialize(item, dest):
+            return True
+        
+        self.client.download_file(
+            item['id'],
+            dest,
+            self.chunk_size_mb,
+            expected_size=int(item['size']) if item.get('size') else None,
+            expected_md5=item.get('md5Checksum')
+        )
+        if cache is not None:
+            cache.store(item, dest)
+        return False
+    
+    def _admit(self, order: int, study_info: Dict, study_dir: Path) -> _StudyState:
+        """Planejar estudo e colocar seus arquivos na fila"""
+        study_dir = Path(study_dir)
+        try:
+            manifest = self.plan(study_info)
+            study_dir.mkdir(parents=True, exist_ok=True)
+        except Exception as e:
+            # Só este estudo falha; os downloads dos demais continuam
+            logger.error(f"Erro ao planejar download de {study_info['name']}: {e}")
+            return _StudyState(
+                order=order,
+                study_info=study_info,
+                study_dir=study_dir,
+                queue=deque(),
+                stats=StudyDownloadStats(study_name=study_info['name'], error=str(e))
+            )
+        
+        logger.debug(
+            f"Plano de download {study_info['name']}: {manifest.file_count} arquivos, "
+            f"{manifest.size_mb:.1f} MB"
+        )
+        stats = StudyDownloadStats(
+            study_name=study_info['name'],
+            files_total=manifest.file_count,
+            bytes_total=manifest.total_bytes
+        )
+        
+        # Arquivos já concluídos em uma tentativa anterior
+        done = self.ledger.done_items(study_info['id'], 'download') if self.ledger else {}
+        queue = deque()
+        for item in manifest.files:
+            if already_present(item, study_dir, done):
+                stats.files_skipped += 1
+            else:
+                queue.append(item)
+        if stats.files_skipped:
+            logger.info(
+                f"Retomando {study_info['name']}: {stats.files_skipped}/{stats.files_total} "
+                f"arquivos já baixados"
+            )
+        
+        return _StudyState(
+            order=order,
+            study_info=study_info,
+            study_dir=study_dir,
+            queue=queue,
+            stats=stats
+        )
+    
+    def _record_result(self, state: _StudyState, item: Dict, size: int, future) -> None:
+        """Contabilizar download concluído ou reenfileirar após erro"""
+        try:
+            from_cache = future.result()
+            state.stats.files_downloaded += 1
+            if self.ledger is not None:
+                self.ledger.mark_done(state.study_info['id'], 'download', ledger_key(item))
+            if from_cache:
+                state.stats.files_from_cache += 1
+                state.stats.bytes_from_cache += size
+            else:
+                state.stats.bytes_downloaded += size
+        
+        except Exception as e:
+            attempts = state.attempts.get(item['id'], 0) + 1
+            state.attempts[item['id']] = attempts
+            if attempts < self.max_retries:
+                # Backoff antes da nova tentativa (rajadas de 429/5xx não
+                # devem consumir todas as tentativas em milissegundos)
+                delay = self.retry_backoff ** attempts * random.uniform(1, 1.5)
+                logger.debug(
+                    f"Nova tentativa ({attempts}) para {item['relative_path']} em {delay:.1f}s: {e}"
+                )
+                state.delayed.append((time.time() + delay, item))
+            else:
+                state.stats.files_failed += 1
+                logger.warning(f"Erro ao baixar {item['relative_path']}: {e}")
+
+
+class StudyDownloadEngine:
+    """
+    Download de um estudo em duas fases
+    
+    1. Plano: manifesto completo do estudo (listagem paginada de todas as
+       séries, ver StudyManifest), reaproveitando o de study_info se houver
+    2. Execução: os arquivos do plano são baixados por um pool limitado de
+       workers; cada requisição passa pelo rate limiter do cliente
+    
+    É o DownloadScheduler restrito a um único estudo. Falhas individuais são
+    registradas e contadas sem interromper o estudo.
+    """
+    
+    def __init__(self, client, max_workers: Optional[int] = None, ledger=None):
+        """
+        Inicializar motor
+        
+        Args:
+            client: GoogleDriveClient usado para listagem e download
+            max_workers: Downloads simultâneos por estudo
+                (padrão: Config.MAX_WORKERS_STUDY_FILES)
+            ledger: TransferLedger (retries baixam só os arquivos que faltam)
+        """
+        self.client = client
+        self.max_workers = max_workers or Config.MAX_WORKERS_STUDY_FILES
+        self.ledger = ledger
+    
+    def download(
+        self,
+        study_info: Dict,
+        study_dir: Path,
+        chunk_size_mb: Optional[int] = None
+    ) -> StudyDownloadStats:
+        """
+        Baixar todos os arquivos do estudo para study_dir
+        
+        Args:
+            study_info: Dicionário retornado por iter_studies
+            study_dir: Diretório local do estudo
+            chunk_size_mb: Tamanho fixo do chunk (None = adaptativo do cliente)
+        
+        Returns:
+            StudyDownloadStats do estudo
+        """
+        scheduler = DownloadScheduler(
+            self.client,
+            max_in_flight=self.max_workers,
+            max_active_studies=1,
+            chunk_size_mb=chunk_size_mb,
+            ledger=self.ledger
+        )
+        for _, _, stats in scheduler.run([(study_info, study_dir)]):
+            return stats
@@ -0,0 +1,171 @@
+"""
+Cache de resolução caminho → ID de pasta do Google Drive
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+from loguru import logger
+
+
+class _Flight:
+    """Resolução em andamento compartilhada por chamadas concorrentes"""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+
+class FolderIdCache:
+    """
+    Cache TTL de IDs de pastas com single-flight
+    
+    - Entradas expiram após `ttl_hours` (padrão: Config.CACHE_TTL_HOURS)
+    - Buscas concorrentes da mesma chave aguardam uma única resolução
+    - Opcionalmente persiste em JSON para reaproveitar entre execuções
+    
+    Apenas resoluções bem-sucedidas são armazenadas; pastas não encontradas
+    são consultadas novamente na próxima chamada.
+    """
+    
+    def __init__(
+        self,
+        ttl_hours: float = 24,
+        persist_path: Optional[Path] = None
+    ):
+        """
+        Inicializar cache
+        
+        Args:
+            ttl_hours: Tempo de vida das entradas em horas
+            persist_path: Arquivo JSON para persistência (None = apenas memória)
+        """
+        self.ttl_seconds = ttl_hours * 3600
+        self.persist_path = Path(persist_path) if persist_path else None
+        
+        self._entries: Dict[str, Tuple[str, float]] = {}
+        self._in_flight: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        
+        if self.persist_path:
+            self._load()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Obter ID em cache (None se ausente ou expirado)"""
+        with self._lock:
+            return self._get_unlocked(key)
+    
+    def set(self, key: str, folder_id: str) -> None:
+        """Armazenar ID de pasta"""
+        with self._lock:
+            self._entries[key] = (folder_id, time.time())
+            if self.persist_path:
+                self._save_unlocked()
+    
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Remover uma entrada (ou todas, se key=None)"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            if self.persist_path:
+                self._save_unlocked()
+    
+    def get_or_resolve(
+        self,
+        key: str,
+        resolver: Callable[[], Optional[str]]
+    ) -> Optional[str]:
+        """
+        Obter ID do cache ou resolver (uma única vez por chave em paralelo)
+        
+        Args:
+            key: Chave (ex: caminho da pasta)
+            resolver: Função que consulta o Drive e retorna o ID (ou None)
+        
+        Returns:
+            ID da pasta ou None se não encontrada
+        """
+        with self._lock:
+            cached = self._get_unlocked(key)
+            if cached:
+                self.hits += 1
+                return cached
+            
+            flight = self._in_flight.get(key)
+            is_leader = flight is None
+            if is_leader:
+                self.misses += 1
+                flight = _Flight()
+                self._in_flight[key] = flight
+        
+        if not is_leader:
+            # Outra thread já está resolvendo esta chave
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        
+        try:
+            flight.result = resolver()
+            if flight.result:
+                self.set(key, flight.result)
+            return flight.result
+        
+        except BaseException as e:
+            flight.error = e
+            raise
+        
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            flight.event.set()
+    
+    def _get_unlocked(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if not entry:
+            return None
+        
+        folder_id, stored_at = entry
+        if time.time() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        return folder_id
+    
+    def _load(self) -> None:
+        """Carregar entradas persistidas (descartando expiradas)"""
+        if not self.persist_path.exists():
+            return
+        
+        try:
+            data = json.loads(self.persist_path.read_text())
+            now = time.time()
+            self._entries = {
+                key: (value[0], value[1])
+                for key, value in data.items()
+                if now - value[1] <= self.ttl_seconds
+            }
+            logger.debug(f"Cache de pastas carregado: {len(self._entries)} entradas")
+        except (OSError, ValueError, IndexError, TypeError) as e:
+            logger.warning(f"Cache de pastas ignorado ({self.persist_path}): {e}")
+    
+    def _save_unlocked(self) -> None:
+        """Gravar entradas atomicamente (tmp + rename)"""
+        try:
+            self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.persist_path.with_name(
+                f"{self.persist_path.name}.{os.getpid()}.tmp"
+            )
+            tmp_path.write_text(json.dumps(
+                {key: list(value) for key, value in self._entries.items()}
+            ))
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            logger.warning(f"Erro ao salvar cache de pastas: {e}")
@@ -0,0 +1,443 @@
+"""
+Índice local persistente (SQLite) dos metadados da árvore do Google Drive
+"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Dict, Iterable, Iterator
+from loguru import logger
+
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    mime_type TEXT NOT NULL,
+    size INTEGER,
+    md5_checksum TEXT,
+    modified_time TEXT
+);
+CREATE TABLE IF NOT EXISTS node_parents (
+    node_id TEXT NOT NULL,
+    parent_id TEXT NOT NULL,
+    PRIMARY KEY (node_id, parent_id)
+);
+CREATE INDEX IF NOT EXISTS idx_node_parents_parent ON node_parents (parent_id);
+CREATE TABLE IF NOT EXISTS roots (
+    root_id TEXT PRIMARY KEY,
+    built_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class DriveMetadataIndex:
+    """
+    Índice local dos nós (pastas e arquivos) do Google Drive
+    
+    Armazena id, name, parents, size, md5Checksum e modifiedTime de cada nó
+    abaixo das pastas raiz indexadas. Após a construção completa, o índice
+    é atualizado incrementalmente a partir do page token do `changes.list`,
+    de modo que a descoberta custa apenas o delta desde a última execução.
+    
+    Uso:
+        index = DriveMetadataIndex(Path('./cache/drive_index.sqlite3'))
+        index.sync(client, root_id)
+        files = index.list_files(root_id)
+    """
+    
+    def __init__(self, db_path: Path):
+        """
+        Inicializar índice
+        
+        Args:
+            db_path: Caminho do arquivo SQLite
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+    
+    def close(self) -> None:
+        """Fechar conexão com o banco"""
+        with self._lock:
+            self._conn.close()
+    
+    # ==================== SINCRONIZAÇÃO ====================
+    
+    def sync(self, client, root_id: str) -> int:
+        """
+        Garantir que o índice da raiz está atualizado
+        
+        Constrói a raiz se ela ainda não foi indexada; caso contrário,
+        aplica apenas as mudanças desde o último page token.
+        
+        Args:
+            client: GoogleDriveClient usado para consultar o Drive
+            root_id: ID da pasta raiz
+        
+        Returns:
+            Número de nós inseridos/atualizados/removidos
+        """
+        with self._lock:
+            if self.has_root(root_id):
+                return self.refresh(client)
+            return self.build(client, root_id)
+    
+    def build(self, client, root_id: str) -> int:
+        """
+        Construir (ou reconstruir) o índice completo de uma pasta raiz
+        
+        A varredura inteira é gravada em uma única transação, junto com a
+        linha em `roots`: se o crawl falhar ou for interrompido, nada fica
+        gravado (nem a raiz marcada como construída) e o próximo sync()
+        refaz o build completo.
+        
+        Args:
+            client: GoogleDriveClient usado para consultar o Drive
+            root_id: ID da pasta raiz
+        
+        Returns:
+            Número de nós indexados
+        """
+        with self._lock:
+            # Obter o token antes do crawl: mudanças feitas durante a
+            # varredura serão reaplicadas no próximo refresh
+            if self.get_page_token() is None:
+                self._set_state('page_token', client.get_start_page_token())
+            else:
+                self.refresh(client)
+            
+            logger.info(f"Construindo índice de metadados: {root_id}")
+            started = time.time()
+            
+            with self._conn:
+                self._remove_subtree(root_id, keep_root=True)
+                count = self._upsert_many(
+                    client._crawl_folder_tree(root_id, include_folders=True),
+                    commit=False
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO roots (root_id, built_at) VALUES (?, ?)",
+                    (root_id, time.time())
+                )
+            
+            logger.info(
+                f"✓ Índice construído: {count} nós em {time.time() - started:.1f}s"
+            )
+            return count
+    
+    def refresh(self, client) -> int:
+        """
+        Aplicar mudanças pendentes a partir do page token armazenado
+        
+        Args:
+            client: GoogleDriveClient usado para consultar o Drive
+        
+        Returns:
+            Número de nós inseridos/atualizados/removidos
+        """
+        with self._lock:
+            page_token = self.get_page_token()
+            if page_token is None:
+                return 0
+            
+            applied = 0
+            while page_token:
+                response = client.list_changes(page_token)
+                applied += self._apply_changes(client, response.get('changes', []))
+                
+                if response.get('newStartPageToken'):
+                    self._set_state('page_token', response['newStartPageToken'])
+                    break
+                page_token = response.get('nextPageToken')
+                self._set_state('page_token', page_token)
+            
+            if applied:
+                logger.info(f"✓ Índice atualizado: {applied} mudanças aplicadas")
+            return applied
+    
+    def _apply_changes(self, client, changes: List[Dict]) -> int:
+        """Aplicar uma página de mudanças do changes.list"""
+        applied = 0
+        
+        for change in changes:
+            file_id = change.get('fileId')
+            item = change.get('file')
+            
+            if change.get('removed') or not item or item.get('trashed'):
+                if self.is_known(file_id):
+                    with self._conn:
+                        self._remove_subtree(file_id)
+                    applied += 1
+                continue
+            
+            if any(self.is_known(p) for p in item.get('parents', [])):
+                is_new_folder = (
+                    item.get('mimeType') == FOLDER_MIME_TYPE
+                    and not self.is_known(item['id'])
+                )
+                self._upsert_many([item])
+                applied += 1
+                
+                # Pasta movida para dentro da árvore: indexar seu conteúdo
+                if is_new_folder:
+                    applied += self._upsert_many(
+                        client._crawl_folder_tree(item['id'], include_folders=True)
+                    )
+            
+            elif self.is_known(item['id']):
+                # Movido para fora das raízes indexadas
+                with self._conn:
+                    self._remove_subtree(item['id'])
+                applied += 1
+        
+        return applied
+    
+    # ==================== ESCRITA ====================
+    
+    def _upsert_many(
+        self,
+        items: Iterable[Dict],
+        batch_size: int = 500,
+        commit: bool = True
+    ) -> int:
+        """
+        Inserir/atualizar nós em lotes
+        
+        Com commit=True, cada lote é uma transação; com commit=False, os
+        lotes entram na transação aberta pelo chamador (`with self._conn:`).
+        """
+        count = 0
+        batch = []
+        
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                count += self._upsert_batch(batch, commit)
+                batch = []
+        
+        if batch:
+            count += self._upsert_batch(batch, commit)
+        
+        return count
+    
+    def _upsert_batch(self, items: List[Dict], commit: bool = True) -> int:
+        with self._lock:
+            if commit:
+                with self._conn:
+                    self._write_batch(items)
+            else:
+                self._write_batch(items)
+        return len(items)
+    
+    def _write_batch(self, items: List[Dict]) -> None:
+        """Gravar um lote de nós (chamar dentro de transação)"""
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO nodes "
+            "(id, name, mime_type, size, md5_checksum, modified_time) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    i['id'],
+                    i.get('name', ''),
+                    i.get('mimeType', ''),
+                    int(i['size']) if i.get('size') is not None else None,
+                    i.get('md5Checksum'),
+                    i.get('modifiedTime'),
+                )
+                for i in items
+            ]
+        )
+        self._conn.executemany(
+            "DELETE FROM node_parents WHERE node_id = ?",
+            [(i['id'],) for i in items]
+        )
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO node_parents (node_id, parent_id) VALUES (?, ?)",
+            [(i['id'], p) for i in items for p in i.get('parents', [])]
+        )
+    
+    def _remove_subtree(self, node_id: str, keep_root: bool = False) -> None:
+        """Remover nó e todos os descendentes (chamar dentro de transação)"""
+        rows = self._conn.execute(
+            """
+            WITH RECURSIVE subtree(id) AS (
+                SELECT ?
+                UNION
+                SELECT np.node_id FROM node_parents np
+                JOIN subtree s ON np.parent_id = s.id
+            )
+            SELECT id FROM subtree
+            """,
+            (node_id,)
+        ).fetchall()
+        
+        ids = [(r['id'],) for r in rows if not (keep_root and r['id'] == node_id)]
+        self._conn.executemany("DELETE FROM nodes WHERE id = ?", ids)
+        self._conn.executemany("DELETE FROM node_parents WHERE node_id = ?", ids)
+        if not keep_root:
+            self._conn.execute("DELETE FROM roots WHERE root_id = ?", (node_id,))
+    
+    def _set_state(self, key: str, value: Optional[str]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+                (key, value)
+            )
+    
+    # ==================== CONSULTA ====================
+    
+    def get_page_token(self) -> Optional[str]:
+        """Page token do changes.list armazenado (None se nunca construído)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE key = 'page_token'"
+            ).fetchone()
+        return row['value'] if row else None
+    
+    def has_root(self, root_id: str) -> bool:
+        """Verificar se a pasta raiz já foi indexada"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM roots WHERE root_id = ?", (root_id,)
+            ).fetchone()
+        return row is not None
+    
+    def is_known(self, node_id: Optional[str]) -> bool:
+        """Verificar se nó está no índice (ou é uma raiz indexada)"""
+        if not node_id:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM nodes WHERE id = ? UNION ALL "
+                "SELECT 1 FROM roots WHERE root_id = ? LIMIT 1",
+                (node_id, node_id)
+            ).fetchone()
+        return row is not None
+    
+    def get(self, node_id: str) -> Optional[Dict]:
+        """Obter metadados de um nó"""
+        with self._lock:
+            row = self._conn.execute(
+                self._select_sql("WHERE n.id = ?"), (node_id,)
+            ).fetchone()
+        return self._row_to_item(row) if row else None
+    
+    def children(
+        self,
+        parent_id: str,
+        folders_only: bool = False,
+        name: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Listar filhos diretos de uma pasta
+        
+        Args:
+            parent_id: ID da pasta
+            folders_only: Retornar apenas subpastas
+            name: Filtrar por nome exato
+        
+        Returns:
+            Lista de metadados no formato da API do Drive
+        """
+        conditions = ["n.id IN (SELECT node_id FROM node_parents WHERE parent_id = ?)"]
+        params = [parent_id]
+        if folders_only:
+            conditions.append("n.mime_type = ?")
+            params.append(FOLDER_MIME_TYPE)
+        if name is not None:
+            conditions.append("n.name = ?")
+            params.append(name)
+        
+        with self._lock:
+            rows = self._conn.execute(
+                self._select_sql("WHERE " + " AND ".join(conditions) + " ORDER BY n.name"),
+                params
+            ).fetchall()
+        return [self._row_to_item(r) for r in rows]
+    
+    def iter_files(self, root_id: str, recursive: bool = True) -> Iterator[Dict]:
+        """
+        Iterar sobre os arquivos (não pastas) abaixo de uma pasta
+        
+        Args:
+            root_id: ID da pasta
+            recursive: Incluir subpastas
+        
+        Yields:
+            Metadados no formato da API do Drive
+        """
+        if recursive:
+            sql = """
+            WITH RECURSIVE tree(id) AS (
+                SELECT ?
+                UNION
+                SELECT np.node_id FROM node_parents np
+                JOIN tree t ON np.parent_id = t.id
+            )
+            """ + self._select_sql(
+                "WHERE n.id IN (SELECT id FROM tree) AND n.id != ? "
+                "AND n.mime_type != ? ORDER BY n.name"
+            )
+            params = (root_id, root_id, FOLDER_MIME_TYPE)
+        else:
+            sql = self._select_sql(
+                "WHERE n.id IN (SELECT node_id FROM node_parents WHERE parent_id = ?) "
+                "AND n.mime_type != ? ORDER BY n.name"
+            )
+            params = (root_id, FOLDER_MIME_TYPE)
+        
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        
+        for row in rows:
+            yield self._row_to_item(row)
+    
+    def list_files(
+        self,
+        root_id: str,
+        recursive: bool = True,
+        max_results: int = 1000
+    ) -> List[Dict]:
+        """Listar arquivos abaixo de uma pasta (ver iter_files)"""
+        files = []
+        for item in self.iter_files(root_id, recursive):
+            files.append(item)
+            if len(files) >= max_results:
+                break
+        return files
+    
+    @staticmethod
+    def _select_sql(where: str) -> str:
+        return (
+            "SELECT n.id, n.name, n.mime_type, n.size, n.md5_checksum, n.modified_time, "
+            "(SELECT group_concat(parent_id) FROM node_parents WHERE node_id = n.id) AS parents "
+            "FROM nodes n " + where
+        )
+    
+    @staticmethod
+    def _row_to_item(row: sqlite3.Row) -> Dict:
+        """Converter linha do SQLite para o formato de metadados da API"""
+        item = {
+            'id': row['id'],
+            'name': row['name'],
+            'mimeType': row['mime_type'],
+            'modifiedTime': row['modified_time'],
+            'parents': row['parents'].split(',') if row['parents'] else [],
+        }
+        if row['size'] is not None:
+            item['size'] = str(row['size'])
+        if row['md5_checksum']:
+            item['md5Checksum'] = row['md5_checksum']
+        return item
@@ -1,39 +1,132 @@
 """
 Rate limiter para Google Drive API
 """
+import asyncio
+import struct
 import time
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional, Tuple
 from loguru import logger
 
+from ..core.exceptions import ConfigurationError
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem estado compartilhado entre processos
+    fcntl = None
+
+
+# Estado do balde compartilhado: saldo de fichas, instante do último reabastecimento
+SHARED_STATE = struct.Struct('<dd')
+
 
 class RateLimiter:
     """
     Controlar taxa de requisições para respeitar limites do Google Drive
     
     Limite: 5-10 requisições por segundo
-    Estratégia: Token bucket simples
+    Estratégia: token bucket com rajada
+    
+    O balde enche a `requests_per_second` até `burst` fichas. Cada
+    requisição debita `cost` fichas sob a trava e, se o saldo ficar
+    negativo, dorme fora dela até a dívida ser paga; com fichas
+    disponíveis, a chamada retorna sem dormir.
+    
+    Com `shared_state_path`, o saldo do balde fica em um arquivo protegido
+    por fcntl.flock, então vários processos do pipeline no mesmo host
+    dividem uma única cota.
     """
     
-    def __init__(self, requests_per_second: int = 5):
+    def __init__(
+        self,
+        requests_per_second: float = 5,
+        burst: int = 1,
+        shared_state_path: Optional[Path] = None
+    ):
         """
         Inicializar rate limiter
         
         Args:
             requests_per_second: Requisições por segundo permitidas
+            burst: Requisições que podem sair de uma vez com o balde cheio
+            shared_state_path: Arquivo de estado compartilhado entre
+                processos (None = apenas este processo)
         """
         self.requests_per_second = requests_per_second
         self.min_interval = 1.0 / requests_per_second
+        self.burst = max(1, burst)
         self.last_request_time = 0
+        self._lock = threading.Lock()
+        
+        self._tokens = float(self.burst)
+        self._last_refill = time.time()
+        
+        self.shared_state_path = Path(shared_state_path) if shared_state_path else None
+        if self.shared_state_path and fcntl is None:
+            logger.warning("fcntl indisponível: rate limit compartilhado desativado")
+            self.shared_state_path = None
+        if self.shared_state_path:
+            self.shared_state_path.parent.mkdir(parents=True, exist_ok=True)
     
-    def wait(self) -> None:
-        """Aguardar se necessário antes de fazer requisição"""
-        elapsed = time.time() - self.last_request_time
-        sleep_time = self.min_interval - elapsed
+    def wait(self, cost: int = 1) -> None:
+        """
+        Aguardar se necessário antes de fazer requisição (thread-safe)
         
+        Args:
+            cost: Número de requisições consumidas (ex: itens de um batch HTTP)
+        """
+        sleep_time = self.reserve(cost)
         if sleep_time > 0:
             logger.debug(f"Rate limiting: sleeping {sleep_time:.3f}s")
             time.sleep(sleep_time)
+    
+    def reserve(self, cost: int = 1) -> float:
+        """
+        Debitar cost fichas sem dormir (thread-safe)
         
-        self.last_request_time = time.time()
+        Returns:
+            Segundos que o chamador deve aguardar antes da requisição
+        """
+        with self._lock:
+            if self.shared_state_path:
+                sleep_time = self._reserve_shared(cost)
+            else:
+                self._tokens, self._last_refill, sleep_time = self._reserve(
+                    self._tokens, self._last_refill, cost
+                )
+            self.last_request_time = time.time() + sleep_time
+        return sleep_time
+    
+    def _reserve(self, tokens: float, last_refill: float, cost: int) -> Tuple[float, float, float]:
+        """Reabastecer o balde e debitar cost; retorna (saldo, instante, espera)"""
+        now = time.time()
+        tokens = min(float(self.burst), tokens + (now - last_refill) * self.requests_per_second)
+        tokens -= cost
+        sleep_time = max(0.0, -tokens / self.requests_per_second)
+        return tokens, now, sleep_time
+    
+    def _reserve_shared(self, cost: int) -> float:
+        """Debitar do balde compartilhado (arquivo sob trava exclusiva)"""
+        with open(self.shared_state_path, 'a+b') as state_file:
+            fcntl.flock(state_file, fcntl.LOCK_EX)
+            try:
+                state_file.seek(0)
+                raw = state_file.read(SHARED_STATE.size)
+                if len(raw) == SHARED_STATE.size:
+                    tokens, last_refill = SHARED_STATE.unpack(raw)
+                else:
+                    tokens, last_refill = float(self.burst), time.time()
+                
+                tokens, last_refill, sleep_time = self._reserve(tokens, last_refill, cost)
+                
+                state_file.truncate(0)
+                state_file.write(SHARED_STATE.pack(tokens, last_refill))
+                state_file.flush()
+            finally:
+                fcntl.flock(state_file, fcntl.LOCK_UN)
+        return sleep_time
     
     def __enter__(self):
         """Context manager"""
@@ -43,3 +136,177 @@ class RateLimiter:
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Context manager exit"""
         pass
+
+
+class AsyncRateLimiter:
+    """
+    Versão asyncio do RateLimiter (mesmo token bucket)
+    
+    A reserva é feita no RateLimiter (trava curta, sem espera) e a corrotina
+    dorme com asyncio.sleep, então centenas de corrotinas aguardam sem
+    bloquear o loop. Passando o `rate_limiter` do GoogleDriveClient, os
+    clientes síncrono e assíncrono dividem a mesma cota; com
+    shared_state_path, a cota também é dividida entre processos.
+    """
+    
+    def __init__(
+        self,
+        requests_per_second: float = 5,
+        burst: int = 1,
+        shared_state_path: Optional[Path] = None,
+        rate_limiter: Optional[RateLimiter] = None
+    ):
+        """
+        Inicializar rate limiter
+        
+        Args:
+            requests_per_second: Requisições por segundo permitidas
+            burst: Requisições que podem sair de uma vez com o balde cheio
+            shared_state_path: Arquivo de estado compartilhado entre processos
+            rate_limiter: Balde existente a compartilhar (ignora os demais)
+        """
+        self.bucket = rate_limiter or RateLimiter(requests_per_second, burst, shared_state_path)
+        self.requests_per_second = self.bucket.requests_per_second
+    
+    async def wait(self, cost: int = 1) -> None:
+        """
+        Aguardar a vez da requisição
+        
+        Args:
+            cost: Número de requisições consumidas
+        """
+        sleep_time = self.bucket.reserve(cost)
+        if sleep_time > 0:
+            await asyncio.sleep(sleep_time)
+
+
+def parse_active_hours(spec: Optional[str]) -> Optional[Tuple[int, int]]:
+    """
+    Interpretar janela de horário "HH:MM-HH:MM" em minutos do dia
+    
+    A janela pode cruzar a meia-noite ("22:00-06:00"). Vazio = sempre ativa.
+    """
+    if not spec or not spec.strip():
+        return None
+    try:
+        start, end = spec.strip().split('-')
+        minutes = []
+        for value in (start, end):
+            hours, mins = value.strip().split(':')
+            minutes.append(int(hours) * 60 + int(mins))
+    except ValueError:
+        raise ConfigurationError(f"Janela de horário inválida (use HH:MM-HH:MM): {spec!r}")
+    return minutes[0], minutes[1]
+
+
+class BandwidthLimiter:
+    """
+    Limite de banda (bytes por segundo) compartilhado entre threads
+    
+    Token bucket em bytes: o balde enche a `bytes_per_second` até
+    `burst_bytes`, permitindo rajadas curtas. Cada transferência debita
+    seus bytes (o saldo pode ficar negativo para chunks maiores que a
+    rajada) e a thread dorme até a dívida ser paga; como o débito é feito
+    sob a trava, as threads seguintes esperam em fila e a soma respeita o
+    limite.
+    
+    Com `active_hours`, o limite só vale dentro da janela (ex: horário
+    comercial); fora dela a transferência segue sem espera.
+    """
+    
+    def __init__(
+        self,
+        bytes_per_second: float,
+        burst_bytes: Optional[float] = None,
+        active_hours: Optional[str] = None,
+        now: Callable[[], datetime] = datetime.now
+    ):
+        """
+        Inicializar limitador
+        
+        Args:
+            bytes_per_second: Taxa máxima (0 = sem limite)
+            burst_bytes: Tamanho do balde (padrão: 1 segundo de taxa)
+            active_hours: Janela "HH:MM-HH:MM" em que o limite vale (None = sempre)
+            now: Relógio de parede usado pela janela de horário
+        """
+        self.bytes_per_second = bytes_per_second
+        self.burst_bytes = burst_bytes or bytes_per_second
+        self.active_hours = parse_active_hours(active_hours)
+        self._now = now
+        
+        self._tokens = self.burst_bytes
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+        self.total_wait_seconds = 0.0
+    
+    @classmethod
+    def from_config(cls, config, direction: str) -> 'BandwidthLimiter':
+        """
+        Criar limitador de Config
+        
+        Args:
+            config: Classe de configuração
+            direction: 'download' ou 'upload'
+        """
+        mb_s = config.DOWNLOAD_LIMIT_MB_S if direction == 'download' else config.UPLOAD_LIMIT_MB_S
+        return cls(
+            bytes_per_second=mb_s * 1024 * 1024,
+            burst_bytes=config.BANDWIDTH_BURST_MB * 1024 * 1024,
+            active_hours=config.BANDWIDTH_LIMIT_HOURS
+        )
+    
+    def is_active(self) -> bool:
+        """Verificar se o limite vale agora"""
+        if self.bytes_per_second <= 0:
+            return False
+        if self.active_hours is None:
+            return True
+        
+        now = self._now()
+        minute = now.hour * 60 + now.minute
+        start, end = self.active_hours
+        if start <= end:
+            return start <= minute < end
+        return minute >= start or minute < end
+    
+    def limit_chunk(self, chunk_bytes: int, multiple: int = 1) -> int:
+        """
+        Reduzir o chunk à rajada permitida enquanto o limite estiver ativo
+        
+        Args:
+            chunk_bytes: Chunk escolhido pelo cliente
+            multiple: Manter múltiplos deste valor (256 KB em uploads)
+        """
+        if not self.is_active() or chunk_bytes <= self.burst_bytes:
+            return chunk_bytes
+        return max(multiple, int(self.burst_bytes) // multiple * multiple)
+    
+    def consume(self, nbytes: int) -> float:
+        """
+        Debitar bytes transferidos e aguardar se a taxa foi excedida
+        
+        Args:
+            nbytes: Bytes transferidos
+        
+        Returns:
+            Segundos aguardados
+        """
+        if nbytes <= 0 or not self.is_active():
+            return 0.0
+        
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst_bytes,
+                self._tokens + (now - self._last_refill) * self.bytes_per_second
+            )
+            self._last_refill = now
+            self._tokens -= nbytes
+            wait_seconds = max(0.0, -self._tokens / self.bytes_per_second)
+            self.total_wait_seconds += wait_seconds
+        
+        if wait_seconds > 0:
+            logger.debug(f"Limite de banda: aguardando {wait_seconds:.2f}s")
+            time.sleep(wait_seconds)
+        return wait_seconds
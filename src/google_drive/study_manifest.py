@@ -0,0 +1,139 @@
+"""
+Manifesto de estudo DICOM (tamanho e contagem a partir da listagem)
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+from itertools import chain
+from pathlib import PurePosixPath
+from typing import Dict, Iterable, List, Optional
+
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+GOOGLE_APPS_MIME_PREFIX = 'application/vnd.google-apps.'
+
+
+def _safe_name(name: str) -> str:
+    """Nome do Drive como um único componente de caminho local"""
+    name = name.replace('/', '_').replace('\\', '_').replace('\0', '_').strip()
+    return '_' if name in ('', '.', '..') else name
+
+
+def _suffixed_name(name: str, item_id: str) -> str:
+    """Nome único com o ID do item (mantém a extensão)"""
+    path = PurePosixPath(name)
+    return f"{path.stem}_{item_id}{path.suffix}"
+
+
+@dataclass
+class StudyManifest:
+    """
+    Resumo de um estudo montado apenas com metadados de listagem
+    
+    Nenhum arquivo é baixado: tamanho, contagem e datas vêm dos campos
+    `size`, `modifiedTime` e `parents` já retornados pelo files.list.
+    Cada entrada de `files` recebe também `relative_path` (caminho do
+    arquivo relativo à pasta DICOM do estudo). Os nomes do Drive viram
+    componentes seguros (sem "/", "\\" ou ".."), e nomes repetidos na
+    mesma pasta, que o Drive permite, recebem o ID como sufixo; assim
+    nenhum arquivo escapa do diretório do estudo ou sobrescreve outro.
+    """
+    root_id: str
+    total_bytes: int = 0
+    file_count: int = 0
+    series_count: int = 0
+    newest_modified_time: Optional[str] = None
+    files: List[Dict] = field(default_factory=list, repr=False)
+    
+    @property
+    def size_mb(self) -> float:
+        return self.total_bytes / (1024 * 1024)
+    
+    @classmethod
+    def from_items(cls, root_id: str, items: Iterable[Dict]) -> 'StudyManifest':
+        """
+        Montar manifesto a partir dos itens (pastas e arquivos) da árvore
+        
+        Args:
+            root_id: ID da pasta DICOM do estudo
+            items: Todos os nós abaixo da raiz, com `parents` preenchido
+        
+        Returns:
+            StudyManifest agregado
+        """
+        folders = {}
+        files = []
+        for item in items:
+            mime_type = item.get('mimeType', '')
+            if mime_type == FOLDER_MIME_TYPE:
+                folders[item['id']] = item
+            elif not mime_type.startswith(GOOGLE_APPS_MIME_PREFIX):
+                # Google Docs/Sheets não têm conteúdo binário para baixar
+                files.append(item)
+        
+        # Nomes repetidos na mesma pasta (arquivos e pastas juntos)
+        siblings = Counter(
+            (parent_id, _safe_name(item['name']))
+            for item in chain(folders.values(), files)
+            for parent_id in item.get('parents', [])
+        )
+        
+        def local_name(item: Dict, parent_id: str) -> str:
+            name = _safe_name(item['name'])
+            if siblings[(parent_id, name)] > 1:
+                return _suffixed_name(name, item['id'])
+            return name
+        
+        paths = {root_id: PurePosixPath()}
+        
+        def folder_path(folder_id: str) -> Optional[PurePosixPath]:
+            if folder_id in paths:
+                return paths[folder_id]
+            folder = folders.get(folder_id)
+            if folder is None:
+                return None
+            parent_id = next(
+                (pid for pid in folder.get('parents', []) if folder_path(pid) is not None),
+                None
+            )
+            paths[folder_id] = (
+                None if parent_id is None
+                else paths[parent_id] / local_name(folder, parent_id)
+            )
+            return paths[folder_id]
+        
+        manifest = cls(root_id=root_id)
+        series = set()
+        
+        for item in files:
+            parent_id, parent_path = next(
+                ((pid, folder_path(pid)) for pid in item.get('parents', [])
+                 if folder_path(pid) is not None),
+                (None, None)
+            )
+            if parent_id is None:
+                continue  # Fora da árvore do estudo
+            
+            relative_path = parent_path / local_name(item, parent_id)
+            manifest.files.append(dict(item, relative_path=str(relative_path)))
+            manifest.file_count += 1
+            manifest.total_bytes += int(item.get('size', 0) or 0)
+            series.add(parent_id)
+            
+            modified_time = item.get('modifiedTime')
+            if modified_time and (manifest.newest_modified_time is None
+                                  or modified_time > manifest.newest_modified_time):
+                manifest.newest_modified_time = modified_time
+        
+        # Séries = pastas que contêm arquivos diretamente
+        manifest.series_count = len(series)
+        manifest.files.sort(key=lambda f: f['relative_path'])
+        return manifest
+    
+    def to_dict(self) -> Dict:
+        """Resumo serializável (sem a lista de arquivos)"""
+        return {
+            'total_bytes': self.total_bytes,
+            'file_count': self.file_count,
+            'series_count': self.series_count,
+            'newest_modified_time': self.newest_modified_time,
+        }
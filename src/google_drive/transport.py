@@ -0,0 +1,91 @@
+"""
+Transporte HTTP com pool de conexões para o cliente do Google Drive
+"""
+import queue
+import threading
+from typing import Optional
+
+import httplib2
+import google_auth_httplib2
+
+
+class PooledAuthorizedHttp:
+    """
+    Pool de conexões httplib2 autorizadas, seguro entre threads
+    
+    `httplib2.Http` não é thread-safe: um único objeto compartilhado pelos
+    workers serializa ou corrompe requisições simultâneas. Este objeto
+    tem a mesma interface `request()` e é passado a `build(http=...)`, então
+    todo HttpRequest, batch e download de mídia do serviço passa por ele.
+    
+    Cada requisição pega uma conexão ociosa (a mais recente, ainda
+    keep-alive) ou cria uma nova, até `pool_size` conexões simultâneas;
+    acima disso, a thread aguarda uma conexão ser devolvida.
+    """
+    
+    def __init__(
+        self,
+        credentials,
+        pool_size: int = 16,
+        timeout: Optional[float] = None
+    ):
+        """
+        Inicializar pool
+        
+        Args:
+            credentials: Credenciais google-auth
+            pool_size: Máximo de conexões simultâneas
+            timeout: Timeout de socket em segundos (None = padrão do httplib2)
+        """
+        self.credentials = credentials
+        self.pool_size = pool_size
+        self.timeout = timeout
+        
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        self.connections_created = 0
+    
+    def _new_http(self):
+        """Criar conexão autorizada (renova o token sozinha em 401)"""
+        return google_auth_httplib2.AuthorizedHttp(
+            self.credentials,
+            http=httplib2.Http(timeout=self.timeout)
+        )
+    
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        try:
+            http = self._new_http()
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.connections_created += 1
+        return http
+    
+    def _release(self, http) -> None:
+        self._idle.put(http)
+        self._slots.release()
+    
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        """Executar requisição em uma conexão exclusiva do pool"""
+        http = self._acquire()
+        try:
+            return http.request(uri, method, body=body, headers=headers, **kwargs)
+        finally:
+            self._release(http)
+    
+    def close(self) -> None:
+        """Fechar conexões ociosas"""
+        while True:
+            try:
+                http = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            http.close()
@@ -0,0 +1,92 @@
+"""
+Persistência de sessões de upload resumable (URI + offset confirmado)
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+SESSION_TTL_SECONDS = 6 * 24 * 3600  # O Drive expira sessões após ~1 semana
+
+
+class UploadSessionStore:
+    """
+    Registro durável das sessões de upload resumable em andamento
+    
+    Cada sessão é identificada pelo destino (pasta + nome) e pelo conteúdo
+    (tamanho + md5), não pelo caminho local: o mesmo NIfTI regenerado em
+    outro diretório de staging reaproveita a sessão, e um conteúdo diferente
+    nunca. A sessão é gravada assim que aberta (offset 0) e após cada chunk
+    confirmado; um retry ou uma nova execução consulta o status da sessão no
+    Drive e continua do último byte confirmado.
+    """
+    
+    def __init__(self, path: Optional[Path] = None, ttl_seconds: float = SESSION_TTL_SECONDS):
+        """
+        Inicializar registro
+        
+        Args:
+            path: Arquivo SQLite (None = apenas memória)
+            ttl_seconds: Idade máxima de uma sessão reaproveitável
+        """
+        self.ttl_seconds = ttl_seconds
+        
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(path) if path else ':memory:',
+            check_same_thread=False
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "key TEXT PRIMARY KEY, uri TEXT NOT NULL, "
+                "committed INTEGER NOT NULL, created_at REAL NOT NULL)"
+            )
+    
+    @staticmethod
+    def session_key(folder_id: str, file_name: str, size: int, md5: str) -> str:
+        """Chave da sessão: destino + conteúdo (tamanho e md5)"""
+        raw = f"{folder_id}:{file_name}:{size}:{md5}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+    
+    def get(self, key: str) -> Optional[Tuple[str, int]]:
+        """Sessão ainda válida: (URI, bytes confirmados) ou None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT uri, committed, created_at FROM sessions WHERE key = ?",
+                (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        if time.time() - row[2] > self.ttl_seconds:
+            self.delete(key)
+            return None
+        return row[0], row[1]
+    
+    def save(self, key: str, uri: str, committed: int) -> None:
+        """Gravar URI e offset confirmado (mantém a data de criação)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sessions (key, uri, committed, created_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET uri = excluded.uri, committed = excluded.committed",
+                (key, uri, committed, time.time())
+            )
+    
+    def delete(self, key: str) -> None:
+        """Esquecer sessão (concluída ou inválida)"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+    
+    def purge_expired(self) -> int:
+        """Remover sessões expiradas; retorna quantas foram removidas"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM sessions WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,)
+            )
+        return cursor.rowcount
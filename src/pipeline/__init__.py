@@ -2,8 +2,10 @@
 Inicialização do módulo pipeline
 """
 from .batch_pipeline import BatchPipeline, ProcessingTask
+from .async_driver import AsyncStudyDownloader
 
 __all__ = [
     'BatchPipeline',
     'ProcessingTask',
+    'AsyncStudyDownloader',
 ]
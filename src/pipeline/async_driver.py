@@ -0,0 +1,274 @@
+"""
+Driver asyncio para download de estudos com centenas de requisições em andamento
+"""
+import asyncio
+import queue
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from loguru import logger
+
+from ..core.config import Config
+from ..google_drive.async_client import AsyncGoogleDriveClient
+from ..google_drive.download_engine import StudyDownloadStats, already_present, ledger_key
+
+
+# Marca de fim da fila de resultados
+_DONE = object()
+
+
+class AsyncStudyDownloader:
+    """
+    Download de estudos por um AsyncGoogleDriveClient, em um loop próprio
+    
+    Mesmo contrato do DownloadScheduler.run (o BatchPipeline usa um ou
+    outro conforme Config.ASYNC_DOWNLOADS): os estudos são consumidos sob
+    demanda, até `max_active_studies` por vez, e cada um é entregue assim
+    que seu último arquivo termina. Cada arquivo é uma corrotina; um
+    semáforo mantém no máximo `max_in_flight` downloads em andamento no
+    total, sem uma thread por requisição.
+    
+    O loop roda em uma thread dedicada; o chamador recebe os estudos
+    concluídos por uma fila, então o restante do pipeline continua síncrono.
+    Ledger, cache local de downloads e retry com backoff seguem as mesmas
+    regras do DownloadScheduler.
+    """
+    
+    def __init__(
+        self,
+        client: AsyncGoogleDriveClient,
+        max_in_flight: Optional[int] = None,
+        max_active_studies: Optional[int] = None,
+        ledger=None,
+        download_cache=None
+    ):
+        """
+        Inicializar driver
+        
+        Args:
+            client: AsyncGoogleDriveClient ainda não aberto (a sessão é
+                aberta e fechada no loop do driver)
+            max_in_flight: Downloads simultâneos no total
+                (padrão: Config.ASYNC_MAX_IN_FLIGHT)
+            max_active_studies: Estudos baixando ao mesmo tempo
+                (padrão: Config.MAX_WORKERS_DOWNLOAD)
+            ledger: TransferLedger com os arquivos já baixados de cada estudo
+            download_cache: DownloadCache local (None = sem cache)
+        """
+        self.client = client
+        self.max_in_flight = max_in_flight or Config.ASYNC_MAX_IN_FLIGHT
+        self.max_active_studies = max_active_studies or Config.MAX_WORKERS_DOWNLOAD
+        self.ledger = ledger
+        self.download_cache = download_cache
+        self.max_retries = Config.MAX_RETRIES
+        self.retry_backoff = Config.RETRY_BACKOFF_FACTOR
+    
+    @classmethod
+    def from_client(cls, sync_client, ledger=None, **client_kwargs) -> 'AsyncStudyDownloader':
+        """
+        Criar driver a partir de um GoogleDriveClient
+        
+        O cliente assíncrono usa as mesmas credenciais e o mesmo rate
+        limiter (uma única cota para os dois clientes) e o mesmo cache local.
+        """
+        client = AsyncGoogleDriveClient(
+            credentials=getattr(sync_client, 'credentials', None),
+            rate_limiter=sync_client.rate_limiter,
+            **client_kwargs
+        )
+        return cls(
+            client,
+            ledger=ledger,
+            download_cache=getattr(sync_client, 'download_cache', None)
+        )
+    
+    def run(
+        self,
+        studies: Iterable[Tuple[Dict, Path]]
+    ) -> Iterator[Tuple[Dict, Path, StudyDownloadStats]]:
+        """
+        Baixar estudos em um loop asyncio dedicado
+        
+        Args:
+            studies: Iterável de (study_info, diretório local do estudo)
+        
+        Yields:
+            (study_info, study_dir, stats) à medida que cada estudo termina
+        """
+        results = queue.Queue()
+        loop = asyncio.new_event_loop()
+        main = loop.create_task(self._main(iter(studies), results))
+        thread = threading.Thread(
+            target=self._run_loop, args=(loop, main), name='async-download', daemon=True
+        )
+        thread.start()
+        
+        try:
+            while True:
+                entry = results.get()
+                if entry is _DONE:
+                    return
+                if isinstance(entry, BaseException):
+                    raise entry
+                yield entry
+        finally:
+            # Consumidor parou antes do fim: cancelar os downloads restantes
+            if not main.done():
+                loop.call_soon_threadsafe(main.cancel)
+            thread.join()
+    
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop, main: asyncio.Task) -> None:
+        try:
+            loop.run_until_complete(main)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
+    
+    async def _main(self, studies: Iterator[Tuple[Dict, Path]], results: queue.Queue) -> None:
+        """Admitir estudos sob demanda e publicar cada um ao terminar"""
+        try:
+            async with self.client:
+                downloads = asyncio.Semaphore(self.max_in_flight)
+                study_slots = asyncio.Semaphore(self.max_active_studies)
+                running = set()
+                
+                async def run_study(study_info: Dict, study_dir: Path) -> None:
+                    try:
+                        stats = await self._download_study(study_info, Path(study_dir), downloads)
+                        results.put((study_info, Path(study_dir), stats))
+                    finally:
+                        study_slots.release()
+                
+                try:
+                    while True:
+                        await study_slots.acquire()
+                        # O iterável pode reservar staging ou listar o Drive: fora do loop
+                        entry = await asyncio.to_thread(next, studies, None)
+                        if entry is None:
+                            study_slots.release()
+                            break
+                        task = asyncio.create_task(run_study(*entry))
+                        running.add(task)
+                        task.add_done_callback(running.discard)
+                    
+                    await asyncio.gather(*running)
+                finally:
+                    # Cancelamento ou erro: não deixar downloads órfãos no loop
+                    for task in running:
+                        task.cancel()
+                    await asyncio.gather(*running, return_exceptions=True)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            results.put(e)
+        finally:
+            results.put(_DONE)
+    
+    async def _download_study(
+        self,
+        study_info: Dict,
+        study_dir: Path,
+        downloads: asyncio.Semaphore
+    ) -> StudyDownloadStats:
+        """Planejar e baixar os arquivos de um estudo"""
+        started = time.time()
+        try:
+            manifest = study_info.get('manifest')
+            if manifest is None:
+                manifest = await self.client.build_study_manifest(study_info)
+            await asyncio.to_thread(study_dir.mkdir, parents=True, exist_ok=True)
+        except Exception as e:
+            # Só este estudo falha; os downloads dos demais continuam
+            logger.error(f"Erro ao planejar download de {study_info['name']}: {e}")
+            return StudyDownloadStats(study_name=study_info['name'], error=str(e))
+        
+        stats = StudyDownloadStats(
+            study_name=study_info['name'],
+            files_total=manifest.file_count,
+            bytes_total=manifest.total_bytes
+        )
+        
+        # Arquivos já concluídos em uma tentativa anterior
+        def missing_files():
+            done = self.ledger.done_items(study_info['id'], 'download') if self.ledger else {}
+            return [item for item in manifest.files if not already_present(item, study_dir, done)]
+        
+        queue_items = await asyncio.to_thread(missing_files)
+        stats.files_skipped = manifest.file_count - len(queue_items)
+        if stats.files_skipped:
+            logger.info(
+                f"Retomando {study_info['name']}: {stats.files_skipped}/{stats.files_total} "
+                f"arquivos já baixados"
+            )
+        
+        await asyncio.gather(*(
+            self._fetch_with_retry(study_info, study_dir, item, stats, downloads)
+            for item in queue_items
+        ))
+        stats.elapsed_seconds = time.time() - started
+        return stats
+    
+    async def _fetch_with_retry(
+        self,
+        study_info: Dict,
+        study_dir: Path,
+        item: Dict,
+        stats: StudyDownloadStats,
+        downloads: asyncio.Semaphore
+    ) -> None:
+        """Baixar um arquivo, com backoff entre tentativas (vaga liberada na espera)"""
+        size = int(item.get('size', 0) or 0)
+        attempts = 0
+        while True:
+            try:
+                async with downloads:
+                    from_cache = await self._fetch(item, study_dir / item['relative_path'])
+                break
+            except Exception as e:
+                attempts += 1
+                if attempts >= self.max_retries:
+                    stats.files_failed += 1
+                    logger.warning(f"Erro ao baixar {item['relative_path']}: {e}")
+                    return
+                delay = self.retry_backoff ** attempts * random.uniform(1, 1.5)
+                logger.debug(
+                    f"Nova tentativa ({attempts}) para {item['relative_path']} em {delay:.1f}s: {e}"
+                )
+                await asyncio.sleep(delay)
+        
+        stats.files_downloaded += 1
+        if self.ledger is not None:
+            await asyncio.to_thread(
+                self.ledger.mark_done, study_info['id'], 'download', ledger_key(item)
+            )
+        if from_cache:
+            stats.files_from_cache += 1
+            stats.bytes_from_cache += size
+        else:
+            stats.bytes_downloaded += size
+    
+    async def _fetch(self, item: Dict, dest: Path) -> bool:
+        """
+        Obter um arquivo do plano (cache local ou Drive)
+        
+        Returns:
+            True se veio do cache local
+        """
+        cache = self.download_cache
+        if cache is not None and await asyncio.to_thread(cache.materialize, item, dest):
+            return True
+        
+        await self.client.download_file(
+            item['id'],
+            dest,
+            expected_size=int(item['size']) if item.get('size') else None,
+            expected_md5=item.get('md5Checksum')
+        )
+        if cache is not None:
+            await asyncio.to_thread(cache.store, item, dest)
+        return False
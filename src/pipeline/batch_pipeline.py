@@ -2,25 +2,36 @@
 Pipeline Batch - Orquestrador principal de processamento
 """
 from pathlib import Path
-from typing import List, Dict, Optional
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from typing import List, Dict, Optional, Iterable, Iterator, Callable, Tuple, Any
+from concurrent.futures import (
+    ThreadPoolExecutor, ProcessPoolExecutor, Future, as_completed, wait, FIRST_COMPLETED
+)
+from collections import deque
 from dataclasses import dataclass
+from itertools import chain
+import multiprocessing
 import time
 from loguru import logger
 
 from ..core.config import Config
 from ..core.types import ProcessingStatus, ProcessingResult
-from ..core.exceptions import SddDicomError
-from ..google_drive import GoogleDriveClient
+from ..core.exceptions import SddDicomError, GoogleDriveError
+from ..google_drive import GoogleDriveClient, DownloadScheduler
+from .async_driver import AsyncStudyDownloader
 from ..dicom import DIOMConverter, DIOMValidator
 from ..utils import (
     calculate_checksum,
     ensure_directory,
     clean_temp_directory,
     retry_with_backoff,
-    CircuitBreaker
+    CircuitBreaker,
+    StagingArea,
+    TransferLedger
 )
 
+# Espaço reservado por tarefa no staging: download + NIfTI/JSON da conversão
+STAGING_SIZE_FACTOR = 2.5
+
 
 @dataclass
 class ProcessingTask:
@@ -32,6 +43,105 @@ class ProcessingTask:
     study_info: Optional[Dict] = None  # Se fornecido, é um estudo DICOM, não um arquivo
 
 
+def _bounded_submit(
+    executor,
+    fn: Callable,
+    items: Iterable,
+    max_pending: int
+) -> Iterator[Tuple[Any, Future]]:
+    """
+    Submeter itens de um iterável mantendo no máximo `max_pending` futures
+    
+    Permite consumir geradores (ex: descoberta em andamento no Drive) sem
+    materializar todas as tarefas em memória.
+    
+    Yields:
+        Tuplas (item, future concluído)
+    """
+    pending = {}
+    
+    for item in items:
+        pending[executor.submit(fn, item)] = item
+        
+        if len(pending) >= max_pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+    
+    for future in as_completed(pending):
+        yield pending[future], future
+
+
+def _prefetched(
+    executor,
+    fn: Callable,
+    items: Iterable,
+    ahead: int
+) -> Iterator[Tuple[Any, Future]]:
+    """
+    Submeter `fn` para até `ahead` itens à frente do que está sendo consumido
+    
+    Diferente de _bounded_submit, os itens saem na ordem de entrada; o
+    future de cada um pode ainda estar em andamento.
+    
+    Yields:
+        Tuplas (item, future)
+    """
+    window = deque()
+    for item in items:
+        window.append((item, executor.submit(fn, item)))
+        if len(window) > ahead:
+            yield window.popleft()
+    
+    while window:
+        yield window.popleft()
+
+
+def _process_pool_context():
+    """
+    Contexto dos processos de conversão
+    
+    Com fork, um processo criado enquanto threads de download seguram
+    travas (logging, HTTP) pode travar; forkserver (POSIX) parte de um
+    processo limpo. Sem forkserver, o padrão da plataforma (spawn).
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return None
+
+
+def _convert_file(converter, local_path: Path, timeout_seconds: int) -> Optional[Dict]:
+    """
+    Conversão individual (executada no ProcessPoolExecutor)
+    
+    Função de módulo: só o converter e os parâmetros são enviados ao
+    processo filho, sem o pipeline (cliente do Drive, travas, ledger).
+    """
+    try:
+        local_path = Path(local_path)
+        output_dir = local_path.parent / f"{local_path.stem}_nifti"
+        
+        result = converter.convert(
+            str(local_path),
+            str(output_dir),
+            timeout_seconds=timeout_seconds
+        )
+        
+        if result['status'] == 'success':
+            return {
+                'local_path': local_path,
+                'output_dir': output_dir,
+                'output_files': result['files'],
+                'status': ProcessingStatus.CONVERTING
+            }
+        else:
+            raise Exception(result.get('error', 'Conversão falhou'))
+    
+    except Exception as e:
+        logger.error(f"Erro na conversão: {e}")
+        raise
+
+
 class BatchPipeline:
     """
     Orquestrador do pipeline de conversão
@@ -42,13 +152,18 @@ class BatchPipeline:
     3. VALIDAÇÃO: Validar DICOM
     4. CONVERSÃO: Converter para NIfTI (ProcessPoolExecutor)
     5. UPLOAD: Fazer upload dos resultados (ThreadPoolExecutor)
+    
+    Download, validação e conversão formam um fluxo: cada estudo (ou
+    arquivo) é validado e enviado à conversão assim que termina de baixar,
+    enquanto os downloads seguintes continuam.
     """
     
     def __init__(
         self,
         google_drive_client: Optional[GoogleDriveClient] = None,
         dicom_converter: Optional[DIOMConverter] = None,
-        config: Optional[Config.__class__] = None
+        config: Optional[Config.__class__] = None,
+        ledger: Optional[TransferLedger] = None
     ):
         """
         Inicializar pipeline
@@ -57,11 +172,23 @@ class BatchPipeline:
             google_drive_client: Cliente Google Drive
             dicom_converter: Converter DICOM
             config: Configuração
+            ledger: Registro por arquivo de downloads/uploads concluídos
+                (padrão: em memória; Config.LEDGER_PATH se PERSIST_LEDGER)
         """
         self.config = config or Config
         self.google_drive = google_drive_client or GoogleDriveClient()
         self.converter = dicom_converter or DIOMConverter()
         self.validator = DIOMValidator()
+        self.ledger = ledger or TransferLedger(
+            self.config.LEDGER_PATH if self.config.PERSIST_LEDGER else None
+        )
+        
+        # Diretórios de trabalho (em RAM enquanto houver orçamento)
+        self.staging = StagingArea(
+            self.config.TEMP_DIR,
+            self.config.STAGING_RAM_DIR,
+            self.config.STAGING_RAM_MB
+        )
         
         # Circuit breaker para Google Drive
         self.drive_circuit_breaker = CircuitBreaker(
@@ -75,45 +202,53 @@ class BatchPipeline:
             'completed': 0,
             'failed': 0,
             'skipped': 0,
+            'bytes_downloaded': 0,
+            'bytes_from_cache': 0,
             'start_time': None,
             'end_time': None,
         }
         
         logger.info("✓ BatchPipeline inicializado")
     
-    def process_batch(self, tasks: List[ProcessingTask]) -> List[ProcessingResult]:
+    def process_batch(self, tasks: Iterable[ProcessingTask]) -> List[ProcessingResult]:
         """
         Processar lote de tarefas
         
         Args:
-            tasks: Lista de tarefas
+            tasks: Tarefas (lista ou gerador; com um gerador, os downloads
+                começam enquanto a descoberta ainda está em andamento)
         
         Returns:
             Lista de resultados
         """
         self.stats['start_time'] = time.time()
-        self.stats['total'] = len(tasks)
+        self.stats['total'] = 0
+        self.stats['bytes_downloaded'] = 0
+        self.stats['bytes_from_cache'] = 0
         
-        logger.info(f"Iniciando processamento de {len(tasks)} tarefas")
+        logger.info("Iniciando processamento de tarefas")
         
         results = []
         
         # Download em paralelo (I/O-bound)
         logger.info("[1/5] DOWNLOAD - Iniciando downloads paralelos")
         
-        # Verificar se há estudos
-        is_study = any(task.study_info for task in tasks)
+        # Verificar se há estudos (pela primeira tarefa, sem consumir o gerador)
+        tasks = iter(tasks)
+        first_task = next(tasks, None)
+        if first_task is not None:
+            tasks = chain([first_task], tasks)
+        
+        is_study = first_task is not None and bool(first_task.study_info)
         if is_study:
             downloaded_files = self._download_study_stage_for_tasks(tasks)
         else:
             downloaded_files = self._download_stage(tasks)
         
-        # Validação DICOM
-        logger.info("[2/5] VALIDAÇÃO - Validando arquivos DICOM")
+        # Validação DICOM e conversão em paralelo (CPU-bound), à medida
+        # que cada download termina
+        logger.info("[2/5] VALIDAÇÃO e [3/5] CONVERSÃO - À medida que os downloads terminam")
         validated_files = self._validate_stage(downloaded_files)
-        
-        # Conversão em paralelo (CPU-bound)
-        logger.info("[3/5] CONVERSÃO - Convertendo para NIfTI")
         converted_files = self._conversion_stage(validated_files)
         
         # Upload em paralelo (I/O-bound)
@@ -125,82 +260,196 @@ class BatchPipeline:
         self._cleanup_stage()
         
         self.stats['end_time'] = time.time()
+        self.stats['download_chunks'] = self.google_drive.download_chunk_sizer.to_dict()
+        self.stats['upload_chunks'] = self.google_drive.upload_chunk_sizer.to_dict()
         
         # Relatório final
         self._print_summary(results)
         
         return results
     
-    def _download_stage(self, tasks: List[ProcessingTask]) -> List[Dict]:
+    def _download_stage(self, tasks: Iterable[ProcessingTask]) -> Iterator[Dict]:
         """
         Estágio 1: Download de arquivos
         
         Uses: ThreadPoolExecutor (I/O-bound)
+        
+        Yields:
+            Cada arquivo baixado, assim que termina
         """
         ensure_directory(self.config.TEMP_DIR)
         
-        downloaded = []
+        downloaded = 0
+        
+        def download(task: ProcessingTask) -> Optional[Dict]:
+            # Usar nome do arquivo original, sem forçar .dcm
+            # (arquivos DICOM podem não ter extensão)
+            slot = self._reserve_staging(task)
+            try:
+                result = self._download_file(task.file_id, slot / task.file_name)
+            except Exception:
+                self.staging.release(slot)
+                raise
+            result['staging_slot'] = slot
+            return result
         
         with ThreadPoolExecutor(max_workers=self.config.MAX_WORKERS_DOWNLOAD) as executor:
-            futures = {}
-            
-            for task in tasks:
-                # Usar nome do arquivo original, sem forçar .dcm
-                # (arquivos DICOM podem não ter extensão)
-                output_path = self.config.TEMP_DIR / task.file_name
-                futures[executor.submit(
-                    self._download_file,
-                    task.file_id,
-                    output_path
-                )] = task
-            
-            for future in as_completed(futures):
-                task = futures[future]
+            for task, future in _bounded_submit(
+                executor,
+                download,
+                self._count_tasks(tasks),
+                max_pending=self.config.MAX_WORKERS_DOWNLOAD * 2
+            ):
                 try:
                     result = future.result()
-                    if result:
-                        downloaded.append(result)
-                        logger.info(f"✓ Download: {task.file_name}")
                 except Exception as e:
                     logger.error(f"✗ Download falhou: {task.file_name} - {e}")
+                    continue
+                if result:
+                    downloaded += 1
+                    logger.info(f"✓ Download: {task.file_name}")
+                    yield result
         
-        logger.info(f"Download concluído: {len(downloaded)}/{len(tasks)}")
-        return downloaded
+        logger.info(f"Download concluído: {downloaded}/{self.stats['total']}")
+    
+    def _reserve_staging(self, task: ProcessingTask, size_mb: Optional[float] = None) -> Path:
+        """Reservar diretório de trabalho da tarefa (RAM ou disco)"""
+        if size_mb is None:
+            size_mb = task.size_mb or self._study_size_mb(task)
+        size_bytes = int(size_mb * 1024 * 1024 * STAGING_SIZE_FACTOR)
+        return self.staging.reserve(task.file_name, size_bytes)
+    
+    def _study_size_mb(self, task: ProcessingTask) -> float:
+        """
+        Tamanho do estudo pelo manifesto, montado sob demanda
+        
+        Chamado pouco antes de o estudo entrar no download (no pool de
+        descoberta, alguns estudos à frente): só os estudos que de fato vão
+        baixar são listados, uma única vez (o DownloadScheduler reaproveita
+        study_info['manifest']).
+        """
+        study_info = task.study_info
+        if not study_info:
+            return 0
+        if 'manifest' not in study_info:
+            try:
+                study_info['manifest'] = self.google_drive.build_study_manifest(study_info)
+            except Exception as e:
+                # O escalonador tenta de novo e, se falhar, reporta o estudo
+                logger.warning(f"Manifesto indisponível para {study_info['name']}: {e}")
+                return 0
+        return study_info['manifest'].size_mb
     
-    def _download_study_stage_for_tasks(self, tasks: List[ProcessingTask]) -> List[Dict]:
+    def _count_tasks(self, tasks: Iterable[ProcessingTask]) -> Iterator[ProcessingTask]:
+        """Contabilizar tarefas em stats['total'] à medida que são consumidas"""
+        for task in tasks:
+            self.stats['total'] += 1
+            yield task
+    
+    def _download_study_stage_for_tasks(self, tasks: Iterable[ProcessingTask]) -> Iterator[Dict]:
         """
         Estágio 1 (adaptado): Download de estudos DICOM a partir de ProcessingTasks
+        
+        Todos os arquivos de todos os estudos passam por um único
+        DownloadScheduler (vagas divididas por bytes entre os estudos ativos,
+        total de requisições limitado) ou, com Config.ASYNC_DOWNLOADS, pelo
+        AsyncStudyDownloader; cada estudo é entregue assim que termina.
+        
+        Os manifestos dos próximos Config.MAX_WORKERS_DISCOVERY estudos são
+        montados em paralelo, enquanto os estudos admitidos baixam; a
+        listagem não bloqueia a admissão.
+        
+        Estudos incompletos mantêm o diretório e voltam em uma nova passada
+        (até Config.STUDY_RETRIES): o ledger já registra os arquivos baixados,
+        então só os que faltam são buscados.
+        
+        Yields:
+            Cada estudo completo, assim que seu último arquivo termina
         """
         ensure_directory(self.config.TEMP_DIR)
         
-        downloaded = []
+        downloaded = 0
+        tasks_by_study = {}
         
-        with ThreadPoolExecutor(max_workers=self.config.MAX_WORKERS_DOWNLOAD) as executor:
-            futures = {}
+        def study_size_mb(task: ProcessingTask) -> float:
+            return task.size_mb or self._study_size_mb(task)
+        
+        def study_jobs() -> Iterator[Tuple[Dict, Path]]:
+            study_tasks = (task for task in self._count_tasks(tasks) if task.study_info)
+            workers = self.config.MAX_WORKERS_DISCOVERY
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='manifest') as executor:
+                try:
+                    for task, future in _prefetched(executor, study_size_mb, study_tasks, workers):
+                        slot = self._reserve_staging(task, future.result())
+                        tasks_by_study[task.study_info['id']] = (task, slot)
+                        yield task.study_info, slot / Path(task.file_name).name
+                finally:
+                    # Consumidor parou: não listar estudos que não vão baixar
+                    executor.shutdown(wait=False, cancel_futures=True)
+        
+        jobs = study_jobs()
+        for attempt in range(self.config.STUDY_RETRIES + 1):
+            incomplete = []
             
-            for task in tasks:
-                if not task.study_info:
+            for study_info, study_dir, stats in self._download_scheduler().run(jobs):
+                self.stats['bytes_downloaded'] += stats.bytes_downloaded
+                self.stats['bytes_from_cache'] += stats.bytes_from_cache
+                
+                if not stats.complete:
+                    # Série incompleta geraria NIfTI incorreto: não converter
+                    task, slot = tasks_by_study[study_info['id']]
+                    reason = stats.error or f"{stats.files_failed}/{stats.files_total} arquivos com erro"
+                    if attempt < self.config.STUDY_RETRIES:
+                        logger.warning(f"Download incompleto: {task.file_name} - {reason} (nova passada)")
+                        incomplete.append((study_info, study_dir))
+                    else:
+                        logger.error(f"✗ Download Study falhou: {task.file_name} - {reason}")
+                        tasks_by_study.pop(study_info['id'])
+                        self._discard_incomplete_study(study_info, slot)
                     continue
-                    
-                output_dir = self.config.TEMP_DIR / task.file_name
-                futures[executor.submit(
-                    self._download_study,
-                    task.study_info,
-                    output_dir
-                )] = task
+                
+                task, slot = tasks_by_study.pop(study_info['id'])
+                downloaded += 1
+                logger.info(
+                    f"✓ Download Study: {task.file_name} ({stats.files_downloaded} arquivos, "
+                    f"{stats.bytes_downloaded / (1024 * 1024):.1f} MB, {stats.throughput_mb_s:.1f} MB/s)"
+                )
+                yield {
+                    'file_id': study_info['id'],
+                    'local_path': study_dir,
+                    'status': ProcessingStatus.DOWNLOADING,
+                    'study_info': study_info,
+                    'download_stats': stats.to_dict(),
+                    'staging_slot': slot
+                }
             
-            for future in as_completed(futures):
-                task = futures[future]
-                try:
-                    result = future.result()
-                    if result:
-                        downloaded.append(result)
-                        logger.info(f"✓ Download Study: {task.file_name}")
-                except Exception as e:
-                    logger.error(f"✗ Download Study falhou: {task.file_name} - {e}")
+            if not incomplete:
+                break
+            jobs = incomplete
         
-        logger.info(f"Download de estudos concluído: {len(downloaded)}/{len(tasks)}")
-        return downloaded
+        logger.info(f"Download de estudos concluído: {downloaded}/{self.stats['total']}")
+    
+    def _discard_incomplete_study(self, study_info: Dict, slot: Path) -> None:
+        """
+        Descartar estudo que não completou o download após as novas passadas
+        
+        Com PERSIST_LEDGER, o diretório é mantido em disco (a reserva em RAM
+        volta ao orçamento): a próxima execução o reaproveita e baixa só os
+        arquivos que faltam. Senão, o diretório é removido junto com os
+        registros de download do ledger.
+        """
+        if self.config.PERSIST_LEDGER:
+            kept = self.staging.persist(slot)
+            logger.info(f"Mantendo {kept} para a próxima execução (ledger persistente)")
+            return
+        self.staging.release(slot)
+        self.ledger.clear(study_info['id'], 'download')
+    
+    def _download_scheduler(self):
+        """DownloadScheduler (threads) ou driver asyncio (Config.ASYNC_DOWNLOADS)"""
+        if self.config.ASYNC_DOWNLOADS:
+            return AsyncStudyDownloader.from_client(self.google_drive, ledger=self.ledger)
+        return DownloadScheduler(self.google_drive, ledger=self.ledger)
     
     def _download_study_stage(self, tasks: List[ProcessingTask], study_infos: List[Dict]) -> List[Dict]:
         """
@@ -261,14 +510,15 @@ class BatchPipeline:
             study_path = self.google_drive.download_study(
                 study_info,
                 output_dir.parent,
-                chunk_size_mb=50
+                ledger=self.ledger
             )
             
             if study_path:
                 return {
                     'file_id': study_info['id'],
                     'local_path': study_path,
-                    'status': ProcessingStatus.DOWNLOADING
+                    'status': ProcessingStatus.DOWNLOADING,
+                    'study_info': study_info
                 }
             else:
                 raise Exception("Falha no download do estudo")
@@ -276,45 +526,61 @@ class BatchPipeline:
             logger.error(f"Download de estudo falhou: {e}")
             raise
     
-    def _validate_stage(self, downloaded: List[Dict]) -> List[Dict]:
+    def _validate_stage(self, downloaded: Iterable[Dict]) -> Iterator[Dict]:
         """
         Estágio 2: Validação de arquivos DICOM
+        
+        Yields:
+            Itens válidos, à medida que chegam do download
         """
-        validated = []
+        received = 0
+        validated = 0
         
         for item in downloaded:
+            received += 1
             try:
                 local_path = Path(item['local_path'])
                 
                 if self.validator.validate_dicom_file(local_path):
-                    validated.append(item)
+                    validated += 1
                     logger.debug(f"✓ DICOM válido: {local_path.name}")
+                    yield item
                 else:
                     logger.warning(f"✗ DICOM inválido: {local_path.name}")
                     self.stats['skipped'] += 1
+                    self._release_staging(item)
             
             except Exception as e:
                 logger.error(f"Erro na validação: {e}")
                 self.stats['failed'] += 1
+                self._release_staging(item)
         
-        logger.info(f"Validação concluída: {len(validated)}/{len(downloaded)}")
-        return validated
+        logger.info(f"Validação concluída: {validated}/{received}")
     
-    def _conversion_stage(self, validated: List[Dict]) -> List[Dict]:
+    def _conversion_stage(self, validated: Iterable[Dict]) -> List[Dict]:
         """
         Estágio 3: Conversão DICOM → NIfTI
         
-        Uses: ProcessPoolExecutor (CPU-bound)
+        Cada item é submetido assim que chega (com um gerador, enquanto os
+        downloads seguintes continuam).
+        
+        Uses: ProcessPoolExecutor (CPU-bound; forkserver, pois há threads
+        de download ativas ao criar os processos)
         """
         converted = []
         
-        with ProcessPoolExecutor(max_workers=self.config.MAX_WORKERS_PROCESS) as executor:
+        with ProcessPoolExecutor(
+            max_workers=self.config.MAX_WORKERS_PROCESS,
+            mp_context=_process_pool_context()
+        ) as executor:
             futures = {}
             
             for item in validated:
                 futures[executor.submit(
-                    self._convert_file,
-                    item['local_path']
+                    _convert_file,
+                    self.converter,
+                    item['local_path'],
+                    self.config.TIMEOUT_CONVERSION_SECONDS
                 )] = item
             
             for future in as_completed(futures):
@@ -322,124 +588,204 @@ class BatchPipeline:
                 try:
                     result = future.result()
                     if result:
+                        # Estudo de origem define a pasta de saída no upload
+                        result['study_info'] = item.get('study_info')
+                        result['staging_slot'] = item.get('staging_slot')
                         converted.append(result)
                 except Exception as e:
                     logger.error(f"Conversão falhou: {item['file_id']} - {e}")
                     self.stats['failed'] += 1
+                    self._release_staging(item)
         
-        logger.info(f"Conversão concluída: {len(converted)}/{len(validated)}")
+        logger.info(f"Conversão concluída: {len(converted)}/{len(futures)}")
         return converted
     
-    def _convert_file(self, local_path: Path) -> Optional[Dict]:
-        """Conversão individual"""
-        try:
-            local_path = Path(local_path)
-            output_dir = local_path.parent / f"{local_path.stem}_nifti"
-            
-            result = self.converter.convert(
-                str(local_path),
-                str(output_dir),
-                timeout_seconds=self.config.TIMEOUT_CONVERSION_SECONDS
-            )
-            
-            if result['status'] == 'success':
-                return {
-                    'local_path': local_path,
-                    'output_dir': output_dir,
-                    'output_files': result['files'],
-                    'status': ProcessingStatus.CONVERTING
-                }
-            else:
-                raise Exception(result.get('error', 'Conversão falhou'))
-        
-        except Exception as e:
-            logger.error(f"Erro na conversão: {e}")
-            raise
-    
     def _upload_stage(self, converted: List[Dict]) -> List[ProcessingResult]:
         """
         Estágio 4: Upload de resultados
         
+        Cada arquivo de saída (NIfTI, JSON) é um item de trabalho no pool de
+        upload; um resultado de conversão é concluído quando todos os seus
+        arquivos terminam. Arquivos de estudos são registrados no ledger à
+        medida que sobem, então um novo processamento do estudo envia apenas
+        os que faltaram.
+        
         Uses: ThreadPoolExecutor (I/O-bound)
         """
         results = []
+        if not converted:
+            return results
         
         with ThreadPoolExecutor(max_workers=self.config.MAX_WORKERS_UPLOAD) as executor:
+            try:
+                folder_ids = self._prepare_output_folders(converted, executor)
+            except Exception as e:
+                logger.error(f"Upload falhou: pastas de saída indisponíveis - {e}")
+                self.stats['failed'] += len(converted)
+                for item in converted:
+                    self._release_staging(item)
+                return results
+            
             futures = {}
+            pending = {}
+            errors = {}
             
-            for item in converted:
-                futures[executor.submit(
-                    self._upload_file,
-                    item
-                )] = item
+            for index, item in enumerate(converted):
+                folder_id = folder_ids[self._output_subpath(item)]
+                scope = self._ledger_scope(item)
+                uploaded = self.ledger.done_items(scope, 'upload') if scope else {}
+                
+                pending[index] = 0
+                for file_path in self._output_files(item):
+                    key = self._upload_key(item, file_path) if scope else None
+                    if key in uploaded:
+                        continue
+                    pending[index] += 1
+                    futures[executor.submit(
+                        self._upload_output_file,
+                        file_path,
+                        folder_id
+                    )] = (index, file_path, key)
+            
+            # Resultados sem arquivos pendentes não têm o que esperar
+            finished = [index for index, count in pending.items() if count == 0]
             
             for future in as_completed(futures):
+                index, file_path, key = futures[future]
                 try:
-                    result = future.result()
-                    if result:
-                        results.append(result)
-                        self.stats['completed'] += 1
+                    file_id = future.result()
+                    scope = self._ledger_scope(converted[index])
+                    if scope:
+                        self.ledger.mark_done(scope, 'upload', key, file_id or '')
                 except Exception as e:
-                    logger.error(f"Upload falhou: {e}")
+                    logger.error(f"Upload falhou: {Path(file_path).name} - {e}")
+                    errors.setdefault(index, e)
+                
+                pending[index] -= 1
+                if pending[index] == 0:
+                    finished.append(index)
+            
+            for index in finished:
+                # Upload concluído ou falho: devolver o diretório de trabalho
+                self._release_staging(converted[index])
+                if index in errors:
                     self.stats['failed'] += 1
-        
-        logger.info(f"Upload concluído: {len(results)} arquivos")
+                    continue
+                # Estudo completo: o ledger não é mais necessário
+                scope = self._ledger_scope(converted[index])
+                if scope:
+                    self.ledger.clear(scope)
+                results.append(self._make_result(converted[index]))
+                self.stats['completed'] += 1
+        
+        logger.info(f"Upload concluído: {len(results)} resultados, {len(futures)} arquivos")
         return results
     
-    @retry_with_backoff(max_retries=3)
-    def _upload_file(self, item: Dict) -> Optional[ProcessingResult]:
-        """Upload individual com retry"""
+    def _release_staging(self, item: Dict) -> None:
+        """Liberar o diretório de trabalho do item (e sua reserva em RAM)"""
+        slot = item.get('staging_slot')
+        if slot is not None:
+            self.staging.release(slot)
+    
+    @staticmethod
+    def _ledger_scope(item: Dict) -> Optional[str]:
+        """Escopo do item no ledger (ID do estudo; None para arquivos avulsos)"""
+        study_info = item.get('study_info')
+        return study_info['id'] if study_info else None
+    
+    @staticmethod
+    def _upload_key(item: Dict, file_path: Path) -> str:
+        """Chave do arquivo de saída no ledger (caminho relativo + tamanho)"""
+        file_path = Path(file_path)
         try:
-            output_files = item['output_files']
-            
-            # Upload NIfTI
-            if 'nifti' in output_files:
-                for nifti_file in output_files['nifti']:
-                    self.google_drive.upload_file(
-                        nifti_file,
-                        self._get_output_folder_id()
-                    )
-            
-            # Upload JSON
-            if 'json' in output_files:
-                for json_file in output_files['json']:
-                    self.google_drive.upload_file(
-                        json_file,
-                        self._get_output_folder_id()
-                    )
-            
-            return ProcessingResult(
-                file_id=str(item['local_path']),
-                patient_id='unknown',
-                status=ProcessingStatus.COMPLETED,
-                input_path=str(item['local_path']),
-                output_path=str(item['output_dir']),
-                error=None,
-                duration_seconds=0
-            )
-        
-        except Exception as e:
-            logger.error(f"Erro no upload: {e}")
-            raise
+            relative = file_path.relative_to(item['output_dir'])
+        except ValueError:
+            relative = file_path.name
+        return f"{relative}:{file_path.stat().st_size}"
+    
+    @staticmethod
+    def _output_files(item: Dict) -> List[Path]:
+        """Arquivos de saída da conversão (NIfTI primeiro, depois JSON)"""
+        output_files = item['output_files']
+        return list(output_files.get('nifti', [])) + list(output_files.get('json', []))
+    
+    @retry_with_backoff(max_retries=3)
+    def _upload_output_file(self, file_path: Path, folder_id: str) -> str:
+        """Upload de um arquivo de saída com retry"""
+        return self.google_drive.upload_file(
+            file_path,
+            folder_id,
+            skip_existing=self.config.UPLOAD_SKIP_EXISTING
+        )
+    
+    @staticmethod
+    def _make_result(item: Dict) -> ProcessingResult:
+        """Resultado de um item com todos os arquivos enviados"""
+        return ProcessingResult(
+            file_id=str(item['local_path']),
+            patient_id='unknown',
+            status=ProcessingStatus.COMPLETED,
+            input_path=str(item['local_path']),
+            output_path=str(item['output_dir']),
+            error=None,
+            duration_seconds=0
+        )
     
     def _cleanup_stage(self):
-        """Estágio 5: Limpeza de arquivos temporários"""
+        """Estágio 5: Limpeza de arquivos temporários (reservas restantes)"""
         try:
+            self.staging.release_all()
             removed = clean_temp_directory(self.config.TEMP_DIR)
             logger.info(f"✓ Limpeza concluída: {removed} arquivos removidos")
         except Exception as e:
             logger.warning(f"Erro na limpeza: {e}")
     
+    @staticmethod
+    def _output_subpath(item: Dict) -> str:
+        """Subpasta de saída do item: "AAA/estudo" (vazio = raiz do output)"""
+        study_info = item.get('study_info')
+        return study_info['name'] if study_info else ''
+    
+    def _prepare_output_folders(
+        self,
+        converted: List[Dict],
+        executor: ThreadPoolExecutor
+    ) -> Dict[str, str]:
+        """
+        Resolver/criar as pastas de saída de todos os itens antes dos uploads
+        
+        Cada subpasta distinta é resolvida uma vez, em paralelo; pastas AAA
+        compartilhadas são criadas uma única vez (single-flight no cache de
+        pastas do cliente).
+        
+        Returns:
+            Subcaminho → ID da pasta
+        """
+        root_id = self._get_output_folder_id()
+        subpaths = {self._output_subpath(item) for item in converted}
+        
+        folder_ids = {'': root_id}
+        nested = sorted(subpaths - {''})
+        for subpath, folder_id in zip(nested, executor.map(
+            lambda subpath: self.google_drive.ensure_folder_path(root_id, subpath),
+            nested
+        )):
+            folder_ids[subpath] = folder_id
+        
+        if nested:
+            logger.info(f"✓ Pastas de saída prontas: {len(nested)}")
+        return folder_ids
+    
     def _get_output_folder_id(self) -> str:
-        """Obter ID da pasta de output"""
-        # TODO: Implementar caching de folder_id
-        folders = self.google_drive.list_files(
-            folder_name=self.config.GOOGLE_DRIVE_OUTPUT_FOLDER,
-            max_results=1
+        """Obter ID da pasta de output (resolvido via cache de pastas do cliente)"""
+        folder_id = self.google_drive.resolve_folder_id(
+            self.config.GOOGLE_DRIVE_OUTPUT_FOLDER
+        )
+        if folder_id:
+            return folder_id
+        raise GoogleDriveError(
+            f"Pasta de output não encontrada: {self.config.GOOGLE_DRIVE_OUTPUT_FOLDER}"
         )
-        if folders:
-            return folders[0]['id']
-        raise Exception("Pasta de output não encontrada")
     
     def _print_summary(self, results: List[ProcessingResult]):
         """Imprimir resumo de execução"""
@@ -453,5 +799,26 @@ class BatchPipeline:
         logger.info(f"Completadas: {self.stats['completed']}")
         logger.info(f"Falhadas: {self.stats['failed']}")
         logger.info(f"Ignoradas: {self.stats['skipped']}")
+        if self.stats['bytes_downloaded']:
+            downloaded_mb = self.stats['bytes_downloaded'] / (1024 * 1024)
+            logger.info(f"Baixado: {downloaded_mb:.1f} MB ({downloaded_mb / max(elapsed, 1e-6):.1f} MB/s)")
+        if self.stats['bytes_from_cache']:
+            logger.info(f"Do cache local: {self.stats['bytes_from_cache'] / (1024 * 1024):.1f} MB")
+        for label, key in (('download', 'download_chunks'), ('upload', 'upload_chunks')):
+            chunks = self.stats.get(key)
+            if chunks and chunks['requests']:
+                logger.info(
+                    f"Chunks de {label}: {chunks['chunk_mb']:.1f} MB "
+                    f"(faixa {chunks['min_chunk_mb']:.1f}-{chunks['max_chunk_mb']:.1f} MB, "
+                    f"{chunks['throughput_mb_s']:.1f} MB/s por requisição, "
+                    f"{chunks['latency_ms']:.0f} ms, {chunks['requests']} requisições)"
+                )
+        if self.google_drive.uploads_skipped:
+            logger.info(f"Uploads ignorados (já no destino): {self.google_drive.uploads_skipped}")
+        if self.staging.ram_placements:
+            logger.info(
+                f"Staging: {self.staging.ram_placements} em RAM, "
+                f"{self.staging.disk_placements} em disco"
+            )
         logger.info(f"Tempo total: {elapsed:.2f}s ({elapsed/60:.2f} min)")
         logger.info("=" * 60)
@@ -7,8 +7,11 @@ from .file_utils import (
     get_file_size_mb,
     ensure_directory,
     clean_temp_directory,
+    HashingReader,
 )
 from .retry import retry_with_backoff, CircuitBreaker
+from .staging import StagingArea
+from .ledger import TransferLedger
 
 __all__ = [
     'calculate_checksum',
@@ -16,6 +19,9 @@ __all__ = [
     'get_file_size_mb',
     'ensure_directory',
     'clean_temp_directory',
+    'HashingReader',
     'retry_with_backoff',
     'CircuitBreaker',
+    'StagingArea',
+    'TransferLedger',
 ]
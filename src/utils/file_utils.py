@@ -37,6 +37,53 @@ def calculate_checksum(file_path: Path, algorithm: str = 'md5') -> str:
         raise
 
 
+class HashingReader:
+    """
+    Leitor de arquivo que calcula o checksum dos bytes à medida que são lidos
+    
+    Usado como fonte de upload: o hash sai da mesma leitura que envia os
+    dados, sem uma segunda passada pelo arquivo. Releituras (retry de um
+    chunk) não são contadas duas vezes; se a leitura pular um trecho, o
+    hash fica indisponível.
+    """
+    
+    def __init__(self, fh, algorithm: str = 'md5'):
+        """
+        Inicializar leitor
+        
+        Args:
+            fh: Arquivo aberto em modo binário
+            algorithm: Algoritmo de hashlib
+        """
+        self._fh = fh
+        self._hasher = hashlib.new(algorithm)
+        self.bytes_hashed = 0
+    
+    def read(self, size: int = -1) -> bytes:
+        position = self._fh.tell()
+        data = self._fh.read(size)
+        end = position + len(data)
+        if position <= self.bytes_hashed < end:
+            self._hasher.update(data[self.bytes_hashed - position:])
+            self.bytes_hashed = end
+        return data
+    
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._fh.seek(offset, whence)
+    
+    def tell(self) -> int:
+        return self._fh.tell()
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def hexdigest(self, total_size: int) -> Optional[str]:
+        """Checksum do conteúdo (None se nem todos os bytes foram lidos)"""
+        if self.bytes_hashed != total_size:
+            return None
+        return self._hasher.hexdigest()
+
+
 def validate_checksum(
     file_path: Path,
     expected_checksum: str,
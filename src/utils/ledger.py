@@ -0,0 +1,78 @@
+"""
+Registro por arquivo das transferências concluídas de cada estudo
+"""
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+from loguru import logger
+
+
+class TransferLedger:
+    """
+    Ledger de arquivos concluídos por estudo e fase ('download', 'upload')
+    
+    Cada arquivo transferido com sucesso é registrado assim que termina.
+    Um retry (ou uma nova execução) consulta o ledger e transfere apenas o
+    que falta; o estudo só é considerado completo quando todos os seus
+    arquivos estão registrados. O registro do estudo é apagado ao fim do
+    processamento.
+    """
+    
+    def __init__(self, path: Optional[Path] = None):
+        """
+        Inicializar ledger
+        
+        Args:
+            path: Arquivo SQLite (None = apenas memória)
+        """
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(path) if path else ':memory:',
+            check_same_thread=False
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ledger ("
+                "scope TEXT NOT NULL, phase TEXT NOT NULL, item TEXT NOT NULL, "
+                "value TEXT NOT NULL DEFAULT '', PRIMARY KEY (scope, phase, item))"
+            )
+    
+    def mark_done(self, scope: str, phase: str, item: str, value: str = '') -> None:
+        """
+        Registrar arquivo concluído
+        
+        Args:
+            scope: Estudo (ID no Drive)
+            phase: 'download' ou 'upload'
+            item: Chave do arquivo na fase
+            value: Dado associado (ex: ID do arquivo enviado)
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ledger (scope, phase, item, value) VALUES (?, ?, ?, ?)",
+                (scope, phase, item, value)
+            )
+    
+    def done_items(self, scope: str, phase: str) -> Dict[str, str]:
+        """Arquivos já concluídos do estudo na fase: chave → valor"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item, value FROM ledger WHERE scope = ? AND phase = ?",
+                (scope, phase)
+            ).fetchall()
+        return dict(rows)
+    
+    def clear(self, scope: str, phase: Optional[str] = None) -> None:
+        """Apagar o registro do estudo (uma fase ou todas)"""
+        with self._lock, self._conn:
+            if phase is None:
+                self._conn.execute("DELETE FROM ledger WHERE scope = ?", (scope,))
+            else:
+                self._conn.execute(
+                    "DELETE FROM ledger WHERE scope = ? AND phase = ?",
+                    (scope, phase)
+                )
+        logger.debug(f"Ledger limpo: {scope} ({phase or 'todas as fases'})")
@@ -0,0 +1,127 @@
+"""
+Área de staging em RAM (tmpfs) com orçamento de memória e fallback para disco
+"""
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+from loguru import logger
+
+
+class StagingArea:
+    """
+    Diretórios de trabalho por tarefa, em RAM quando couberem no orçamento
+    
+    Cada tarefa (arquivo ou estudo) recebe um diretório próprio onde ficam
+    o download e a saída da conversão. Se a reserva estimada couber no
+    orçamento (e no espaço livre do tmpfs), o diretório é criado em
+    `ram_dir` (ex: /dev/shm); senão, em `disk_dir`. Tarefas de tamanho
+    desconhecido vão para o disco. Estudos pequenos e médios nunca tocam o
+    armazenamento persistente.
+    
+    Cada reserva deve ser devolvida com `release()` assim que a tarefa
+    termina (ou falha), para que o orçamento atenda as tarefas seguintes.
+    Um diretório em disco que já existe (ex: estudo incompleto mantido
+    para o ledger por uma execução anterior) é reaproveitado.
+    """
+    
+    def __init__(
+        self,
+        disk_dir: Path,
+        ram_dir: Optional[Path] = None,
+        budget_mb: float = 0
+    ):
+        """
+        Inicializar staging
+        
+        Args:
+            disk_dir: Diretório em disco (fallback)
+            ram_dir: Diretório em tmpfs (None ou budget_mb=0 = apenas disco)
+            budget_mb: Orçamento de memória em MB
+        """
+        self.disk_dir = Path(disk_dir)
+        self.ram_dir = Path(ram_dir) if ram_dir and budget_mb > 0 else None
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        
+        if self.ram_dir is not None:
+            try:
+                self.ram_dir.mkdir(parents=True, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"Staging em RAM indisponível ({self.ram_dir}): {e}")
+                self.ram_dir = None
+        
+        self._reservations: Dict[Path, int] = {}
+        self._lock = threading.Lock()
+        
+        self.ram_used_bytes = 0
+        self.ram_placements = 0
+        self.disk_placements = 0
+    
+    def reserve(self, name: str, size_bytes: int) -> Path:
+        """
+        Reservar diretório de trabalho para uma tarefa
+        
+        Args:
+            name: Nome relativo da tarefa (ex: "AAA1/12")
+            size_bytes: Espaço estimado (download + saída da conversão);
+                0 = desconhecido
+        
+        Returns:
+            Diretório criado (em RAM ou em disco)
+        """
+        leftover = (self.disk_dir / name).is_dir()
+        with self._lock:
+            if not leftover and self._fits_in_ram(size_bytes):
+                slot = self.ram_dir / name
+                self._reservations[slot] = size_bytes
+                self.ram_used_bytes += size_bytes
+                self.ram_placements += 1
+            else:
+                slot = self.disk_dir / name
+                self.disk_placements += 1
+        
+        slot.mkdir(parents=True, exist_ok=True)
+        logger.debug(f"Staging: {name} → {slot} ({size_bytes / (1024 * 1024):.1f} MB)")
+        return slot
+    
+    def _fits_in_ram(self, size_bytes: int) -> bool:
+        if self.ram_dir is None or size_bytes <= 0:
+            return False
+        if self.ram_used_bytes + size_bytes > self.budget_bytes:
+            return False
+        return shutil.disk_usage(self.ram_dir).free > size_bytes
+    
+    def is_in_ram(self, path: Path) -> bool:
+        """Verificar se o caminho está na área em RAM"""
+        return self.ram_dir is not None and Path(path).is_relative_to(self.ram_dir)
+    
+    def persist(self, slot: Path) -> Path:
+        """
+        Manter o diretório além desta execução (movido da RAM para o disco)
+        
+        Returns:
+            Diretório em disco, reaproveitado pelo próximo `reserve()` do mesmo nome
+        """
+        slot = Path(slot)
+        if not self.is_in_ram(slot):
+            return slot
+        target = self.disk_dir / slot.relative_to(self.ram_dir)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.rmtree(target, ignore_errors=True)
+        shutil.move(str(slot), str(target))
+        self.release(slot)
+        return target
+    
+    def release(self, slot: Path) -> None:
+        """Remover diretório de trabalho e devolver a reserva ao orçamento"""
+        slot = Path(slot)
+        shutil.rmtree(slot, ignore_errors=True)
+        with self._lock:
+            self.ram_used_bytes -= self._reservations.pop(slot, 0)
+    
+    def release_all(self) -> None:
+        """Liberar todas as reservas em RAM"""
+        with self._lock:
+            slots = list(self._reservations)
+        for slot in slots:
+            self.release(slot)
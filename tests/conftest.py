@@ -25,3 +25,485 @@ warnings.filterwarnings("ignore", ".*asyncio.iscoroutinefunction.*", category=De
 warnings.filterwarnings("ignore", ".*asyncio.get_event_loop_policy.*", category=DeprecationWarning)
 warnings.filterwarnings("ignore", ".*pkg_resources.*", category=DeprecationWarning)
 warnings.filterwarnings("ignore", ".*declare_namespace.*", category=DeprecationWarning)
+
+
+# ==================== FAKE GOOGLE DRIVE ====================
+
+import re
+import threading
+from contextlib import contextmanager
+import pytest
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+
+class FakeRequest:
+    """Requisição fake com a mesma interface de googleapiclient.http.HttpRequest"""
+    
+    def __init__(self, handler):
+        self._handler = handler
+    
+    def execute(self, http=None, num_retries=0):
+        return self._handler()
+
+
+class FakeMediaRequest:
+    """Requisição get_media fake (execute direto ou via MediaIoBaseDownload)"""
+    
+    def __init__(self, drive, file_id):
+        self._drive = drive
+        self.file_id = file_id
+        self.uri = f"https://fake.drive/files/{file_id}?alt=media"
+        self.http = FakeHttp(drive)
+        self.headers = {}
+    
+    def execute(self, http=None, num_retries=0):
+        _, content = self._drive.serve_media(self.file_id, self.headers.get('range'))
+        return content
+
+
+class FakeResumableRequest:
+    """
+    files().create resumable fake (uri, method, body, headers e http)
+    
+    O protocolo (POST abre a sessão, PUTs com Content-Range) é servido
+    pelo FakeHttp; as sessões vivem em FakeDriveService.upload_sessions,
+    então uma nova requisição com a mesma URI continua de onde parou.
+    """
+    
+    def __init__(self, drive, body):
+        import json
+        self.uri = "https://fake.drive/upload/files?uploadType=resumable"
+        self.method = 'POST'
+        self.body = json.dumps(body)
+        self.headers = {'content-type': 'application/json'}
+        self.http = FakeHttp(drive)
+
+
+class FakeHttp:
+    """Transporte httplib2 fake para downloads de mídia e upload resumable"""
+    
+    def __init__(self, drive):
+        self._drive = drive
+    
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        import httplib2
+        headers = headers or {}
+        if '/upload/' in uri:
+            status, content = self._upload(uri, method, body, headers)
+            return httplib2.Response(status), content
+        
+        file_id = re.search(r'/files/([^?]+)', uri).group(1)
+        status, content = self._drive.serve_media(file_id, headers.get('range'))
+        return httplib2.Response(status), content
+    
+    def _upload(self, uri, method, body, headers):
+        import json
+        drive = self._drive
+        if method == 'POST':
+            session_uri = f"https://fake.drive/upload/session{len(drive.upload_sessions)}"
+            drive.upload_sessions[session_uri] = {'metadata': json.loads(body), 'data': b''}
+            return {'status': '200', 'location': session_uri}, b''
+        
+        session = drive.upload_sessions.get(uri)
+        if session is None:
+            return {'status': '404'}, b'session expired'
+        
+        content_range, total = headers['Content-Range'][len('bytes '):].split('/')
+        if content_range != '*':
+            if drive.fail_upload_after_chunks is not None:
+                if drive.fail_upload_after_chunks == 0:
+                    drive.fail_upload_after_chunks = None
+                    raise ConnectionError('conexão perdida')
+                drive.fail_upload_after_chunks -= 1
+            
+            assert int(content_range.split('-')[0]) == len(session['data'])
+            session['data'] += body
+            drive.bytes_uploaded += len(body)
+        
+        if len(session['data']) < int(total):
+            status = {'status': '308'}
+            if session['data']:
+                status['range'] = f"bytes=0-{len(session['data']) - 1}"
+            return status, b''
+        
+        del drive.upload_sessions[uri]
+        metadata = session['metadata']
+        node_id = drive.add_file(metadata['name'], metadata['parents'][0], session['data'])
+        return {'status': '200'}, json.dumps(
+            {'id': node_id, 'md5Checksum': drive.nodes[node_id]['md5Checksum']}
+        ).encode()
+
+
+class FakeFilesResource:
+    """Recurso files() fake"""
+    
+    def __init__(self, drive):
+        self._drive = drive
+    
+    def list(self, q='', pageSize=100, pageToken=None, fields=None, **kwargs):
+        return FakeRequest(lambda: self._drive.query(q, pageSize, pageToken))
+    
+    def get(self, fileId, fields=None, **kwargs):
+        return FakeRequest(lambda: dict(self._drive.nodes[fileId]))
+    
+    def get_media(self, fileId, **kwargs):
+        return FakeMediaRequest(self._drive, fileId)
+    
+    def create(self, body=None, media_body=None, fields=None, **kwargs):
+        if media_body is not None and media_body.resumable():
+            return FakeResumableRequest(self._drive, body)
+        return FakeRequest(lambda: self._drive.create(body, media_body))
+    
+    def delete(self, fileId, **kwargs):
+        return FakeRequest(lambda: self._drive.trash(fileId))
+
+
+class FakeBatchRequest:
+    """Batch HTTP fake (new_batch_http_request)"""
+    
+    def __init__(self, drive, callback):
+        self._drive = drive
+        self._callback = callback
+        self._requests = []
+    
+    def add(self, request, callback=None, request_id=None):
+        self._requests.append((request_id, request, callback or self._callback))
+    
+    def execute(self, http=None):
+        assert len(self._requests) <= 100
+        self._drive.batch_calls += 1
+        for request_id, request, callback in self._requests:
+            try:
+                response, exception = request.execute(), None
+            except Exception as e:
+                response, exception = None, e
+            callback(request_id, response, exception)
+
+
+class FakeChangesResource:
+    """Recurso changes() fake (page token = posição no log de mudanças)"""
+    
+    def __init__(self, drive):
+        self._drive = drive
+    
+    def getStartPageToken(self, **kwargs):
+        return FakeRequest(lambda: {'startPageToken': str(len(self._drive.change_log))})
+    
+    def list(self, pageToken, pageSize=100, **kwargs):
+        def handler():
+            self._drive.change_calls += 1
+            offset = int(pageToken)
+            log = self._drive.change_log
+            result = {'changes': log[offset:offset + pageSize]}
+            if offset + pageSize < len(log):
+                result['nextPageToken'] = str(offset + pageSize)
+            else:
+                result['newStartPageToken'] = str(len(log))
+            return result
+        return FakeRequest(handler)
+
+
+class FakeDriveService:
+    """
+    Serviço Drive v3 em memória para testes
+    
+    Entende o subconjunto de queries usado pelo cliente:
+    `'<id>' in parents`, `name='...'`, `mimeType='...'` e `mimeType!='...'`
+    """
+    
+    def __init__(self):
+        self.nodes = {}
+        self.change_log = []
+        self.list_calls = 0
+        self.change_calls = 0
+        self.create_calls = 0
+        self.upload_sessions = {}
+        self.bytes_uploaded = 0
+        self.fail_upload_after_chunks = None
+        self.batch_calls = 0
+        self.media_calls = 0
+        self.bytes_served = 0
+        self.media_delay = 0.0
+        self.active_media = 0
+        self.max_active_media = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+    
+    def serve_media(self, file_id, range_header=None):
+        """Servir conteúdo (parcial se houver header Range)"""
+        import time
+        with self._lock:
+            self.media_calls += 1
+            self.active_media += 1
+            self.max_active_media = max(self.max_active_media, self.active_media)
+        try:
+            time.sleep(self.media_delay)
+            content = self.nodes[file_id]['content']
+            total = len(content)
+            byte_range = re.match(r'bytes=(\d+)-(\d*)', range_header or '')
+            if not byte_range:
+                status, body = {'status': '200', 'content-length': str(total)}, content
+            else:
+                start = int(byte_range.group(1))
+                end = min(int(byte_range.group(2)) + 1 if byte_range.group(2) else total, total)
+                body = content[start:end]
+                status = {'status': '206', 'content-range': f"bytes {start}-{end - 1}/{total}"}
+                if start >= total:
+                    status = {'status': '416', 'content-range': f"bytes */{total}"}
+            with self._lock:
+                self.bytes_served += len(body)
+            return status, body
+        finally:
+            with self._lock:
+                self.active_media -= 1
+    
+    def _new_id(self) -> str:
+        self._next_id += 1
+        return f"id{self._next_id:05d}"
+    
+    def _record_change(self, node_id, removed=False):
+        change = {'fileId': node_id, 'removed': removed}
+        if not removed:
+            change['file'] = {k: v for k, v in self.nodes[node_id].items() if k != 'content'}
+        self.change_log.append(change)
+    
+    def trash(self, node_id):
+        self.nodes[node_id]['trashed'] = True
+        self._record_change(node_id)
+    
+    def rename(self, node_id, name):
+        self.nodes[node_id]['name'] = name
+        self._record_change(node_id)
+    
+    def add_folder(self, name, parent=None):
+        node_id = self._new_id()
+        self.nodes[node_id] = {
+            'id': node_id,
+            'name': name,
+            'mimeType': FOLDER_MIME_TYPE,
+            'parents': [parent] if parent else [],
+            'modifiedTime': '2024-01-01T00:00:00.000Z',
+        }
+        self._record_change(node_id)
+        return node_id
+    
+    def add_file(self, name, parent, content=b'', mime_type='application/octet-stream'):
+        import hashlib
+        node_id = self._new_id()
+        self.nodes[node_id] = {
+            'id': node_id,
+            'name': name,
+            'mimeType': mime_type,
+            'parents': [parent],
+            'size': str(len(content)),
+            'md5Checksum': hashlib.md5(content).hexdigest(),
+            'modifiedTime': '2024-01-01T00:00:00.000Z',
+            'content': content,
+        }
+        self._record_change(node_id)
+        return node_id
+    
+    def create(self, body, media_body=None):
+        """files.create: pasta ou upload simples/multipart (uma requisição)"""
+        with self._lock:
+            self.create_calls += 1
+            if media_body is None:
+                node_id = self.add_folder(body['name'], body['parents'][0])
+            else:
+                assert not media_body.resumable()
+                content = media_body.getbytes(0, media_body.size())
+                node_id = self.add_file(body['name'], body['parents'][0], content)
+        return {'id': node_id, 'md5Checksum': self.nodes[node_id].get('md5Checksum')}
+    
+    def query(self, q, page_size=100, page_token=None):
+        with self._lock:
+            self.list_calls += 1
+        
+        parent_ids = set(re.findall(r"'([^']+)' in parents", q))
+        name = re.search(r"name\s*=\s*'([^']*)'", q)
+        mime_eq = re.search(r"mimeType\s*=\s*'([^']+)'", q)
+        mime_ne = re.search(r"mimeType\s*!=\s*'([^']+)'", q)
+        
+        matches = []
+        for node in self.nodes.values():
+            if node.get('trashed'):
+                continue
+            if parent_ids and not parent_ids.intersection(node['parents']):
+                continue
+            if name and node['name'] != name.group(1):
+                continue
+            if mime_eq and node['mimeType'] != mime_eq.group(1):
+                continue
+            if mime_ne and node['mimeType'] == mime_ne.group(1):
+                continue
+            matches.append({k: v for k, v in node.items() if k != 'content'})
+        
+        offset = int(page_token or 0)
+        page = matches[offset:offset + page_size]
+        result = {'files': page}
+        if offset + page_size < len(matches):
+            result['nextPageToken'] = str(offset + page_size)
+        return result
+    
+    def files(self):
+        return FakeFilesResource(self)
+    
+    def changes(self):
+        return FakeChangesResource(self)
+    
+    def new_batch_http_request(self, callback=None):
+        return FakeBatchRequest(self, callback)
+
+
+def make_fake_drive_app(drive, latency=0.0):
+    """
+    Servidor HTTP fake (aiohttp.web) sobre o FakeDriveService
+    
+    Rotas: /drive/v3/files (list), /drive/v3/files/{id}?alt=media (Range)
+    e /upload/drive/v3/files (multipart e resumable, com sessões em
+    /upload/drive/v3/sessions/{id}). Downloads aguardam `latency` segundos
+    sem bloquear o loop; app['concurrency']['max_active'] registra o pico de
+    downloads simultâneos. app['faults']['chunks'] faz os próximos PUTs de chunk
+    gravarem só metade do conteúdo e responderem 503.
+    """
+    import asyncio
+    import json
+    from aiohttp import web
+    
+    async def list_files(request):
+        q = request.query.get('q', '')
+        return web.json_response(drive.query(
+            q, int(request.query.get('pageSize', 100)), request.query.get('pageToken')
+        ))
+    
+    async def get_media(request):
+        file_id = request.match_info['file_id']
+        if file_id not in drive.nodes:
+            return web.json_response({'error': 'not found'}, status=404)
+        
+        concurrency['active'] += 1
+        concurrency['max_active'] = max(concurrency['max_active'], concurrency['active'])
+        await asyncio.sleep(latency)
+        concurrency['active'] -= 1
+        
+        status, body = drive.serve_media(file_id, request.headers.get('Range'))
+        headers = {k: v for k, v in status.items() if k == 'content-range'}
+        return web.Response(body=body, status=int(status['status']), headers=headers)
+    
+    async def upload(request):
+        if request.query.get('uploadType') == 'resumable':
+            session_id = str(len(sessions))
+            sessions[session_id] = {
+                'metadata': await request.json(),
+                'data': bytearray(),
+                'size': int(request.headers['X-Upload-Content-Length']),
+            }
+            location = request.url.with_path(f'/upload/drive/v3/sessions/{session_id}').with_query(None)
+            return web.Response(headers={'Location': str(location)})
+        
+        reader = await request.multipart()
+        metadata = json.loads(await (await reader.next()).read())
+        content = bytes(await (await reader.next()).read())
+        file_id = drive.add_file(metadata['name'], metadata['parents'][0], content)
+        return web.json_response({'id': file_id, 'md5Checksum': drive.nodes[file_id]['md5Checksum']})
+    
+    async def upload_chunk(request):
+        session = sessions[request.match_info['session_id']]
+        data = session['data']
+        content_range = request.headers['Content-Range'].split(' ')[1]
+        
+        if not content_range.startswith('*'):
+            start = int(content_range.split('-')[0])
+            body = await request.read()
+            upload_puts.append(content_range)
+            if start != len(data):
+                return web.json_response({'error': 'bad offset'}, status=400)
+            if faults['chunks'] > 0:
+                faults['chunks'] -= 1
+                data.extend(body[:len(body) // 2])
+                return web.json_response({'error': 'backendError'}, status=503)
+            data.extend(body)
+        
+        if len(data) == session['size']:
+            metadata = session['metadata']
+            file_id = drive.add_file(metadata['name'], metadata['parents'][0], bytes(data))
+            return web.json_response({'id': file_id, 'md5Checksum': drive.nodes[file_id]['md5Checksum']})
+        headers = {'Range': f"bytes=0-{len(data) - 1}"} if data else {}
+        return web.Response(status=308, headers=headers)
+    
+    app = web.Application()
+    concurrency = app['concurrency'] = {'active': 0, 'max_active': 0}
+    sessions = {}
+    upload_puts = app['upload_puts'] = []
+    faults = app['faults'] = {'chunks': 0}
+    app.router.add_get('/drive/v3/files', list_files)
+    app.router.add_get('/drive/v3/files/{file_id}', get_media)
+    app.router.add_post('/upload/drive/v3/files', upload)
+    app.router.add_put('/upload/drive/v3/sessions/{session_id}', upload_chunk)
+    return app
+
+
+@contextmanager
+def serve_fake_drive_app(app):
+    """
+    Servir um app fake em um loop asyncio próprio (thread dedicada)
+    
+    Para clientes que rodam seu próprio loop (ex: AsyncStudyDownloader).
+    
+    Yields:
+        URL base do servidor
+    """
+    import asyncio
+    from aiohttp.test_utils import TestServer
+    
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = TestServer(app)
+    asyncio.run_coroutine_threadsafe(server.start_server(), loop).result()
+    try:
+        yield str(server.make_url('/'))
+    finally:
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+@pytest.fixture
+def fake_drive():
+    """Drive fake em memória"""
+    return FakeDriveService()
+
+
+@pytest.fixture
+def drive_client(fake_drive, monkeypatch, tmp_path):
+    """GoogleDriveClient conectado ao Drive fake (sem autenticação real)"""
+    from src.core.config import Config
+    from src.google_drive import client as client_module
+    
+    # Caches persistentes em tmp_path, nunca no ./cache do repositório
+    cache_dir = tmp_path / 'cache'
+    for name, file_name in (
+        ('CACHE_DIR', ''),
+        ('FOLDER_CACHE_PATH', 'folder_ids.json'),
+        ('DICOM_PROBE_CACHE_PATH', 'dicom_probes.sqlite3'),
+        ('DOWNLOAD_CACHE_DIR', 'downloads'),
+        ('METADATA_INDEX_PATH', 'drive_index.sqlite3'),
+        ('LEDGER_PATH', 'transfer_ledger.sqlite3'),
+        ('UPLOAD_SESSIONS_PATH', 'upload_sessions.sqlite3'),
+    ):
+        monkeypatch.setattr(Config, name, cache_dir / file_name)
+    
+    class _FakeAuth:
+        def __init__(self, *args, **kwargs):
+            pass
+        
+        def authenticate(self):
+            return None
+    
+    monkeypatch.setattr(client_module, 'GoogleDriveAuth', _FakeAuth)
+    monkeypatch.setattr(client_module, 'build', lambda *args, **kwargs: fake_drive)
+    
+    return client_module.GoogleDriveClient(rate_limit_rps=1000, discovery_workers=4)
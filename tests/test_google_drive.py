@@ -1,6 +1,11 @@
 """
 Testes para módulo Google Drive
 """
+import hashlib
+import json
+import os
+import threading
+import time
 import pytest
 from pathlib import Path
 
@@ -26,3 +31,1099 @@ def test_rate_limiter_context_manager():
     
     # Não deve gerar erro
     assert True
+
+
+def test_rate_limiter_burst_then_throttles():
+    """Rajada sai sem espera; depois a taxa é respeitada"""
+    limiter = RateLimiter(requests_per_second=20, burst=5)
+    
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.wait()
+    assert time.monotonic() - start < 0.05
+    
+    for _ in range(4):
+        limiter.wait()
+    assert time.monotonic() - start >= 0.15  # 4 requisições a 20/s
+
+
+def test_rate_limiter_shared_state_across_limiters(tmp_path):
+    """Limitadores com o mesmo arquivo de estado dividem a cota"""
+    state_path = tmp_path / 'rate.state'
+    limiters = [RateLimiter(20, burst=2, shared_state_path=state_path) for _ in range(2)]
+    
+    start = time.monotonic()
+    threads = [
+        threading.Thread(target=lambda l=l: [l.wait() for _ in range(4)])
+        for l in limiters
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    
+    # 8 requisições, 2 de rajada: 6 a 20/s no total, não por limitador
+    assert time.monotonic() - start >= 0.25
+
+
+DICOM_CONTENT = b'\x00' * 128 + b'DICM' + b'x' * 16
+
+
+def _build_tree(fake_drive, folders=3, subfolders=4, files_per_folder=30):
+    """Criar árvore raiz/AAA/estudo/arquivos no Drive fake"""
+    root = fake_drive.add_folder('DICOM')
+    for a in range(folders):
+        aaa = fake_drive.add_folder(f'AAA{a}', root)
+        for s in range(subfolders):
+            study = fake_drive.add_folder(str(s), aaa)
+            for f in range(files_per_folder):
+                fake_drive.add_file(f'IM{f:04d}', study, DICOM_CONTENT)
+    return root
+
+
+def test_list_files_recursive_concurrent(drive_client, fake_drive):
+    """Testar listagem recursiva concorrente (com paginação)"""
+    root = _build_tree(fake_drive, files_per_folder=150)
+    
+    files = drive_client.list_files(folder_id=root, recursive=True, max_results=10000)
+    
+    assert len(files) == 3 * 4 * 150
+    assert len({f['id'] for f in files}) == len(files)
+    assert all(f['mimeType'] != 'application/vnd.google-apps.folder' for f in files)
+
+
+def test_list_files_recursive_stops_at_max_results(drive_client, fake_drive):
+    """Testar parada antecipada ao atingir max_results"""
+    root = _build_tree(fake_drive, folders=5, subfolders=5, files_per_folder=30)
+    
+    files = drive_client.list_files(folder_id=root, recursive=True, max_results=40)
+    
+    assert len(files) == 40
+    # Não deve ter listado a árvore inteira (1 + 5 + 25 pastas)
+    assert fake_drive.list_calls < 31
+
+
+def test_crawler_retries_transient_errors_and_fails_on_permanent(drive_client, fake_drive, monkeypatch):
+    """Testar que páginas com erro são repetidas ou interrompem a varredura"""
+    import httplib2
+    from googleapiclient.errors import HttpError
+    from src.core.config import Config
+    from src.core.exceptions import GoogleDriveError
+    monkeypatch.setattr(Config, 'RETRY_BACKOFF_FACTOR', 0)
+    
+    root = _build_tree(fake_drive, folders=2, subfolders=2, files_per_folder=5)
+    query = fake_drive.query
+    failures = {'status': 503, 'left': 1}
+    
+    def flaky_query(q, *args, **kwargs):
+        if root not in q and failures['left']:
+            failures['left'] -= 1
+            raise HttpError(httplib2.Response({'status': failures['status']}), b'{}')
+        return query(q, *args, **kwargs)
+    monkeypatch.setattr(fake_drive, 'query', flaky_query)
+    
+    files = list(drive_client._crawl_folder_tree(root))
+    assert len(files) == 2 * 2 * 5
+    assert failures['left'] == 0
+    
+    # Erro permanente: sem listagem truncada silenciosa
+    failures.update(status=404, left=1)
+    with pytest.raises(GoogleDriveError):
+        list(drive_client._crawl_folder_tree(root))
+
+
+def test_metadata_index_incremental_refresh(drive_client, fake_drive, tmp_path):
+    """Testar índice local com atualização incremental via changes.list"""
+    from src.google_drive.metadata_index import DriveMetadataIndex
+    
+    root = _build_tree(fake_drive, folders=2, subfolders=2, files_per_folder=5)
+    index = DriveMetadataIndex(tmp_path / 'index.sqlite3')
+    drive_client.metadata_index = index
+    
+    files = drive_client.list_files(folder_id=root, max_results=1000)
+    assert len(files) == 20
+    assert all('md5Checksum' in f for f in files)
+    
+    # Segunda execução: nenhuma varredura, apenas o delta do changes.list
+    calls_after_build = fake_drive.list_calls
+    study = next(n for n in fake_drive.nodes.values() if n['name'] == '0')['id']
+    new_file = fake_drive.add_file('NEW', study, DICOM_CONTENT + b'new')
+    fake_drive.trash(files[0]['id'])
+    
+    refreshed = drive_client.list_files(folder_id=root, max_results=1000)
+    assert fake_drive.list_calls == calls_after_build
+    ids = {f['id'] for f in refreshed}
+    assert new_file in ids
+    assert files[0]['id'] not in ids
+    assert len(refreshed) == 20
+    
+    # Índice persiste entre instâncias
+    index.close()
+    reopened = DriveMetadataIndex(tmp_path / 'index.sqlite3')
+    assert reopened.has_root(root)
+    assert len(reopened.list_files(root)) == 20
+
+
+def test_metadata_index_failed_build_is_not_marked_built(drive_client, fake_drive, tmp_path, monkeypatch):
+    """Testar que um build interrompido não deixa a raiz indexada pela metade"""
+    import httplib2
+    from googleapiclient.errors import HttpError
+    from src.core.exceptions import GoogleDriveError
+    from src.google_drive.metadata_index import DriveMetadataIndex
+    
+    root = _build_tree(fake_drive, folders=2, subfolders=2, files_per_folder=5)
+    index = DriveMetadataIndex(tmp_path / 'index.sqlite3')
+    query = fake_drive.query
+    failures = {'left': 1}
+    
+    def failing_query(q, *args, **kwargs):
+        if root not in q and failures['left']:
+            failures['left'] -= 1
+            raise HttpError(httplib2.Response({'status': 404}), b'{}')
+        return query(q, *args, **kwargs)
+    monkeypatch.setattr(fake_drive, 'query', failing_query)
+    
+    with pytest.raises(GoogleDriveError):
+        index.sync(drive_client, root)
+    assert not index.has_root(root)
+    assert index.list_files(root) == []
+    
+    # Próximo sync refaz o build completo
+    index.sync(drive_client, root)
+    assert index.has_root(root)
+    assert len(index.list_files(root)) == 20
+
+
+def test_folder_cache_single_flight_and_ttl(tmp_path):
+    """Testar single-flight, TTL e persistência do cache de pastas"""
+    import threading
+    import time
+    from src.google_drive.folder_cache import FolderIdCache
+    
+    cache = FolderIdCache(ttl_hours=1, persist_path=tmp_path / 'folders.json')
+    calls = []
+    
+    def slow_resolver():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'folder-123'
+    
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_resolve('A/B', slow_resolver)))
+        for _ in range(10)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    
+    assert results == ['folder-123'] * 10
+    assert len(calls) == 1
+    
+    # Persistido entre instâncias; expirado com TTL zero
+    assert FolderIdCache(ttl_hours=1, persist_path=tmp_path / 'folders.json').get('A/B') == 'folder-123'
+    assert FolderIdCache(ttl_hours=0, persist_path=tmp_path / 'folders.json').get('A/B') is None
+
+
+def test_find_folder_by_path_uses_cache(drive_client, fake_drive):
+    """Testar que prefixos de caminho são resolvidos uma única vez"""
+    root = fake_drive.add_folder('Medicina')
+    exames = fake_drive.add_folder('Exames', root)
+    dicom = fake_drive.add_folder('DICOM', exames)
+    nifti = fake_drive.add_folder('NifTI', exames)
+    
+    assert drive_client.resolve_folder_id('Medicina/Exames/DICOM') == dicom
+    assert fake_drive.list_calls == 3
+    
+    assert drive_client.resolve_folder_id('Medicina/Exames/DICOM') == dicom
+    assert drive_client.resolve_folder_id('Medicina/Exames/NifTI') == nifti
+    assert fake_drive.list_calls == 4
+
+
+def _build_study_tree(fake_drive, aaa_folders=3, studies_per_aaa=150, with_dicom=True):
+    """Criar árvore DICOM/AAA*/<estudo>/DICOM/<série>/arquivos no Drive fake"""
+    root = fake_drive.add_folder('DICOM')
+    for a in range(aaa_folders):
+        aaa = fake_drive.add_folder(f'AAA{a + 1}', root)
+        for s in range(studies_per_aaa):
+            study = fake_drive.add_folder(str(s + 1), aaa)
+            if with_dicom:
+                dicom = fake_drive.add_folder('DICOM', study)
+                series = fake_drive.add_folder('S1', dicom)
+                fake_drive.add_file('IM0001', series, b'x' * 100)
+    return root
+
+
+def test_list_dicom_studies_batched(drive_client, fake_drive):
+    """Testar descoberta de estudos com batch HTTP (sem N+1 requisições)"""
+    root = _build_study_tree(fake_drive, aaa_folders=3, studies_per_aaa=40)
+    drive_client.folder_cache.set('DICOM', root)
+    
+    studies = drive_client.list_dicom_studies('DICOM', max_results=1000)
+    
+    assert len(studies) == 120
+    assert studies[0]['name'] == 'AAA1/1'
+    assert all(s['dicom_folder_id'] for s in studies)
+    # Um batch de verificação DICOM por pasta AAA (40 estudos cada)
+    assert fake_drive.batch_calls == 3
+
+
+def test_batch_retries_only_rate_limit_403(drive_client, fake_drive, monkeypatch):
+    """Testar retry de batch: 403 por limite de taxa sim, 403 de permissão não"""
+    import httplib2
+    from googleapiclient.errors import HttpError
+    from conftest import FakeRequest
+    from src.core.config import Config
+    monkeypatch.setattr(Config, 'RETRY_BACKOFF_FACTOR', 0)
+    
+    def http_403(reason):
+        content = json.dumps({'error': {'code': 403, 'errors': [{'reason': reason}]}}).encode()
+        return HttpError(httplib2.Response({'status': 403}), content)
+    
+    calls = {'throttled': 0, 'forbidden': 0}
+    def handler(name, reason):
+        def execute():
+            calls[name] += 1
+            if calls[name] == 1 or name == 'forbidden':
+                raise http_403(reason)
+            return {'id': name}
+        return FakeRequest(execute)
+    
+    responses = drive_client._execute_batch([
+        ('throttled', handler('throttled', 'userRateLimitExceeded')),
+        ('forbidden', handler('forbidden', 'insufficientFilePermissions')),
+    ])
+    
+    assert responses == {'throttled': {'id': 'throttled'}}
+    assert calls == {'throttled': 2, 'forbidden': 1}
+
+
+def test_list_children_multi_parent_query(drive_client, fake_drive):
+    """Testar listagem de várias pastas com uma única query OR"""
+    study = fake_drive.add_folder('DICOM')
+    series = [fake_drive.add_folder(f'S{i}', study) for i in range(150)]
+    for s in series:
+        fake_drive.add_file('IM0001', s, b'x')
+        fake_drive.add_file('IM0002', s, b'y')
+    
+    children = drive_client._list_children(series)
+    
+    assert set(children) == set(series)
+    assert all(len(items) == 2 for items in children.values())
+    # 150 pastas cabem em uma query; 300 itens em uma página de 1000
+    assert fake_drive.list_calls == 1
+
+
+def test_group_parent_ids_respects_query_length():
+    """Testar divisão de IDs respeitando o limite de tamanho da query"""
+    from src.google_drive.client import GoogleDriveClient, MAX_QUERY_LENGTH
+    
+    ids = [f'{i:033d}' for i in range(500)]
+    groups = GoogleDriveClient._group_parent_ids(ids)
+    
+    assert sum(len(g) for g in groups) == 500
+    assert all(
+        sum(len(pid) + len("'' in parents or ") for pid in g) <= MAX_QUERY_LENGTH
+        for g in groups
+    )
+    assert len(GoogleDriveClient._group_parent_ids(ids[:40], max_groups=8)) == 8
+
+
+def test_iter_files_streams_lazily(drive_client, fake_drive):
+    """Testar que iter_files entrega arquivos antes do fim da descoberta"""
+    root = _build_tree(fake_drive, folders=5, subfolders=5, files_per_folder=30)
+    
+    files = drive_client.iter_files(folder_id=root)
+    first = next(files)
+    calls_at_first_item = fake_drive.list_calls
+    files.close()
+    
+    assert first['name'].startswith('IM')
+    assert calls_at_first_item < 31
+    assert len(drive_client.list_files(folder_id=root, max_results=10000)) == 750
+
+
+def test_iter_studies_paginates_and_keeps_order(drive_client, fake_drive, monkeypatch):
+    """Testar paginação completa (>1 página de estudos por AAA) e ordem estável"""
+    from src.google_drive import client as client_module
+    monkeypatch.setattr(client_module, 'LIST_PAGE_SIZE', 50)
+    
+    root = _build_study_tree(fake_drive, aaa_folders=10, studies_per_aaa=120)
+    drive_client.folder_cache.set('DICOM', root)
+    
+    studies = list(drive_client.iter_studies('DICOM'))
+    
+    assert len(studies) == 10 * 120
+    assert [s['name'] for s in studies[:3]] == ['AAA1/1', 'AAA1/2', 'AAA1/3']
+    assert studies[120]['name'] == 'AAA2/1'
+    assert studies[-1]['name'] == 'AAA10/120'
+
+
+def test_remote_dicom_prefilter(drive_client, fake_drive, tmp_path):
+    """Testar pré-filtro DICOM por cabeçalho remoto (Range) com cache"""
+    from src.google_drive.dicom_prefilter import RemoteDicomPrefilter
+    
+    folder = fake_drive.add_folder('DICOM')
+    for i in range(5):
+        fake_drive.add_file(f'IM{i}', folder, DICOM_CONTENT + bytes([i]))
+    fake_drive.add_file('laudo.pdf', folder, b'%PDF-1.4' + b'x' * 10000)
+    fake_drive.add_file('tiny', folder, b'abc')
+    
+    drive_client._dicom_prefilter = RemoteDicomPrefilter(
+        drive_client, cache_path=tmp_path / 'probes.sqlite3', max_workers=2
+    )
+    
+    files = drive_client.list_files(folder_id=folder, filter_dicom=True)
+    
+    assert sorted(f['name'] for f in files) == [f'IM{i}' for i in range(5)]
+    # Apenas cabeçalhos foram baixados; arquivo pequeno rejeitado sem requisição
+    assert fake_drive.media_calls == 6
+    assert fake_drive.bytes_served == 6 * 132
+    
+    # Segunda listagem usa o cache (file id + md5)
+    drive_client.list_files(folder_id=folder, filter_dicom=True)
+    assert fake_drive.media_calls == 6
+
+
+def test_dicom_prefilter_keeps_file_when_probe_fails(drive_client, fake_drive, monkeypatch):
+    """Testar que timeout/erro de conexão na sondagem não interrompe a listagem"""
+    import socket
+    
+    folder = fake_drive.add_folder('DICOM')
+    flaky = fake_drive.add_file('IM0', folder, DICOM_CONTENT)
+    fake_drive.add_file('IM1', folder, DICOM_CONTENT + b'1')
+    fake_drive.add_file('laudo.pdf', folder, b'%PDF-1.4' + b'x' * 10000)
+    
+    serve_media = fake_drive.serve_media
+    def timeout_for_flaky(file_id, range_header=None):
+        if file_id == flaky:
+            raise socket.timeout('timed out')
+        return serve_media(file_id, range_header)
+    monkeypatch.setattr(fake_drive, 'serve_media', timeout_for_flaky)
+    
+    files = drive_client.list_files(folder_id=folder, filter_dicom=True)
+    
+    # Na dúvida o arquivo é mantido (a validação local decide)
+    assert sorted(f['name'] for f in files) == ['IM0', 'IM1']
+    # Sem filter_dicom não há sondagem
+    fake_drive.media_calls = 0
+    assert len(drive_client.list_files(folder_id=folder)) == 3
+    assert fake_drive.media_calls == 0
+
+
+def test_study_manifest_from_listing(drive_client, fake_drive):
+    """Testar manifesto do estudo (bytes, arquivos, séries) sem downloads"""
+    root = _build_study_tree(fake_drive, aaa_folders=1, studies_per_aaa=1)
+    dicom = next(n for n in fake_drive.nodes.values() if n['name'] == 'DICOM' and n['id'] != root)['id']
+    series = fake_drive.add_folder('S2', dicom)
+    for i in range(3):
+        fake_drive.add_file(f'IM{i}', series, b'y' * 1000)
+    fake_drive.add_file('laudo', dicom, mime_type='application/vnd.google-apps.document')
+    fake_drive.nodes[fake_drive.add_file('IM9', series, b'z' * 24)]['modifiedTime'] = '2025-01-01T00:00:00.000Z'
+    drive_client.folder_cache.set('DICOM', root)
+    
+    study = next(drive_client.iter_studies('DICOM', with_manifest=True))
+    manifest = study['manifest']
+    
+    assert manifest.file_count == 5
+    assert manifest.total_bytes == 100 + 3 * 1000 + 24
+    assert manifest.series_count == 2
+    assert manifest.newest_modified_time == '2025-01-01T00:00:00.000Z'
+    assert [f['relative_path'] for f in manifest.files][:2] == ['S1/IM0001', 'S2/IM0']
+    assert fake_drive.media_calls == 0
+
+
+def test_study_manifest_sanitizes_and_dedupes_names():
+    """Testar nomes do Drive com "/", ".." e repetidos na mesma pasta"""
+    from pathlib import PurePosixPath
+    from src.google_drive.study_manifest import StudyManifest, FOLDER_MIME_TYPE
+    
+    def node(node_id, name, parent, folder=False):
+        mime_type = FOLDER_MIME_TYPE if folder else 'application/dicom'
+        return {'id': node_id, 'name': name, 'parents': [parent], 'mimeType': mime_type, 'size': '1'}
+    
+    items = [
+        node('s1a', 'S1', 'root', folder=True),
+        node('s1b', 'S1', 'root', folder=True),
+        node('f1', 'IM1.dcm', 's1a'),
+        node('f2', 'IM1.dcm', 's1a'),
+        node('f3', 'IM1.dcm', 's1b'),
+        node('f4', '../../etc/passwd', 'root'),
+        node('f5', '..', 'root'),
+        node('f6', '/abs', 's1b'),
+    ]
+    
+    paths = [f['relative_path'] for f in StudyManifest.from_items('root', items).files]
+    
+    assert len(set(paths)) == len(paths) == 6
+    assert 'S1_s1a/IM1_f1.dcm' in paths and 'S1_s1a/IM1_f2.dcm' in paths
+    assert 'S1_s1b/IM1.dcm' in paths
+    for path in map(PurePosixPath, paths):
+        assert not path.is_absolute() and '..' not in path.parts
+        assert len(path.parts) <= 2
+
+
+def test_study_download_engine_parallel_paginated(drive_client, fake_drive, tmp_path, monkeypatch):
+    """Testar download paralelo do estudo com plano paginado completo"""
+    from src.google_drive import client as client_module
+    from src.google_drive.download_engine import StudyDownloadEngine
+    monkeypatch.setattr(client_module, 'LIST_PAGE_SIZE', 50)
+    
+    root = _build_study_tree(fake_drive, aaa_folders=1, studies_per_aaa=1)
+    dicom = next(n for n in fake_drive.nodes.values() if n['name'] == 'DICOM' and n['id'] != root)['id']
+    series = fake_drive.add_folder('S2', dicom)
+    for i in range(120):
+        fake_drive.add_file(f'IM{i:04d}', series, DICOM_CONTENT + bytes([i]))
+    drive_client.folder_cache.set('DICOM', root)
+    fake_drive.media_delay = 0.005
+    
+    study = next(drive_client.iter_studies('DICOM'))
+    stats = StudyDownloadEngine(drive_client, max_workers=4).download(study, tmp_path / '1')
+    
+    assert stats.files_total == stats.files_downloaded == 121
+    assert stats.files_failed == 0
+    assert stats.bytes_downloaded == 100 + 120 * (len(DICOM_CONTENT) + 1)
+    assert (tmp_path / '1' / 'S2' / 'IM0119').read_bytes() == DICOM_CONTENT + bytes([119])
+    assert 1 < fake_drive.max_active_media <= 4
+
+
+def test_download_scheduler_shares_slots_across_studies(drive_client, fake_drive, tmp_path):
+    """Testar escalonador global: estudo pequeno não espera o grande terminar"""
+    from src.google_drive.download_engine import DownloadScheduler
+    
+    root = _build_study_tree(fake_drive, aaa_folders=1, studies_per_aaa=2)
+    drive_client.folder_cache.set('DICOM', root)
+    big, small = list(drive_client.iter_studies('DICOM'))
+    big_series = fake_drive.add_folder('S2', big['dicom_folder_id'])
+    for i in range(60):
+        fake_drive.add_file(f'IM{i:04d}', big_series, DICOM_CONTENT * 50)
+    fake_drive.media_delay = 0.005
+    
+    scheduler = DownloadScheduler(drive_client, max_in_flight=4, max_active_studies=2)
+    finished = list(scheduler.run([
+        (big, tmp_path / 'big'),
+        (small, tmp_path / 'small'),
+    ]))
+    
+    assert [info['id'] for info, _, _ in finished] == [small['id'], big['id']]
+    assert finished[1][2].files_downloaded == 61
+    assert all(stats.files_failed == 0 for _, _, stats in finished)
+    assert fake_drive.max_active_media <= 4
+
+
+def test_download_scheduler_bounds_starvation_of_oldest_study(drive_client, fake_drive, tmp_path):
+    """Testar que o estudo mais antigo, de arquivos grandes, mantém sua parte das vagas"""
+    import threading
+    from src.google_drive.download_engine import DownloadScheduler
+    
+    root = _build_study_tree(fake_drive, aaa_folders=1, studies_per_aaa=2)
+    drive_client.folder_cache.set('DICOM', root)
+    big, small = list(drive_client.iter_studies('DICOM'))
+    big_series = fake_drive.add_folder('S2', big['dicom_folder_id'])
+    for i in range(8):
+        fake_drive.add_file(f'IM{i:04d}', big_series, b'x' * 256 * 1024)
+    small_series = fake_drive.add_folder('S2', small['dicom_folder_id'])
+    for i in range(100):
+        fake_drive.add_file(f'IM{i:04d}', small_series, b'x')
+    
+    lock = threading.Lock()
+    big_active = {'now': 0, 'max': 0}
+    original_download = drive_client.download_file
+    def tracking_download(file_id, dest, *args, **kwargs):
+        is_big = 'big' in Path(dest).parts
+        if is_big:
+            with lock:
+                big_active['now'] += 1
+                big_active['max'] = max(big_active['max'], big_active['now'])
+        try:
+            time.sleep(0.02)
+            return original_download(file_id, dest, *args, **kwargs)
+        finally:
+            if is_big:
+                with lock:
+                    big_active['now'] -= 1
+    drive_client.download_file = tracking_download
+    
+    scheduler = DownloadScheduler(drive_client, max_in_flight=8, max_active_studies=2)
+    finished = list(scheduler.run([
+        (big, tmp_path / 'big'),
+        (small, tmp_path / 'small'),
+    ]))
+    
+    assert all(stats.complete for _, _, stats in finished)
+    # Menos bytes em andamento daria uma única vaga ao estudo grande
+    assert big_active['max'] == 8 // 2
+    assert [info['id'] for info, _, _ in finished] == [big['id'], small['id']]
+
+
+def test_download_scheduler_isolates_plan_errors_and_backs_off(drive_client, fake_drive, tmp_path, monkeypatch):
+    """Testar estudo com listagem falha isolado e backoff antes de repetir arquivo"""
+    from src.core.exceptions import GoogleDriveError
+    from src.google_drive.download_engine import DownloadScheduler
+    
+    root = _build_study_tree(fake_drive, aaa_folders=1, studies_per_aaa=2)
+    drive_client.folder_cache.set('DICOM', root)
+    broken, flaky = list(drive_client.iter_studies('DICOM'))
+    
+    build_manifest = drive_client.build_study_manifest
+    def failing_manifest(study_info):
+        if study_info['id'] == broken['id']:
+            raise GoogleDriveError('listagem falhou')
+        return build_manifest(study_info)
+    monkeypatch.setattr(drive_client, 'build_study_manifest', failing_manifest)
+    
+    attempts = []
+    original_download = drive_client.download_file
+    def flaky_download(file_id, *args, **kwargs):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise ConnectionError('429')
+        return original_download(file_id, *args, **kwargs)
+    drive_client.download_file = flaky_download
+    
+    scheduler = DownloadScheduler(drive_client, max_in_flight=2, max_active_studies=2)
+    scheduler.retry_backoff = 0.3
+    finished = {info['id']: stats for info, _, stats in scheduler.run([
+        (broken, tmp_path / 'broken'),
+        (flaky, tmp_path / 'flaky'),
+    ])}
+    
+    assert not finished[broken['id']].complete
+    assert finished[broken['id']].error == 'listagem falhou'
+    assert finished[flaky['id']].complete
+    assert len(attempts) == 2 and attempts[1] - attempts[0] >= 0.3
+
+
+def test_download_file_resumes_from_part(drive_client, fake_drive, tmp_path):
+    """Testar continuação do download a partir do .part com Range"""
+    import hashlib
+    from src.core.exceptions import DownloadError
+    
+    content = bytes(range(256)) * 40
+    file_id = fake_drive.add_file('IM0001', fake_drive.add_folder('S1'), content)
+    output_path = tmp_path / 'IM0001'
+    part_path = tmp_path / 'IM0001.part'
+    md5 = hashlib.md5(content).hexdigest()
+    
+    # Interrupção anterior deixou metade do arquivo
+    part_path.write_bytes(content[:6000])
+    drive_client.download_file(file_id, output_path, expected_size=len(content), expected_md5=md5)
+    
+    assert output_path.read_bytes() == content
+    assert not part_path.exists()
+    assert fake_drive.bytes_served == len(content) - 6000
+    
+    # .part corrompido: md5 divergente descarta o parcial
+    part_path.write_bytes(b'\xff' * 6000)
+    with pytest.raises(DownloadError):
+        drive_client.download_file(file_id, tmp_path / 'IM0001', expected_size=len(content), expected_md5=md5)
+    assert not part_path.exists()
+
+
+def test_download_to_part_with_real_http_request(drive_client, tmp_path, monkeypatch):
+    """Testar download em chunks com um HttpRequest real (HttpMockSequence)"""
+    from googleapiclient.http import HttpMockSequence, HttpRequest
+    from conftest import FakeFilesResource
+    from src.google_drive.chunk_sizer import AdaptiveChunkSizer
+    
+    http = HttpMockSequence([
+        ({'status': '206', 'content-range': 'bytes 4-7/10'}, b'EFGH'),
+        ({'status': '206', 'content-range': 'bytes 8-9/10'}, b'IJ'),
+        ({'status': '416', 'content-range': 'bytes */10'}, b''),
+    ])
+    ranges = []
+    
+    def request(uri, method='GET', body=None, headers=None, **kwargs):
+        ranges.append(headers['range'])
+        return HttpMockSequence.request(http, uri, method, body, headers, **kwargs)
+    monkeypatch.setattr(http, 'request', request)
+    monkeypatch.setattr(
+        FakeFilesResource, 'get_media',
+        lambda self, fileId, **kwargs: HttpRequest(
+            http, lambda resp, content: content, f"https://drive/files/{fileId}?alt=media"
+        )
+    )
+    drive_client.download_chunk_sizer = AdaptiveChunkSizer(4, 4)
+    
+    part_path = tmp_path / 'IM0001.part'
+    part_path.write_bytes(b'ABCD')
+    drive_client._download_to_part('f1', part_path, offset=4)
+    assert part_path.read_bytes() == b'ABCDEFGHIJ'
+    assert ranges == ['bytes=4-7', 'bytes=8-11']
+    
+    # .part já completo: 416 com o mesmo total encerra sem erro
+    drive_client._download_to_part('f1', part_path, offset=10)
+    assert part_path.read_bytes() == b'ABCDEFGHIJ'
+
+
+def test_study_download_ledger_retries_only_missing_files(drive_client, fake_drive, tmp_path, monkeypatch):
+    """Testar ledger por arquivo: nova tentativa baixa só o que falhou"""
+    from src.core.config import Config
+    from src.google_drive.download_engine import StudyDownloadEngine
+    from src.utils.ledger import TransferLedger
+    monkeypatch.setattr(Config, 'RETRY_BACKOFF_FACTOR', 0)
+    
+    root = _build_study_tree(fake_drive, aaa_folders=1, studies_per_aaa=1)
+    drive_client.folder_cache.set('DICOM', root)
+    study = next(drive_client.iter_studies('DICOM'))
+    broken_id = fake_drive.add_file('IM_BROKEN', study['dicom_folder_id'], DICOM_CONTENT)
+    ledger = TransferLedger()
+    
+    original_download = drive_client.download_file
+    def flaky_download(file_id, *args, **kwargs):
+        if file_id == broken_id:
+            raise ConnectionError('falha de rede')
+        return original_download(file_id, *args, **kwargs)
+    drive_client.download_file = flaky_download
+    
+    first = StudyDownloadEngine(drive_client, ledger=ledger).download(study, tmp_path / 'study')
+    assert not first.complete and first.files_failed == 1
+    
+    drive_client.download_file = original_download
+    calls_before = fake_drive.media_calls
+    second = StudyDownloadEngine(drive_client, ledger=ledger).download(study, tmp_path / 'study')
+    
+    assert second.complete
+    assert second.files_skipped == first.files_downloaded
+    assert second.files_downloaded == 1
+    assert fake_drive.media_calls == calls_before + 1
+
+
+def test_download_cache_rerun_costs_no_network(drive_client, fake_drive, tmp_path):
+    """Testar cache por conteúdo: segunda execução materializa por hardlink"""
+    from src.google_drive.download_cache import DownloadCache
+    from src.google_drive.download_engine import StudyDownloadEngine
+    
+    root = _build_study_tree(fake_drive, aaa_folders=1, studies_per_aaa=1)
+    drive_client.folder_cache.set('DICOM', root)
+    study = next(drive_client.iter_studies('DICOM'))
+    for i in range(5):
+        fake_drive.add_file(f'IM{i}', study['dicom_folder_id'], DICOM_CONTENT * 10)
+    drive_client.download_cache = DownloadCache(tmp_path / 'store', budget_gb=1)
+    
+    first = StudyDownloadEngine(drive_client).download(study, tmp_path / 'run1')
+    calls_after_first = fake_drive.media_calls
+    second = StudyDownloadEngine(drive_client).download(study, tmp_path / 'run2')
+    
+    assert first.files_from_cache == 0 and first.files_downloaded == 6
+    assert second.files_from_cache == 6 and second.bytes_downloaded == 0
+    assert fake_drive.media_calls == calls_after_first
+    assert (tmp_path / 'run2' / 'IM0').read_bytes() == DICOM_CONTENT * 10
+    assert (tmp_path / 'run2' / 'IM0').stat().st_nlink >= 2
+
+
+def test_download_cache_evicts_least_recently_used(tmp_path):
+    """Testar limpeza LRU respeitando o orçamento em bytes"""
+    import os
+    from src.google_drive.download_cache import DownloadCache
+    
+    cache = DownloadCache(tmp_path / 'store', budget_gb=2500 / 1024 ** 3)
+    items = [{'id': f'f{i}', 'md5Checksum': f'{i:032x}', 'size': '1000'} for i in range(3)]
+    for i, item in enumerate(items):
+        (tmp_path / f'src{i}').write_bytes(b'x' * 1000)
+    
+    for i in range(2):
+        cache.store(items[i], tmp_path / f'src{i}')
+        os.utime(cache._object_path(cache.cache_key(items[i])), (i, i))
+    
+    # O primeiro é usado de novo; o segundo vira o menos recente
+    assert cache.materialize(items[0], tmp_path / 'out0')
+    cache.store(items[2], tmp_path / 'src2')  # Excede o orçamento
+    
+    assert not cache.materialize(items[1], tmp_path / 'out1')
+    assert cache.materialize(items[0], tmp_path / 'out0b')
+    assert cache.materialize(items[2], tmp_path / 'out2')
+
+
+def test_download_file_small_file_fast_path(drive_client, fake_drive, tmp_path, monkeypatch):
+    """Testar caminho rápido (um único GET) para fatias pequenas"""
+    def no_chunked_download(*args, **kwargs):
+        raise AssertionError("O laço de chunks não deveria ser usado")
+    monkeypatch.setattr(drive_client, '_download_to_part', no_chunked_download)
+    
+    content = DICOM_CONTENT * 2000
+    file_id = fake_drive.add_file('IM0001', fake_drive.add_folder('S1'), content)
+    
+    drive_client.download_file(file_id, tmp_path / 'IM0001', expected_size=len(content))
+    
+    assert (tmp_path / 'IM0001').read_bytes() == content
+    assert fake_drive.media_calls == 1
+
+
+
+def test_adaptive_chunk_sizer_follows_throughput(drive_client, fake_drive, tmp_path):
+    """Testar chunk adaptativo: cresce em link rápido, encolhe em requisição lenta"""
+    from src.google_drive.chunk_sizer import AdaptiveChunkSizer, MB, UPLOAD_CHUNK_MULTIPLE
+    
+    sizer = AdaptiveChunkSizer(MB // 4, 4 * MB, target_seconds=1.0, multiple=UPLOAD_CHUNK_MULTIPLE)
+    sizer.record(MB, 0.5)  # 2 MB/s → chunk de ~2 MB
+    assert sizer.chunk_size() == 2 * MB
+    sizer.record(2 * MB, 10.0)  # Requisição travada: metade
+    assert sizer.chunk_size() == MB
+    sizer.record(100 * MB, 1.0)  # Limitado ao máximo
+    assert sizer.chunk_size() == 4 * MB
+    assert sizer.chunk_size() % UPLOAD_CHUNK_MULTIPLE == 0
+    
+    # Download em chunks: primeiro pequeno, depois o máximo permitido
+    content = bytes(range(256)) * 40
+    file_id = fake_drive.add_file('IM0001', fake_drive.add_folder('S1'), content)
+    drive_client.download_chunk_sizer = AdaptiveChunkSizer(1000, 4000, initial_bytes=1000)
+    
+    drive_client.download_file(file_id, tmp_path / 'IM0001')
+    
+    assert (tmp_path / 'IM0001').read_bytes() == content
+    assert fake_drive.media_calls == 4  # 1000 + 4000 + 4000 + 1240
+    assert drive_client.download_chunk_sizer.to_dict()['max_chunk_mb'] == 4000 / MB
+
+
+def test_bandwidth_limiter_caps_bytes_and_follows_schedule(drive_client, fake_drive, tmp_path):
+    """Testar limite de banda em bytes/s com rajada e janela de horário"""
+    import time
+    from datetime import datetime
+    from src.google_drive.rate_limiter import BandwidthLimiter
+    
+    content = bytes(range(256)) * 40  # 10240 bytes
+    file_id = fake_drive.add_file('IM0001', fake_drive.add_folder('S1'), content)
+    
+    # 20 KB/s com rajada de 2 KB: chunks de no máximo 2 KB, ~0.4s no total
+    drive_client.download_bandwidth = BandwidthLimiter(20_000, burst_bytes=2000)
+    started = time.monotonic()
+    drive_client.download_file(file_id, tmp_path / 'IM0001', chunk_size_mb=1)
+    elapsed = time.monotonic() - started
+    
+    assert (tmp_path / 'IM0001').read_bytes() == content
+    assert fake_drive.media_calls == 6
+    assert 0.3 < elapsed < 2.0
+    
+    # Fora da janela de horário o limite não se aplica
+    night = lambda: datetime(2024, 1, 1, 23, 30)
+    limiter = BandwidthLimiter(1000, active_hours='07:00-19:00', now=night)
+    assert limiter.consume(10_000) == 0.0
+    assert limiter.limit_chunk(10_000) == 10_000
+    assert BandwidthLimiter(1000, active_hours='22:00-06:00', now=night).is_active()
+
+
+def test_pooled_http_bounds_and_reuses_connections(monkeypatch):
+    """Testar pool de conexões: nunca duas threads na mesma conexão"""
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from src.google_drive.transport import PooledAuthorizedHttp
+    
+    active = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+    
+    class _FakeHttp:
+        def __init__(self):
+            self.in_use = False
+        
+        def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+            assert not self.in_use, "conexão compartilhada entre threads"
+            self.in_use = True
+            with lock:
+                active['now'] += 1
+                active['max'] = max(active['max'], active['now'])
+            time.sleep(0.005)
+            with lock:
+                active['now'] -= 1
+            self.in_use = False
+            return {'status': '200'}, uri.encode()
+    
+    pool = PooledAuthorizedHttp(credentials=None, pool_size=3)
+    monkeypatch.setattr(pool, '_new_http', _FakeHttp)
+    
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        bodies = list(executor.map(lambda i: pool.request(f'u{i}')[1], range(50)))
+    
+    assert bodies == [f'u{i}'.encode() for i in range(50)]
+    assert active['max'] <= 3
+    assert pool.connections_created <= 3
+
+
+def test_async_client_against_fake_server(fake_drive, tmp_path):
+    """Testar cliente assíncrono contra servidor HTTP local"""
+    import asyncio
+    pytest.importorskip('aiohttp')
+    from aiohttp.test_utils import TestServer
+    from conftest import make_fake_drive_app
+    from src.google_drive.async_client import AsyncGoogleDriveClient
+    
+    root = _build_study_tree(fake_drive, aaa_folders=1, studies_per_aaa=2)
+    for study_dicom in [n for n in list(fake_drive.nodes.values()) if n['name'] == 'S1']:
+        for i in range(40):
+            fake_drive.add_file(f'IM{i:04d}', study_dicom['id'], DICOM_CONTENT + bytes([i]))
+    output_folder = fake_drive.add_folder('NifTI')
+    app = make_fake_drive_app(fake_drive, latency=0.02)
+    
+    async def scenario():
+        server = TestServer(app)
+        await server.start_server()
+        base_url = str(server.make_url('/'))
+        try:
+            async with AsyncGoogleDriveClient(
+                api_url=base_url + 'drive/v3',
+                upload_url=base_url + 'upload/drive/v3',
+                max_connections=64,
+                rate_limit_rps=100000
+            ) as client:
+                assert await client.find_folder('DICOM/AAA1') is not None
+                files = await client.list_files(root)
+                
+                sizes = await asyncio.gather(*(
+                    client.download_file(
+                        f['id'], tmp_path / f['id'], int(f['size']), f['md5Checksum']
+                    )
+                    for f in files
+                ))
+                
+                source = tmp_path / 'out.nii.gz'
+                source.write_bytes(b'nifti' * 100)
+                uploaded_id = await client.upload_file(source, output_folder)
+            return files, sizes, uploaded_id
+        finally:
+            await server.close()
+    
+    files, sizes, uploaded_id = asyncio.run(scenario())
+    
+    assert len(files) == 2 * 41
+    assert sum(sizes) == sum(int(f['size']) for f in files)
+    last = next(f for f in files if f['name'] == 'IM0039')
+    assert (tmp_path / last['id']).read_bytes() == DICOM_CONTENT + bytes([39])
+    assert not list(tmp_path.glob('*.part'))
+    assert 8 < app['concurrency']['max_active'] <= 64
+    assert fake_drive.nodes[uploaded_id]['content'] == b'nifti' * 100
+
+
+def test_async_client_wraps_truncated_body_in_download_error(tmp_path):
+    """Testar que corpo interrompido no meio (ClientPayloadError) vira DownloadError"""
+    import asyncio
+    pytest.importorskip('aiohttp')
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+    from src.core.exceptions import DownloadError
+    from src.google_drive.async_client import AsyncGoogleDriveClient
+    
+    async def truncated_media(request):
+        response = web.StreamResponse()
+        response.content_length = 1000
+        await response.prepare(request)
+        await response.write(b'x' * 10)
+        request.transport.close()
+        return response
+    
+    app = web.Application()
+    app.router.add_get('/drive/v3/files/{file_id}', truncated_media)
+    
+    async def scenario():
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            async with AsyncGoogleDriveClient(
+                api_url=str(server.make_url('/drive/v3')), rate_limit_rps=100000
+            ) as client:
+                await client.download_file('f1', tmp_path / 'IM0001', expected_size=1000)
+        finally:
+            await server.close()
+    
+    with pytest.raises(DownloadError):
+        asyncio.run(scenario())
+    assert not (tmp_path / 'IM0001').exists()
+
+
+def test_async_client_resumable_upload_resumes_after_failed_chunk(fake_drive, tmp_path, monkeypatch):
+    """Testar upload resumable assíncrono acima de UPLOAD_MULTIPART_MAX_MB"""
+    import asyncio
+    pytest.importorskip('aiohttp')
+    from aiohttp.test_utils import TestServer
+    from conftest import make_fake_drive_app
+    from src.core.config import Config
+    from src.google_drive.async_client import AsyncGoogleDriveClient
+    
+    monkeypatch.setattr(Config, 'UPLOAD_MULTIPART_MAX_MB', 0.5)
+    monkeypatch.setattr(Config, 'CHUNK_MIN_MB', 0.25)
+    monkeypatch.setattr(Config, 'CHUNK_MAX_MB', 0.25)
+    output_folder = fake_drive.add_folder('NifTI')
+    source = tmp_path / 'big.nii.gz'
+    source.write_bytes(os.urandom(1024 * 1024 + 1000))
+    app = make_fake_drive_app(fake_drive)
+    app['faults']['chunks'] = 1
+    
+    async def scenario():
+        server = TestServer(app)
+        await server.start_server()
+        base_url = str(server.make_url('/'))
+        try:
+            async with AsyncGoogleDriveClient(
+                api_url=base_url + 'drive/v3',
+                upload_url=base_url + 'upload/drive/v3',
+                rate_limit_rps=100000
+            ) as client:
+                return await client.upload_file(source, output_folder)
+        finally:
+            await server.close()
+    
+    uploaded_id = asyncio.run(scenario())
+    
+    assert fake_drive.nodes[uploaded_id]['content'] == source.read_bytes()
+    # O chunk que falhou foi confirmado pela metade: o reenvio começa dali
+    first, second = app['upload_puts'][:2]
+    assert first.startswith('0-')
+    assert int(second.split('-')[0]) == (int(first.split('-')[1].split('/')[0]) + 1) // 2
+    assert len(app['upload_puts']) > 2
+
+
+def test_async_rate_limiter_shares_sync_bucket():
+    """Testar que os clientes síncrono e assíncrono dividem a mesma cota"""
+    import asyncio
+    from src.google_drive.rate_limiter import AsyncRateLimiter, RateLimiter
+    
+    bucket = RateLimiter(requests_per_second=20, burst=2)
+    async_limiter = AsyncRateLimiter(rate_limiter=bucket)
+    bucket.wait()
+    bucket.wait()
+    
+    start = time.monotonic()
+    asyncio.run(async_limiter.wait())
+    
+    assert time.monotonic() - start >= 0.04
+    assert bucket.reserve() > 0
+
+
+def test_upload_small_file_single_multipart_request(drive_client, fake_drive, tmp_path):
+    """Testar upload multipart (uma requisição) para arquivos pequenos"""
+    folder_id = fake_drive.add_folder('output')
+    sidecar = tmp_path / 'series.json'
+    sidecar.write_text('{"SeriesDescription": "T1"}')
+    
+    file_id = drive_client.upload_file(sidecar, folder_id)
+    
+    assert fake_drive.create_calls == 1
+    assert fake_drive.nodes[file_id]['content'] == sidecar.read_bytes()
+    assert fake_drive.nodes[file_id]['parents'] == [folder_id]
+
+
+def test_upload_skips_identical_file_and_verifies_md5(drive_client, fake_drive, tmp_path, monkeypatch):
+    """Testar deduplicação por nome + md5 e verificação do md5 após upload"""
+    from src.core.exceptions import UploadError
+    
+    folder_id = fake_drive.add_folder('output')
+    existing_id = fake_drive.add_file('series.json', folder_id, b'{"a": 1}')
+    
+    same = tmp_path / 'series.json'
+    same.write_bytes(b'{"a": 1}')
+    other = tmp_path / 'other.json'
+    other.write_bytes(b'{"b": 2}')
+    
+    assert drive_client.upload_file(same, folder_id, skip_existing=True) == existing_id
+    new_id = drive_client.upload_file(other, folder_id, skip_existing=True)
+    assert drive_client.upload_file(other, folder_id, skip_existing=True) == new_id
+    
+    assert fake_drive.create_calls == 1
+    assert fake_drive.list_calls == 1  # Uma listagem para a pasta inteira
+    assert drive_client.uploads_skipped == 2
+    
+    # md5 devolvido pelo Drive diverge: arquivo remoto removido, upload falha
+    original_create = fake_drive.create
+    monkeypatch.setattr(fake_drive, 'create', lambda body, media_body=None: {
+        **original_create(body, media_body), 'md5Checksum': '0' * 32
+    })
+    with pytest.raises(UploadError):
+        drive_client.upload_file(same, folder_id, file_name='corrupt.json')
+    assert all(
+        node.get('trashed') for node in fake_drive.nodes.values() if node['name'] == 'corrupt.json'
+    )
+
+
+def test_resumable_upload_continues_saved_session(drive_client, fake_drive, tmp_path, monkeypatch):
+    """Testar retomada do upload resumable a partir da sessão persistida"""
+    from src.core.config import Config
+    from src.core.exceptions import UploadError
+    from src.google_drive.chunk_sizer import AdaptiveChunkSizer, UPLOAD_CHUNK_MULTIPLE
+    from src.google_drive.upload_sessions import UploadSessionStore
+    
+    monkeypatch.setattr(Config, 'UPLOAD_MULTIPART_MAX_MB', 0.1)
+    chunk = UPLOAD_CHUNK_MULTIPLE
+    drive_client.upload_chunk_sizer = AdaptiveChunkSizer(chunk, chunk, multiple=chunk)
+    drive_client._upload_sessions = UploadSessionStore(tmp_path / 'sessions.sqlite3')
+    
+    folder_id = fake_drive.add_folder('output')
+    nifti = tmp_path / 'T1.nii.gz'
+    content = os.urandom(chunk * 2 + 1000)
+    nifti.write_bytes(content)
+    
+    # Conexão cai depois do primeiro chunk confirmado
+    fake_drive.fail_upload_after_chunks = 1
+    with pytest.raises(UploadError):
+        drive_client.upload_file(nifti, folder_id)
+    assert fake_drive.bytes_uploaded == chunk
+    
+    # Novo processo: mesma base SQLite, sessão retomada do byte confirmado,
+    # mesmo com o NIfTI regenerado em outro diretório de staging
+    drive_client._upload_sessions = UploadSessionStore(tmp_path / 'sessions.sqlite3')
+    regenerated = tmp_path / 'rerun' / 'T1.nii.gz'
+    regenerated.parent.mkdir()
+    regenerated.write_bytes(content)
+    file_id = drive_client.upload_file(regenerated, folder_id)
+    
+    assert fake_drive.nodes[file_id]['content'] == content
+    assert fake_drive.bytes_uploaded == len(content)
+    key = UploadSessionStore.session_key(folder_id, nifti.name, len(content), hashlib.md5(content).hexdigest())
+    assert drive_client.upload_sessions.get(key) is None
+    
+    # Sessão expirada no Drive: recomeça do zero
+    drive_client.upload_sessions.save(key, 'https://fake.drive/upload/gone', chunk)
+    file_id = drive_client.upload_file(nifti, folder_id)
+    assert fake_drive.nodes[file_id]['content'] == content
+    
+    # Falha antes do 1º chunk: a sessão já foi gravada com offset 0
+    fake_drive.fail_upload_after_chunks = 0
+    with pytest.raises(UploadError):
+        drive_client.upload_file(nifti, folder_id)
+    saved = drive_client.upload_sessions.get(key)
+    assert saved is not None and saved[1] == 0
+    sessions_opened = len(fake_drive.upload_sessions)
+    file_id = drive_client.upload_file(nifti, folder_id)
+    assert fake_drive.nodes[file_id]['content'] == content
+    assert len(fake_drive.upload_sessions) < sessions_opened
+
+
+def test_resumable_upload_with_real_http_request(drive_client, tmp_path, monkeypatch):
+    """Testar upload resumable com o HttpRequest real do googleapiclient (HttpMockSequence)"""
+    import hashlib
+    from googleapiclient.discovery import build
+    from googleapiclient.http import HttpMockSequence
+    from src.core.config import Config
+    from src.google_drive.chunk_sizer import AdaptiveChunkSizer, UPLOAD_CHUNK_MULTIPLE
+    from src.google_drive.upload_sessions import UploadSessionStore
+    
+    chunk = UPLOAD_CHUNK_MULTIPLE
+    content = os.urandom(chunk + 1000)
+    nifti = tmp_path / 'T1.nii.gz'
+    nifti.write_bytes(content)
+    
+    http = HttpMockSequence([
+        ({'status': '200', 'location': 'https://upload.example/session1'}, b''),
+        ({'status': '308', 'range': f'bytes=0-{chunk - 1}'}, b''),
+        ({'status': '200'}, json.dumps({'id': 'new1', 'md5Checksum': hashlib.md5(content).hexdigest()})),
+    ])
+    sent = []
+    
+    def request(uri, method='GET', body=None, headers=None, **kwargs):
+        sent.append((method, uri, dict(headers or {}), len(body or b'')))
+        return HttpMockSequence.request(http, uri, method, body, headers, **kwargs)
+    monkeypatch.setattr(http, 'request', request)
+    
+    monkeypatch.setattr(Config, 'UPLOAD_MULTIPART_MAX_MB', 0.1)
+    drive_client.service = build('drive', 'v3', http=http, static_discovery=True)
+    drive_client.upload_chunk_sizer = AdaptiveChunkSizer(chunk, chunk, multiple=chunk)
+    drive_client._upload_sessions = UploadSessionStore(tmp_path / 'sessions.sqlite3')
+    
+    assert drive_client.upload_file(nifti, 'folder1') == 'new1'
+    
+    start, first, second = sent
+    assert start[0] == 'POST' and 'uploadType=resumable' in start[1]
+    assert start[2]['X-Upload-Content-Length'] == str(len(content))
+    assert first[:2] == ('PUT', 'https://upload.example/session1')
+    assert first[2]['Content-Range'] == f"bytes 0-{chunk - 1}/{len(content)}" and first[3] == chunk
+    assert second[2]['Content-Range'] == f"bytes {chunk}-{len(content) - 1}/{len(content)}"
\ No newline at end of file
@@ -0,0 +1,451 @@
+"""
+Testes para módulo pipeline
+"""
+import pytest
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.pipeline.batch_pipeline import BatchPipeline, _bounded_submit
+from src.utils.ledger import TransferLedger
+
+
+class FakeConverter:
+    """Converter picklável: grava um NIfTI e um JSON no diretório de saída"""
+    
+    def convert(self, input_dir, output_dir, timeout_seconds=600):
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        nifti = output_dir / 'out.nii.gz'
+        sidecar = output_dir / 'out.json'
+        nifti.write_bytes(b'nifti')
+        sidecar.write_text('{}')
+        return {'status': 'success', 'files': {'nifti': [nifti], 'json': [sidecar]}}
+
+
+def test_bounded_submit_consumes_generator_lazily():
+    """Testar que tarefas de um gerador são submetidas sob demanda"""
+    produced = []
+    
+    def tasks():
+        for i in range(50):
+            produced.append(i)
+            yield i
+    
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = _bounded_submit(executor, lambda x: x * 2, tasks(), max_pending=4)
+        first_item, first_future = next(results)
+        
+        # Apenas a janela de futures pendentes foi consumida do gerador
+        assert len(produced) <= 4
+        assert first_future.result() == first_item * 2
+        
+        remaining = [future.result() for _, future in results]
+    
+    assert len(remaining) == 49
+    assert len(produced) == 50
+
+
+def test_upload_mirrors_study_layout(drive_client, fake_drive, tmp_path):
+    """Testar upload em pastas AAA/estudo criadas uma única vez"""
+    pipeline = BatchPipeline(drive_client, dicom_converter=object(), ledger=TransferLedger())
+    output_root = fake_drive.add_folder('output')
+    pipeline._get_output_folder_id = lambda: output_root
+    
+    uploads = []
+    drive_client.upload_file = lambda path, folder_id, **kwargs: uploads.append((path.name, folder_id))
+    
+    converted = []
+    for name in ('AAA1/1', 'AAA1/2', 'AAA2/1'):
+        nifti = tmp_path / name.replace('/', '_') / 'out.nii.gz'
+        nifti.parent.mkdir()
+        nifti.write_bytes(b'nifti')
+        converted.append({
+            'local_path': nifti.parent,
+            'output_dir': nifti.parent,
+            'output_files': {'nifti': [nifti]},
+            'study_info': {'id': name, 'name': name},
+        })
+    
+    results = pipeline._upload_stage(converted)
+    
+    assert len(results) == 3
+    assert fake_drive.create_calls == 5  # AAA1, AAA2 e três estudos
+    aaa_folder = drive_client.ensure_folder_path(output_root, 'AAA1')
+    study_folder = drive_client.ensure_folder_path(output_root, 'AAA1/2')
+    assert fake_drive.nodes[study_folder]['parents'] == [aaa_folder]
+    assert ('out.nii.gz', study_folder) in uploads
+    assert len({folder_id for _, folder_id in uploads}) == 3
+    assert fake_drive.create_calls == 5
+
+
+def test_upload_schedules_each_output_file(drive_client, fake_drive, tmp_path):
+    """Testar upload de cada arquivo de saída como item separado do pool"""
+    import threading
+    import time
+    
+    pipeline = BatchPipeline(drive_client, dicom_converter=object(), ledger=TransferLedger())
+    output_root = fake_drive.add_folder('output')
+    pipeline._get_output_folder_id = lambda: output_root
+    
+    active = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+    
+    def slow_upload(path, folder_id, **kwargs):
+        with lock:
+            active['now'] += 1
+            active['max'] = max(active['max'], active['now'])
+        time.sleep(0.1)
+        with lock:
+            active['now'] -= 1
+        if path.name == 'broken.json':
+            raise RuntimeError('falha')
+        return 'id'
+    drive_client.upload_file = slow_upload
+    
+    converted = [
+        {'local_path': tmp_path / 's1', 'output_dir': tmp_path / 's1',
+         'output_files': {'nifti': [tmp_path / f'{i}.nii.gz' for i in range(3)],
+                          'json': [tmp_path / f'{i}.json' for i in range(3)]}},
+        {'local_path': tmp_path / 's2', 'output_dir': tmp_path / 's2',
+         'output_files': {'json': [tmp_path / 'broken.json']}},
+    ]
+    
+    results = pipeline._upload_stage(converted)
+    
+    assert active['max'] == pipeline.config.MAX_WORKERS_UPLOAD
+    assert [r['input_path'] for r in results] == [str(tmp_path / 's1')]
+    assert pipeline.stats['failed'] == 1
+
+
+def test_upload_retry_sends_only_missing_files(drive_client, fake_drive, tmp_path):
+    """Testar ledger de upload: reprocessar o estudo envia só o que falhou"""
+    ledger = TransferLedger()
+    pipeline = BatchPipeline(drive_client, dicom_converter=object(), ledger=ledger)
+    output_root = fake_drive.add_folder('output')
+    pipeline._get_output_folder_id = lambda: output_root
+    
+    outputs = []
+    for name in ('T1.nii.gz', 'T1.json', 'T2.nii.gz'):
+        (tmp_path / name).write_bytes(name.encode())
+        outputs.append(tmp_path / name)
+    item = {
+        'local_path': tmp_path, 'output_dir': tmp_path,
+        'output_files': {'nifti': [outputs[0], outputs[2]], 'json': [outputs[1]]},
+        'study_info': {'id': 'study1', 'name': 'AAA1/1'},
+    }
+    
+    sent = []
+    network = {'down_for': 'T2.nii.gz'}
+    def upload(path, folder_id, **kwargs):
+        sent.append(path)
+        if path.name == network['down_for']:
+            raise ConnectionError('falha')
+        return f"id-{path.name}"
+    drive_client.upload_file = upload
+    
+    assert pipeline._upload_stage([dict(item)]) == []
+    assert set(ledger.done_items('study1', 'upload')) == {'T1.nii.gz:9', 'T1.json:7'}
+    
+    sent.clear()
+    network['down_for'] = None
+    results = pipeline._upload_stage([dict(item)])
+    
+    assert len(results) == 1
+    assert [p.name for p in sent] == ['T2.nii.gz']
+    assert ledger.done_items('study1', 'upload') == {}
+
+
+def test_conversion_stage_runs_in_process_pool(drive_client, tmp_path):
+    """Testar conversão em ProcessPoolExecutor real (sem enviar o pipeline)"""
+    pipeline = BatchPipeline(drive_client, dicom_converter=FakeConverter(), ledger=TransferLedger())
+    study_dir = tmp_path / 'study'
+    study_dir.mkdir()
+    study_info = {'id': 'study1', 'name': 'AAA1/1'}
+    
+    converted = pipeline._conversion_stage([
+        {'file_id': 'study1', 'local_path': study_dir, 'study_info': study_info}
+    ])
+    
+    assert len(converted) == 1
+    assert converted[0]['study_info'] == study_info
+    assert converted[0]['output_files']['nifti'][0].read_bytes() == b'nifti'
+    assert pipeline.stats['failed'] == 0
+
+
+def test_default_ledger_is_in_memory(drive_client, tmp_path, monkeypatch):
+    """Testar que o ledger só vai para disco com PERSIST_LEDGER"""
+    from src.core.config import Config
+    ledger_path = tmp_path / 'ledger.sqlite3'
+    monkeypatch.setattr(Config, 'LEDGER_PATH', ledger_path)
+    
+    BatchPipeline(drive_client, dicom_converter=FakeConverter())
+    assert not ledger_path.exists()
+    
+    monkeypatch.setattr(Config, 'PERSIST_LEDGER', True)
+    BatchPipeline(drive_client, dicom_converter=FakeConverter())
+    assert ledger_path.exists()
+
+
+def test_staging_released_per_study_after_upload(drive_client, fake_drive, tmp_path):
+    """Testar que cada estudo devolve sua reserva em RAM ao terminar o upload"""
+    from src.utils.staging import StagingArea
+    
+    pipeline = BatchPipeline(drive_client, dicom_converter=object(), ledger=TransferLedger())
+    pipeline.staging = StagingArea(tmp_path / 'disk', tmp_path / 'ram', budget_mb=1)
+    pipeline._get_output_folder_id = lambda: fake_drive.add_folder('output')
+    
+    def upload(path, folder_id, **kwargs):
+        if path.parent.parent.name == 'broken':
+            raise ConnectionError('falha')
+        return 'id'
+    drive_client.upload_file = upload
+    
+    converted = []
+    for name in ('ok', 'broken'):
+        slot = pipeline.staging.reserve(name, 400 * 1024)
+        nifti = slot / 'study_nifti' / 'out.nii.gz'
+        nifti.parent.mkdir()
+        nifti.write_bytes(b'nifti')
+        converted.append({
+            'local_path': slot / 'study', 'output_dir': nifti.parent,
+            'output_files': {'nifti': [nifti]}, 'staging_slot': slot,
+        })
+    assert all(pipeline.staging.is_in_ram(item['staging_slot']) for item in converted)
+    
+    results = pipeline._upload_stage(converted)
+    
+    assert len(results) == 1
+    assert pipeline.staging.ram_used_bytes == 0
+    assert not any(item['staging_slot'].exists() for item in converted)
+
+
+def test_conversion_starts_while_other_studies_download(drive_client, fake_drive, tmp_path):
+    """Testar fluxo: estudo baixado vai para a conversão sem esperar os demais"""
+    import threading
+    import time
+    from src.pipeline.batch_pipeline import ProcessingTask
+    from src.utils.staging import StagingArea
+    
+    root = fake_drive.add_folder('DICOM')
+    aaa = fake_drive.add_folder('AAA1', root)
+    studies = []
+    for number in ('1', '2'):
+        dicom = fake_drive.add_folder('DICOM', fake_drive.add_folder(number, aaa))
+        fake_drive.add_file('IM0001', fake_drive.add_folder('S1', dicom), b'x' * 100)
+        studies.append({'id': dicom, 'name': f'AAA1/{number}', 'dicom_folder_id': dicom})
+    
+    pipeline = BatchPipeline(drive_client, dicom_converter=FakeConverter(), ledger=TransferLedger())
+    pipeline.staging = StagingArea(tmp_path / 'disk')
+    second_output = tmp_path / 'disk' / 'AAA1' / '2' / '2_nifti' / 'out.nii.gz'
+    
+    # O estudo 1 só termina de baixar depois que o 2 já foi convertido
+    blocked = {'waited': None}
+    lock = threading.Lock()
+    original_download = drive_client.download_file
+    def gated_download(file_id, dest, *args, **kwargs):
+        with lock:
+            gate = blocked['waited'] is None and '/AAA1/1/' in str(dest)
+            if gate:
+                blocked['waited'] = False
+        if gate:
+            deadline = time.monotonic() + 30
+            while not second_output.exists() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            blocked['waited'] = second_output.exists()
+        return original_download(file_id, dest, *args, **kwargs)
+    drive_client.download_file = gated_download
+    
+    tasks = [ProcessingTask(s['id'], s['name'], 'unknown', 0, study_info=s) for s in studies]
+    converted = pipeline._conversion_stage(pipeline._download_study_stage_for_tasks(tasks))
+    
+    assert blocked['waited'] is True
+    assert sorted(item['study_info']['name'] for item in converted) == ['AAA1/1', 'AAA1/2']
+
+
+def test_study_manifest_built_once_at_admission(drive_client, fake_drive, tmp_path, monkeypatch):
+    """Testar manifesto sob demanda: listado uma vez, quando o estudo entra no download"""
+    from src.pipeline.batch_pipeline import ProcessingTask
+    from src.utils.staging import StagingArea
+    
+    dicom = fake_drive.add_folder('DICOM')
+    fake_drive.add_file('IM0001', fake_drive.add_folder('S1', dicom), b'x' * 1000)
+    study = {'id': dicom, 'name': 'AAA1/1', 'dicom_folder_id': dicom}
+    
+    pipeline = BatchPipeline(drive_client, dicom_converter=object(), ledger=TransferLedger())
+    pipeline.staging = StagingArea(tmp_path / 'disk', tmp_path / 'ram', budget_mb=1)
+    
+    builds = []
+    build_manifest = drive_client.build_study_manifest
+    def counting_build(study_info):
+        builds.append(study_info['id'])
+        return build_manifest(study_info)
+    monkeypatch.setattr(drive_client, 'build_study_manifest', counting_build)
+    
+    task = ProcessingTask(dicom, study['name'], 'unknown', 0, study_info=study)
+    downloaded = list(pipeline._download_study_stage_for_tasks([task]))
+    
+    assert builds == [dicom]
+    assert study['manifest'].total_bytes == 1000
+    # Tamanho conhecido: a reserva coube no orçamento em RAM
+    assert pipeline.staging.is_in_ram(downloaded[0]['staging_slot'])
+
+
+def test_study_manifests_prefetched_while_downloading(drive_client, fake_drive, tmp_path, monkeypatch):
+    """Testar que os manifestos dos próximos estudos são listados em paralelo, à frente da admissão"""
+    import threading
+    import time
+    from src.pipeline.batch_pipeline import ProcessingTask
+    from src.utils.staging import StagingArea
+    
+    studies = []
+    for number in range(4):
+        dicom = fake_drive.add_folder('DICOM')
+        fake_drive.add_file('IM0001', fake_drive.add_folder('S1', dicom), b'x' * 100)
+        studies.append({'id': dicom, 'name': f'AAA1/{number}', 'dicom_folder_id': dicom})
+    
+    pipeline = BatchPipeline(drive_client, dicom_converter=object(), ledger=TransferLedger())
+    pipeline.staging = StagingArea(tmp_path / 'disk')
+    
+    lock = threading.Lock()
+    listing = {'now': 0, 'max': 0}
+    build_manifest = drive_client.build_study_manifest
+    def slow_build(study_info):
+        with lock:
+            listing['now'] += 1
+            listing['max'] = max(listing['max'], listing['now'])
+        time.sleep(0.2)
+        with lock:
+            listing['now'] -= 1
+        return build_manifest(study_info)
+    monkeypatch.setattr(drive_client, 'build_study_manifest', slow_build)
+    
+    tasks = [ProcessingTask(s['id'], s['name'], 'unknown', 0, study_info=s) for s in studies]
+    started = time.monotonic()
+    downloaded = list(pipeline._download_study_stage_for_tasks(tasks))
+    
+    assert sorted(item['study_info']['name'] for item in downloaded) == [s['name'] for s in studies]
+    assert listing['max'] == len(studies)
+    assert time.monotonic() - started < 0.2 * len(studies)
+
+
+def _partly_failing_study(fake_drive, drive_client, monkeypatch, fail_once):
+    """Estudo com 3 arquivos; os de `fail_once` falham em todas as tentativas da 1ª passada"""
+    from src.core.config import Config
+    
+    dicom = fake_drive.add_folder('DICOM')
+    series = fake_drive.add_folder('S1', dicom)
+    file_ids = [fake_drive.add_file(f'IM000{i}', series, b'x' * 100) for i in range(3)]
+    study = {'id': dicom, 'name': 'AAA1/1', 'dicom_folder_id': dicom}
+    
+    monkeypatch.setattr(Config, 'RETRY_BACKOFF_FACTOR', 0)
+    calls = []
+    failing = {file_ids[i] for i in fail_once}
+    original_download = drive_client.download_file
+    def flaky_download(file_id, dest, *args, **kwargs):
+        calls.append(file_id)
+        if file_id in failing and calls.count(file_id) <= Config.MAX_RETRIES:
+            raise ConnectionError('falha')
+        return original_download(file_id, dest, *args, **kwargs)
+    drive_client.download_file = flaky_download
+    return study, file_ids, calls
+
+
+def test_incomplete_study_second_pass_fetches_only_missing(drive_client, fake_drive, tmp_path, monkeypatch):
+    """Testar estudo incompleto: nova passada na mesma execução busca só o que falta"""
+    from src.core.config import Config
+    from src.pipeline.batch_pipeline import ProcessingTask
+    from src.utils.staging import StagingArea
+    
+    monkeypatch.setattr(Config, 'STUDY_RETRIES', 1)
+    study, file_ids, calls = _partly_failing_study(fake_drive, drive_client, monkeypatch, fail_once=[1])
+    
+    pipeline = BatchPipeline(drive_client, dicom_converter=object(), ledger=TransferLedger())
+    pipeline.staging = StagingArea(tmp_path / 'disk')
+    task = ProcessingTask(study['id'], study['name'], 'unknown', 0, study_info=study)
+    downloaded = list(pipeline._download_study_stage_for_tasks([task]))
+    
+    assert len(downloaded) == 1
+    assert sorted(p.name for p in downloaded[0]['local_path'].rglob('IM*')) == ['IM0000', 'IM0001', 'IM0002']
+    # 1ª passada: um pedido para cada arquivo bom; 2ª passada: só o que faltava
+    assert calls.count(file_ids[0]) == 1
+    assert calls.count(file_ids[2]) == 1
+    assert calls.count(file_ids[1]) == Config.MAX_RETRIES + 1
+
+
+def test_incomplete_study_kept_for_next_run_with_persistent_ledger(drive_client, fake_drive, tmp_path, monkeypatch):
+    """Testar PERSIST_LEDGER: estudo incompleto mantém o staging e a próxima execução retoma"""
+    from src.core.config import Config
+    from src.pipeline.batch_pipeline import ProcessingTask
+    from src.utils.staging import StagingArea
+    
+    monkeypatch.setattr(Config, 'STUDY_RETRIES', 0)
+    monkeypatch.setattr(Config, 'PERSIST_LEDGER', True)
+    study, file_ids, calls = _partly_failing_study(fake_drive, drive_client, monkeypatch, fail_once=[1])
+    
+    def run():
+        pipeline = BatchPipeline(drive_client, dicom_converter=object())
+        pipeline.staging = StagingArea(tmp_path / 'disk', tmp_path / 'ram', budget_mb=1)
+        task = ProcessingTask(study['id'], study['name'], 'unknown', 0, study_info=dict(study))
+        return pipeline, list(pipeline._download_study_stage_for_tasks([task]))
+    
+    _, first = run()
+    assert first == []
+    assert sorted(p.name for p in (tmp_path / 'disk' / 'AAA1' / '1').rglob('IM*')) == ['IM0000', 'IM0002']
+    
+    pipeline, second = run()
+    assert len(second) == 1
+    # Diretório mantido em disco: a nova reserva o reaproveita
+    assert not pipeline.staging.is_in_ram(second[0]['staging_slot'])
+    assert calls.count(file_ids[0]) == 1
+    assert calls.count(file_ids[2]) == 1
+    assert calls.count(file_ids[1]) == Config.MAX_RETRIES + 1
+
+
+def test_async_downloads_keep_many_requests_in_flight(drive_client, fake_drive, tmp_path, monkeypatch):
+    """Testar ASYNC_DOWNLOADS: estudos baixados pelo driver asyncio com muitas requisições simultâneas"""
+    pytest.importorskip('aiohttp')
+    from conftest import make_fake_drive_app, serve_fake_drive_app
+    from src.core.config import Config
+    from src.google_drive.rate_limiter import RateLimiter
+    from src.pipeline.async_driver import AsyncStudyDownloader
+    from src.pipeline.batch_pipeline import ProcessingTask
+    from src.utils.staging import StagingArea
+    
+    aaa = fake_drive.add_folder('AAA1', fake_drive.add_folder('DICOM'))
+    studies = []
+    for number in ('1', '2', '3'):
+        dicom = fake_drive.add_folder('DICOM', fake_drive.add_folder(number, aaa))
+        series = fake_drive.add_folder('S1', dicom)
+        for i in range(40):
+            fake_drive.add_file(f'IM{i:04d}', series, b'x' * 100 + bytes([i]))
+        studies.append({'id': dicom, 'name': f'AAA1/{number}', 'dicom_folder_id': dicom})
+    app = make_fake_drive_app(fake_drive, latency=0.05)
+    
+    monkeypatch.setattr(Config, 'ASYNC_DOWNLOADS', True)
+    drive_client.rate_limiter = RateLimiter(100000, burst=1000)
+    pipeline = BatchPipeline(drive_client, dicom_converter=object(), ledger=TransferLedger())
+    pipeline.staging = StagingArea(tmp_path / 'disk')
+    
+    with serve_fake_drive_app(app) as base_url:
+        from_client = AsyncStudyDownloader.from_client
+        drivers = []
+        def fake_server_driver(client, **kwargs):
+            driver = from_client(
+                client, api_url=base_url + 'drive/v3', upload_url=base_url + 'upload/drive/v3', **kwargs
+            )
+            drivers.append(driver)
+            return driver
+        monkeypatch.setattr(AsyncStudyDownloader, 'from_client', fake_server_driver)
+        
+        tasks = [ProcessingTask(s['id'], s['name'], 'unknown', 0, study_info=s) for s in studies]
+        downloaded = list(pipeline._download_study_stage_for_tasks(tasks))
+    
+    assert sorted(item['study_info']['name'] for item in downloaded) == ['AAA1/1', 'AAA1/2', 'AAA1/3']
+    assert all(item['download_stats']['files_downloaded'] == 40 for item in downloaded)
+    assert (tmp_path / 'disk' / 'AAA1' / '3' / '3' / 'S1' / 'IM0039').read_bytes() == b'x' * 100 + bytes([39])
+    # Uma cota: o cliente assíncrono reserva no mesmo balde do síncrono
+    assert drivers[0].client.rate_limiter.bucket is drive_client.rate_limiter
+    assert 16 < app['concurrency']['max_active'] <= Config.ASYNC_MAX_IN_FLIGHT
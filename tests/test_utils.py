@@ -15,6 +15,7 @@ from src.utils.file_utils import (
     get_file_size_mb,
 )
 from src.utils.retry import retry_with_backoff, CircuitBreaker
+from src.utils.staging import StagingArea
 
 
 def test_calculate_checksum():
@@ -73,3 +74,25 @@ def test_circuit_breaker():
     # Teste de reset (vai falhar, mas testa half-open)
     with pytest.raises(Exception):
         cb.call(failing_func)
+
+
+def test_staging_area_ram_budget_with_disk_fallback(tmp_path):
+    """Testar staging em RAM com fallback para disco ao esgotar o orçamento"""
+    staging = StagingArea(tmp_path / 'disk', tmp_path / 'ram', budget_mb=1)
+    
+    first = staging.reserve('AAA1/1', 600 * 1024)
+    second = staging.reserve('AAA1/2', 600 * 1024)
+    
+    assert staging.is_in_ram(first) and first.is_dir()
+    assert not staging.is_in_ram(second)
+    assert second == tmp_path / 'disk' / 'AAA1' / '2'
+    assert (staging.ram_placements, staging.disk_placements) == (1, 1)
+    
+    # Liberar devolve a reserva ao orçamento
+    staging.release(first)
+    assert not first.exists()
+    assert staging.ram_used_bytes == 0
+    assert staging.is_in_ram(staging.reserve('AAA1/3', 600 * 1024))
+    
+    # Tamanho desconhecido não consome o orçamento: vai para o disco
+    assert not staging.is_in_ram(staging.reserve('AAA1/4', 0))